@@ -0,0 +1,282 @@
+import fcntl
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from instrumentacion import contar
+
+# Configuración global
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+# Filas vivas máximas antes de expulsar las menos usadas (0 = sin límite)
+MAX_FILAS = int(os.getenv("EMBEDDING_CACHE_MAX_FILAS", "500000"))
+# Al expulsar se deja el almacén en esta fracción del máximo
+FRACCION_TRAS_EXPULSION = 0.9
+# Tipo de los vectores en disco: float32, float16 o int8. Los vectores llegan
+# normalizados; en int8 cada fila se escala a [-127, 127], y en float16 e int8
+# se vuelven a normalizar al leerlos, así que no hace falta guardar la escala.
+# float32 (por defecto) conserva los vectores y las métricas tal cual;
+# float16 e int8 ocupan la mitad y la cuarta parte y se eligen explícitamente
+DTYPE_ALMACEN = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+# Tipo de los vectores que devuelve el almacén
+DTYPE = np.float32
+SUFIJOS = {"float32": "f32", "float16": "f16", "int8": "i8"}
+
+
+def a_almacen(vectores: np.ndarray, dtype: str) -> np.ndarray:
+    """Vectores normalizados (float32) al tipo con que se guardan"""
+    vectores = np.asarray(vectores, dtype=DTYPE)
+    if dtype != "int8":
+        return vectores.astype(dtype)
+    maximos = np.abs(vectores).max(axis=1, keepdims=True)
+    maximos[maximos == 0] = 1.0
+    return np.round(vectores * (127 / maximos)).astype(np.int8)
+
+
+def desde_almacen(filas: np.ndarray, dtype: str) -> np.ndarray:
+    """Filas guardadas a vectores float32 normalizados"""
+    vectores = np.asarray(filas, dtype=DTYPE)
+    if dtype != "float32":
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        vectores /= normas
+    return vectores
+
+
+def clave_texto(text: str) -> str:
+    """Identificador único del texto (md5, igual que la caché anterior)"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class AlmacenEmbeddings:
+    """
+    Almacén de embeddings en un único archivo: matriz de solo agregado
+    (del tipo `dtype`, ver `DTYPE_ALMACEN`), leída con memoria mapeada, y
+    un índice hash → fila en SQLite. Devuelve siempre vectores float32.
+
+    - Las lecturas toman un lock compartido y las escrituras/compactaciones
+      uno exclusivo (flock), así varios procesos pueden usarlo a la vez.
+    - Las filas expulsadas quedan huérfanas hasta que `compactar` reescribe
+      la matriz solo con las filas vivas.
+    """
+
+    def __init__(self, directorio: str = CACHE_DIR, max_filas: int = MAX_FILAS, dtype: str = DTYPE_ALMACEN):
+        if dtype not in SUFIJOS:
+            raise ValueError(f"Tipo de almacén desconocido: {dtype!r} (opciones: {', '.join(SUFIJOS)})")
+        os.makedirs(directorio, exist_ok=True)
+        self.dtype = dtype
+        self.ruta_matriz = os.path.join(directorio, f"vectores.{SUFIJOS[dtype]}")
+        self.ruta_indice = os.path.join(directorio, "indice.sqlite")
+        self.ruta_lock = os.path.join(directorio, "almacen.lock")
+        self.max_filas = max_filas
+        self._mmap: Optional[np.memmap] = None
+        self._mmap_id: Optional[Tuple[int, int]] = None
+        with self._indice() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS indice ("
+                " clave TEXT PRIMARY KEY,"
+                " fila INTEGER NOT NULL,"
+                " ultimo_acceso REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_acceso ON indice (ultimo_acceso)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (nombre TEXT PRIMARY KEY, valor INTEGER)")
+
+    # --- infraestructura -------------------------------------------------
+
+    @contextmanager
+    def _indice(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.ruta_indice, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _lock(self, exclusivo: bool) -> Iterator[None]:
+        with open(self.ruta_lock, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _dimension(self, conn: sqlite3.Connection) -> Optional[int]:
+        fila = conn.execute("SELECT valor FROM meta WHERE nombre = 'dimension'").fetchone()
+        return fila[0] if fila else None
+
+    def _matriz(self, dim: int) -> np.ndarray:
+        """Matriz completa en memoria mapeada (se reabre si el archivo cambió)"""
+        if not os.path.exists(self.ruta_matriz):
+            return np.empty((0, dim), dtype=self.dtype)
+        st = os.stat(self.ruta_matriz)
+        identidad = (st.st_ino, st.st_size)
+        if self._mmap is None or self._mmap_id != identidad:
+            filas = st.st_size // (dim * np.dtype(self.dtype).itemsize)
+            if filas == 0:
+                return np.empty((0, dim), dtype=self.dtype)
+            self._mmap = np.memmap(self.ruta_matriz, dtype=self.dtype, mode="r", shape=(filas, dim))
+            self._mmap_id = identidad
+        return self._mmap
+
+    # --- API pública ---------------------------------------------------------
+
+    def buscar(self, claves: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        Busca varias claves en una sola consulta.
+        Devuelve (matriz con una fila por clave, máscara de encontradas);
+        las filas de claves no encontradas quedan en cero.
+        """
+        encontradas = np.zeros(len(claves), dtype=bool)
+        if not claves:
+            return None, encontradas
+        with self._lock(exclusivo=False), self._indice() as conn:
+            dim = self._dimension(conn)
+            if dim is None:
+                return None, encontradas
+            filas = self._filas(conn, list(dict.fromkeys(claves)))
+            if filas:
+                ahora = time.time()
+                conn.executemany(
+                    "UPDATE indice SET ultimo_acceso = ? WHERE clave = ?",
+                    [(ahora, c) for c in filas],
+                )
+            posiciones = np.array([filas.get(c, -1) for c in claves], dtype=np.int64)
+            encontradas = posiciones >= 0
+            resultado = np.zeros((len(claves), dim), dtype=DTYPE)
+            if encontradas.any():
+                resultado[encontradas] = desde_almacen(self._matriz(dim)[posiciones[encontradas]], self.dtype)
+        return resultado, encontradas
+
+    def agregar(self, claves: List[str], vectores: np.ndarray) -> None:
+        """
+        Agrega vectores al final de la matriz y los registra en el índice.
+        Las claves que otro proceso ya agregó se omiten.
+        """
+        if not claves:
+            return
+        vectores = np.ascontiguousarray(a_almacen(vectores, self.dtype))
+        with self._lock(exclusivo=True), self._indice() as conn:
+            dim = self._dimension(conn)
+            if dim is None:
+                dim = vectores.shape[1]
+                conn.execute("INSERT INTO meta (nombre, valor) VALUES ('dimension', ?)", (dim,))
+            elif dim != vectores.shape[1]:
+                raise ValueError(f"Dimensión {vectores.shape[1]} distinta de la del almacén ({dim})")
+
+            nuevas = {}
+            for clave, vector in zip(claves, vectores):
+                if clave not in nuevas:
+                    nuevas[clave] = vector
+            existentes = self._filas(conn, list(nuevas))
+            nuevas = {c: v for c, v in nuevas.items() if c not in existentes}
+            if not nuevas:
+                return
+
+            tamano = os.path.getsize(self.ruta_matriz) if os.path.exists(self.ruta_matriz) else 0
+            primera = tamano // (dim * np.dtype(self.dtype).itemsize)
+            with open(self.ruta_matriz, "ab") as f:
+                f.write(np.stack(list(nuevas.values())).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            ahora = time.time()
+            conn.executemany(
+                "INSERT INTO indice (clave, fila, ultimo_acceso) VALUES (?, ?, ?)",
+                [(c, primera + i, ahora) for i, c in enumerate(nuevas)],
+            )
+            if self.max_filas:
+                vivas = conn.execute("SELECT COUNT(*) FROM indice").fetchone()[0]
+                if vivas > self.max_filas:
+                    self._expulsar(conn, vivas - int(self.max_filas * FRACCION_TRAS_EXPULSION))
+                    self._compactar(conn, dim)
+
+    def _filas(self, conn: sqlite3.Connection, claves: List[str]) -> dict:
+        filas = {}
+        # SQLite limita la cantidad de parámetros por consulta
+        for i in range(0, len(claves), 900):
+            lote = claves[i:i + 900]
+            marcas = ",".join("?" * len(lote))
+            filas.update(conn.execute(
+                f"SELECT clave, fila FROM indice WHERE clave IN ({marcas})", lote
+            ).fetchall())
+        return filas
+
+    def obtener_o_calcular(self, textos: List[str],
+                           codificar: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Devuelve los embeddings de `textos` en el mismo orden, calculando en un
+        solo lote (y sin repetidos) los que no están en el almacén.
+        """
+        if not textos:
+            return np.empty((0, 0), dtype=DTYPE)
+        claves = [clave_texto(t) for t in textos]
+        resultado, encontradas = self.buscar(claves)
+        aciertos = int(encontradas.sum())
+        contar("cache", aciertos, cache="embeddings", resultado="acierto")
+        contar("cache", len(claves) - aciertos, cache="embeddings", resultado="fallo")
+        if encontradas.all():
+            return resultado
+
+        faltantes = {}
+        for i in np.flatnonzero(~encontradas):
+            faltantes.setdefault(claves[i], textos[i])
+        nuevos = np.asarray(codificar(list(faltantes.values())), dtype=DTYPE)
+        self.agregar(list(faltantes), nuevos)
+        # Lo calculado se devuelve tal como se lee después del almacén
+        nuevos = desde_almacen(a_almacen(nuevos, self.dtype), self.dtype)
+
+        por_clave = dict(zip(faltantes, nuevos))
+        if resultado is None:
+            resultado = np.zeros((len(textos), nuevos.shape[1]), dtype=DTYPE)
+        for i in np.flatnonzero(~encontradas):
+            resultado[i] = por_clave[claves[i]]
+        return resultado
+
+    def _expulsar(self, conn: sqlite3.Connection, cantidad: int) -> None:
+        # Borra del índice las entradas menos usadas recientemente
+        conn.execute(
+            "DELETE FROM indice WHERE clave IN "
+            "(SELECT clave FROM indice ORDER BY ultimo_acceso LIMIT ?)",
+            (cantidad,),
+        )
+
+    def _compactar(self, conn: sqlite3.Connection, dim: int) -> None:
+        # Reescribe la matriz solo con las filas vivas y renumera el índice
+        vivas = conn.execute("SELECT clave, fila FROM indice ORDER BY fila").fetchall()
+        matriz = self._matriz(dim)
+        temporal = self.ruta_matriz + ".tmp"
+        with open(temporal, "wb") as f:
+            if vivas:
+                filas = np.array([fila for _, fila in vivas], dtype=np.int64)
+                f.write(np.ascontiguousarray(matriz[filas]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_matriz)
+        conn.executemany(
+            "UPDATE indice SET fila = ? WHERE clave = ?",
+            [(nueva, clave) for nueva, (clave, _) in enumerate(vivas)],
+        )
+        self._mmap = None
+
+    def compactar(self) -> None:
+        """Elimina de la matriz las filas que ya no están en el índice"""
+        with self._lock(exclusivo=True), self._indice() as conn:
+            dim = self._dimension(conn)
+            if dim is not None:
+                self._compactar(conn, dim)
+
+    def expulsar(self, max_filas: int) -> None:
+        """Deja como máximo `max_filas` entradas (las más usadas) y compacta"""
+        with self._lock(exclusivo=True), self._indice() as conn:
+            dim = self._dimension(conn)
+            if dim is None:
+                return
+            vivas = conn.execute("SELECT COUNT(*) FROM indice").fetchone()[0]
+            if vivas > max_filas:
+                self._expulsar(conn, vivas - max_filas)
+                self._compactar(conn, dim)
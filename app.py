@@ -1,24 +1,24 @@
 import streamlit as st
 from dotenv import load_dotenv
+import os
+import threading
 import time
-import tempfile
-from time import sleep
-import numpy as np
-from extraer_pdf import extract_text_from_pdf
-from limpieza_texto import clean_text
-from gemini_client import call_gemini
-from deepseek_client import call_deepseek
-from metricas import (
-    semantic_relevance_score,
-    distractor_quality_index,
-    concept_coverage_semantic,
-    question_diversity
-)
-
+from documento_pdf import FILTRO_TABLAS, MEMORIA_BAJA
+from extraccion_paralela import WORKERS_POR_DEFECTO
+from gemini_client import NUM_IDEAS
+from metricas import calentar
+from cache_etapas import CacheEtapas
+from instrumentacion import iniciar_servidor_metricas
+# El procesamiento completo (extracción, tablas, ideas, preguntas y métricas)
+# vive en pipeline.py y se ejecuta en segundo plano en la cola de trabajos;
+# aquí solo se envía el documento, se muestra el avance y los resultados
+from pipeline import Avance, OpcionesPipeline
+from trabajos import CANCELADO, EN_COLA, EN_CURSO, FALLIDO, ColaLlena, ColaTrabajos
 
-# Nuevos imports para tablas
-from extraer_tabla import extraer_tablas  # devuelve CSV como str
-from gemini_client_analyser import call_gemini_analyzer  # interpreta CSV
+# Cada cuánto se vuelve a consultar el estado de un trabajo en curso
+INTERVALO_SONDEO = 0.5
+# Caracteres del texto limpio que se muestran en el modo de memoria baja
+MAX_TEXTO_VISIBLE = 200_000
 
 # Carga variables de entorno (.env)
 load_dotenv()
@@ -33,86 +33,165 @@ st.set_page_config(
 st.title("Procesador de PDF Inteligente")
 st.markdown("---")
 
+# Opciones de procesamiento
+with st.sidebar:
+    st.subheader("⚙️ Opciones")
+    workers_extraccion = st.number_input(
+        "Procesos para extraer páginas",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=min(WORKERS_POR_DEFECTO, os.cpu_count() or 1),
+        help="Con más de 1 proceso las páginas se extraen en paralelo (útil en PDFs largos)."
+    )
+    num_ideas = st.number_input(
+        "Número de ideas principales",
+        min_value=1,
+        max_value=50,
+        value=NUM_IDEAS,
+        help="En documentos largos las ideas se extraen por fragmentos y se fusionan las repetidas."
+    )
+    num_preguntas = st.number_input(
+        "Número de preguntas",
+        min_value=0,
+        max_value=200,
+        value=0,
+        help="0 = una pregunta por idea. Los bancos grandes se generan en varias llamadas simultáneas "
+             "y se descartan las preguntas repetidas."
+    )
+    filtro_tablas = st.selectbox(
+        "Filtro de páginas sin tablas",
+        options=[0, 1, 2],
+        index=[0, 1, 2].index(FILTRO_TABLAS) if FILTRO_TABLAS in (0, 1, 2) else 1,
+        format_func={0: "Desactivado", 1: "Seguro (mismo resultado)", 2: "Agresivo (ignora recuadros sueltos)"}.get,
+        help="Las páginas sin líneas ni rectángulos que puedan formar una tabla no se analizan en busca de tablas."
+    )
+    memoria_baja = st.checkbox(
+        "Modo de memoria baja",
+        value=MEMORIA_BAJA,
+        help="Para PDFs muy grandes: el archivo se lee desde disco, cada página se libera al terminarla "
+             "y el texto limpio se guarda en disco."
+    )
+
+@st.cache_resource
+def calentar_en_segundo_plano() -> threading.Thread:
+    # El modelo de embeddings se carga mientras el usuario sube el archivo,
+    # no dentro de la primera petición. Se ejecuta una vez por proceso.
+    hilo = threading.Thread(target=calentar, daemon=True)
+    hilo.start()
+    return hilo
+
+
+calentar_en_segundo_plano()
+
+
+@st.cache_resource
+def obtener_cache() -> CacheEtapas:
+    # Una sola instancia por proceso; los resultados persisten en disco
+    return CacheEtapas()
+
+
+@st.cache_resource
+def servidor_metricas():
+    # Endpoint Prometheus opcional (una vez por proceso)
+    puerto = os.getenv("METRICAS_PUERTO")
+    return iniciar_servidor_metricas(int(puerto)) if puerto else None
+
+
+servidor_metricas()
+
+
+@st.cache_resource
+def obtener_cola() -> ColaTrabajos:
+    # Una sola cola por proceso, compartida por todas las sesiones
+    return ColaTrabajos(cache=obtener_cache())
+
+
+cola = obtener_cola()
+with st.sidebar:
+    trabajos = cola.trabajos()
+    st.caption(
+        f"Trabajos: {sum(t.estado == EN_CURSO for t in trabajos)} en curso, "
+        f"{sum(t.estado == EN_COLA for t in trabajos)} en espera"
+    )
+
+
 st.subheader("📤 Subir Archivo PDF")
 uploaded_file = st.file_uploader("Selecciona un archivo PDF:", type=["pdf"])
 
 if uploaded_file:
     progress_bar = st.progress(0)
     status_text = st.empty()
+    vista_parcial = st.empty()
 
-    # 1. Extraer texto
-    status_text.text("🔄 Extrayendo texto del PDF...")
-    progress_bar.progress(10)
-    raw_text = extract_text_from_pdf(uploaded_file)
-
-    # 2. Limpiar texto
-    status_text.text("🧹 Limpiando y formateando texto...")
-    progress_bar.progress(30)
-    cleaned_text = clean_text(raw_text)
-
-    # 3. Extraer tablas y obtener CSV
-
-    status_text.text("📊 Extrayendo tablas del PDF...")
-    progress_bar.progress(45)
-    
-    # Variable para controlar si hay tablas
-    hay_tablas = False
-    table_csv = ""
-    table_summary = []
-
-    try:
-        uploaded_file.seek(0)
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(uploaded_file.read())
-            tmp.flush()
-            table_csv = extraer_tablas(tmp.name)
-            
-            # Verificar si realmente hay tablas
-            if table_csv and table_csv.strip():
-                hay_tablas = True
-                
-                # 4. Interpretación de tablas con Gemini
-                status_text.text("🔍 Interpretando tablas con Gemini...")
-                progress_bar.progress(60)
-                table_summary = call_gemini_analyzer(table_csv)
-                # Eliminar líneas vacías y asteriscos
-                table_summary = [line.replace('*', '').strip() 
-                                for line in table_summary if line.strip()]
-    except Exception as e:
-        st.error(f"Error procesando tablas: {str(e)}")
-        hay_tablas = False
-
-    # 5. Concatenar interpretación al texto limpio
-    if hay_tablas:
-        enhanced_text = cleaned_text + "\n\n" + "\n".join(table_summary)
-        progress_bar.progress(65)  # Avance adicional
-    else:
-        enhanced_text = cleaned_text
-        status_text.text("ℹ️ No se encontraron tablas en el PDF")
-        sleep(1)  
-        progress_bar.progress(65)  # Avance al mismo punto
-
-    # 6. Ideas principales generadas por Gemini (texto + resumen de tablas)
-    status_text.text("💡 Extrayendo ideas principales...")
-    progress_bar.progress(75)
-    #enhanced_text es el texto limpio de PDF + resumen de tablas
-    ideas = call_gemini(enhanced_text)
-
-    # 7. Generar preguntas con DeepSeek
-    status_text.text("❓ Generando preguntas con DeepSeek...")
-    progress_bar.progress(90)
-    #pasamos las ideas principales a DeepSeek para generar preguntas
-    questions = call_deepseek(ideas, num_questions=len(ideas))
-    #questions es una lista de diccionarios con 'question', 'options' y 'correct_answer'
+    def mostrar_avance(avance: Avance) -> None:
+        progress_bar.progress(int(100 * avance.progreso))
+        status_text.text(avance.mensaje)
+        # st.text no es un widget: se puede reemplazar en cada página
+        if avance.texto_parcial is not None:
+            vista_parcial.text(avance.texto_parcial)
+        elif avance.preguntas_parciales is not None:
+            # Las preguntas aparecen a medida que DeepSeek las completa
+            vista_parcial.markdown("\n\n".join(
+                f"**{i}.** {q.get('question', '')}" for i, q in enumerate(avance.preguntas_parciales, 1)
+            ))
+        elif avance.etapa != "extraccion":
+            vista_parcial.empty()
+
+    opciones = OpcionesPipeline(
+        workers=int(workers_extraccion), num_ideas=int(num_ideas), filtro_tablas=int(filtro_tablas),
+        num_preguntas=int(num_preguntas) or None, memoria_baja=bool(memoria_baja),
+    )
+
+    def enviar_trabajo():
+        try:
+            return cola.enviar(uploaded_file, opciones, nombre=uploaded_file.name)
+        except ColaLlena:
+            st.warning("⏳ Hay demasiados documentos en espera. Intenta de nuevo en unos minutos.")
+            st.stop()
+
+    # Volver a ejecutar el script (otro widget, otra pestaña) no repite el
+    # procesamiento: se retoma el trabajo de este PDF con estas opciones. Su
+    # id queda en la sesión, así el sondeo no vuelve a leer ni hashear el PDF
+    clave_sesion = f"trabajo:{uploaded_file.file_id}:{opciones!r}"
+    trabajo = cola.obtener(st.session_state.get(clave_sesion, ""))
+    if trabajo is None:
+        trabajo = cola.buscar(uploaded_file, opciones) or enviar_trabajo()
+        st.session_state[clave_sesion] = trabajo.id
 
-    # 8. Obtener respuestas
-    answers = [q.get('correct_answer', '') for q in questions]
-    #answers se obtiene almacenando las respuestas correctas de cada pregunta en la lista de preguntas
+    if trabajo.estado in (CANCELADO, FALLIDO):
+        if trabajo.estado == CANCELADO:
+            st.info("Procesamiento cancelado.")
+        else:
+            st.error(f"Error procesando el PDF: {trabajo.error}")
+        if st.button("🔄 Procesar de nuevo"):
+            st.session_state[clave_sesion] = enviar_trabajo().id
+            st.rerun()
+        st.stop()
+
+    if not trabajo.terminado:
+        if trabajo.estado == EN_COLA:
+            progress_bar.progress(0)
+            status_text.text(f"⏳ En espera (posición {cola.posicion(trabajo.id)} en la cola)...")
+        elif trabajo.avance is not None:
+            mostrar_avance(trabajo.avance)
+        if st.button("✖️ Cancelar"):
+            cola.cancelar(trabajo.id)
+            st.rerun()
+        time.sleep(INTERVALO_SONDEO)
+        st.rerun()
+
+    resultado = trabajo.resultado
+
+    cleaned_text = resultado.inicio_texto(MAX_TEXTO_VISIBLE) if opciones.memoria_baja else resultado.texto_limpio
+    hay_tablas = resultado.hay_tablas
+    table_csv = resultado.tablas_csv
+    table_summary = resultado.resumen_tablas
+    ideas = resultado.ideas
+    #questions es una lista de diccionarios con 'question', 'options' y 'correct_answer'
+    questions = resultado.preguntas
+    answers = resultado.respuestas
 
     # Fin del procesamiento
-    progress_bar.progress(100)
-    status_text.text("🎉 ¡Procesamiento completado!")
-    time.sleep(0.5)
     progress_bar.empty()
     status_text.empty()
 
@@ -123,12 +202,22 @@ if uploaded_file:
     # Texto limpio
     with st.expander("🧹 Texto Limpio", expanded=True):
         st.text_area("Texto Limpio", cleaned_text, height=200, label_visibility="collapsed")
+        if opciones.memoria_baja and len(cleaned_text) >= MAX_TEXTO_VISIBLE:
+            st.caption(f"Se muestran los primeros {MAX_TEXTO_VISIBLE:,} caracteres del texto limpio.")
 
     if hay_tablas:
         # CSV de tablas
         with st.expander("📑 Tablas Encontradas", expanded=False):
             st.text_area("Tablas Encontradas", table_csv, height=200, label_visibility="collapsed")
 
+        # Estadísticas calculadas localmente: es lo que recibe el analizador
+        with st.expander("🔢 Resumen local de tablas", expanded=False):
+            st.caption(
+                f"{len(resultado.tablas)} tablas; "
+                + "; ".join(f"pág. {t.pagina}: {t.num_filas} filas x {len(t.columnas)} columnas" for t in resultado.tablas)
+            )
+            st.text(resultado.resumen_tablas_prompt)
+
         # Interpretación de tablas
         with st.expander("🗒️ Interpretación de Tablas", expanded=False):
             if table_summary:
@@ -156,30 +245,64 @@ if uploaded_file:
 
     # Métricas de calidad
     with st.expander("📈 Métricas de Calidad", expanded=True):
-        # Preparar listas
-        preguntas_text = [q['question'] for q in questions]
-        distractores_list = [q['options'] for q in questions]
-        
-        # Calcular métricas optimizadas
-        rel = semantic_relevance_score(cleaned_text, preguntas_text)
-        
-        # Calcular calidad de distractores por pregunta
-        dist_qualities = []
-        for q in questions:
-            correct = q.get('correct_answer', '')
-            distractors = [d for d in q.get('options', []) if d != correct]
-            if distractors:
-                dq = distractor_quality_index(correct, distractors)
-                dist_qualities.append(dq)
-        idx_d = np.mean(dist_qualities) if dist_qualities else 0.0
-        
-        cov = concept_coverage_semantic(ideas, preguntas_text, top_k=25, threshold=0.4)
-        div = question_diversity(preguntas_text)
+        metricas_calidad = resultado.metricas
+        rel = metricas_calidad["relevancia"]
+        idx_d = metricas_calidad["distractores"]
+        cov = metricas_calidad["cobertura"]
+        div = metricas_calidad["diversidad"]
 
         st.metric("Relevancia semántica promedio", f"{rel:.2f}")
         st.metric("Índice calidad distractores", f"{idx_d:.2f}")
         st.metric("Cobertura de conceptos (%)", f"{cov:.1f}%")
         st.metric("Diversidad de preguntas", f"{div:.2f}")
 
+    # Tiempo, CPU y memoria de cada etapa de este documento
+    with st.expander("⏱️ Tiempos por etapa", expanded=False):
+        etapas = resultado.instrumentacion.get("etapas", {})
+        st.dataframe(
+            [
+                {
+                    "Etapa": nombre,
+                    "Llamadas": datos["n"],
+                    "Tiempo (s)": round(datos["segundos"], 3),
+                    "CPU (s)": round(datos["cpu"], 3),
+                    "Pico RSS (MB)": round(datos["rss_pico_mb"], 1),
+                }
+                for nombre, datos in etapas.items()
+            ],
+            use_container_width=True,
+        )
+        omitidas = resultado.paginas_tablas_omitidas
+        st.caption(
+            f"Búsqueda de tablas: {resultado.num_paginas - len(omitidas)} de {resultado.num_paginas} páginas "
+            f"analizadas" + (f"; omitidas: {', '.join(map(str, omitidas))}" if omitidas else "")
+        )
+        aciertos = resultado.instrumentacion.get("aciertos_cache", {})
+        if aciertos:
+            st.caption("Aciertos de caché: " + ", ".join(f"{k} {v:.0%}" for k, v in aciertos.items()))
+
+    # Qué se reutilizó de la versión anterior del documento y qué se recalculó
+    reutilizacion = resultado.reutilizacion
+    with st.expander("♻️ Cambios y reutilización", expanded=False):
+        cambios = reutilizacion.get("paginas")
+        if cambios:
+            st.caption(
+                f"Versión anterior: {reutilizacion['version_anterior'][:12]}… — "
+                f"{len(cambios['iguales'])} páginas iguales, {len(cambios['modificadas'])} modificadas, "
+                f"{len(cambios['nuevas'])} nuevas, {len(cambios['eliminadas'])} eliminadas"
+            )
+            for clase in ("modificadas", "nuevas", "eliminadas"):
+                if cambios[clase]:
+                    st.markdown(f"- Páginas {clase}: {', '.join(map(str, cambios[clase]))}")
+        else:
+            st.caption("No se encontró una versión anterior de este documento")
+        st.dataframe(
+            [
+                {"Etapa": etapa, "Reutilizados": datos["reutilizados"], "Recalculados": datos["recalculados"]}
+                for etapa, datos in reutilizacion.get("etapas", {}).items()
+            ],
+            use_container_width=True,
+        )
+
 else:
     st.info("👆 Por favor, sube un archivo PDF para comenzar.")
\ No newline at end of file
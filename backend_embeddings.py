@@ -0,0 +1,137 @@
+import importlib.util
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Backend que calcula los embeddings:
+#   torch      = SentenceTransformer en PyTorch, pesos float32 (por defecto)
+#   torch_int8 = el mismo modelo con las capas lineales cuantizadas a int8
+#   onnx       = ONNX Runtime (requiere onnxruntime y optimum: requirements-onnx.txt)
+#   onnx_int8  = ONNX Runtime con el modelo cuantizado a int8 que publica el repositorio
+BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")
+# Hilos de cómputo del modelo (intra-op); 0 = los que elija la biblioteca
+HILOS = int(os.getenv("EMBEDDINGS_HILOS", "0"))
+# Textos por pasada del modelo
+BATCH = int(os.getenv("EMBEDDINGS_BATCH", "64"))
+# Modelo ONNX cuantizado dentro del repositorio del modelo (variante para CPUs con AVX2)
+ARCHIVO_ONNX_INT8 = os.getenv("EMBEDDINGS_ONNX_INT8", "onnx/model_quint8_avx2.onnx")
+# Sin red: nunca descargar modelos (deben estar ya en disco)
+MODO_OFFLINE = os.getenv("PDF_OFFLINE", "0").lower() in ("1", "true", "si", "sí")
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+
+
+class BackendEmbeddings(ABC):
+    """
+    Calcula embeddings normalizados (norma 1, float32): la similitud coseno
+    entre dos textos es el producto escalar de sus vectores. El modelo se
+    carga al primer uso. `identificador` distingue los vectores de distintos
+    modelos y backends (que no son intercambiables) en el almacén. Cada
+    backend implementa `_cargar`.
+    """
+
+    nombre = ""
+
+    def __init__(self, modelo: str, hilos: int = HILOS, batch: int = BATCH):
+        self.modelo = modelo
+        self.hilos = hilos
+        self.batch = batch
+        self._st = None
+        self._lock = threading.Lock()
+
+    @property
+    def identificador(self) -> str:
+        return f"{self.modelo.replace('/', '_')}-{self.nombre}"
+
+    def sentence_transformer(self):
+        """Modelo de sentence-transformers (se carga una sola vez, seguro entre hilos)"""
+        if self._st is None:
+            with self._lock:
+                if self._st is None:
+                    if MODO_OFFLINE:
+                        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+                        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+                    self._st = self._cargar()
+        return self._st
+
+    @abstractmethod
+    def _cargar(self):
+        """Carga el modelo de sentence-transformers del backend"""
+
+    def codificar(self, textos: List[str]) -> np.ndarray:
+        return np.asarray(
+            self.sentence_transformer().encode(
+                textos, batch_size=self.batch, convert_to_numpy=True, normalize_embeddings=True,
+            ),
+            dtype=np.float32,
+        )
+
+
+class BackendTorch(BackendEmbeddings):
+    """SentenceTransformer en PyTorch (CPU); con `cuantizado` las capas lineales usan int8"""
+
+    def __init__(self, modelo: str, hilos: int = HILOS, batch: int = BATCH, cuantizado: bool = False):
+        super().__init__(modelo, hilos, batch)
+        self.cuantizado = cuantizado
+        self.nombre = "torch_int8" if cuantizado else "torch"
+
+    def _cargar(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.hilos:
+            torch.set_num_threads(self.hilos)
+        st = SentenceTransformer(self.modelo, device="cpu")
+        if self.cuantizado:
+            # Cuantización dinámica: pesos int8, activaciones cuantizadas al vuelo
+            st = torch.ao.quantization.quantize_dynamic(st, {torch.nn.Linear}, dtype=torch.qint8)
+        st.eval()
+        return st
+
+
+class BackendONNX(BackendEmbeddings):
+    """SentenceTransformer sobre ONNX Runtime en CPU; con `cuantizado` usa el modelo int8"""
+
+    def __init__(self, modelo: str, hilos: int = HILOS, batch: int = BATCH, cuantizado: bool = False):
+        super().__init__(modelo, hilos, batch)
+        self.cuantizado = cuantizado
+        self.nombre = "onnx_int8" if cuantizado else "onnx"
+
+    def _cargar(self):
+        import onnxruntime
+        from sentence_transformers import SentenceTransformer
+
+        opciones = onnxruntime.SessionOptions()
+        if self.hilos:
+            opciones.intra_op_num_threads = self.hilos
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": opciones}
+        if self.cuantizado:
+            model_kwargs["file_name"] = ARCHIVO_ONNX_INT8
+        return SentenceTransformer(self.modelo, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+def onnx_disponible() -> bool:
+    return all(importlib.util.find_spec(m) is not None for m in ("onnxruntime", "optimum"))
+
+
+def crear_backend(modelo: str, nombre: Optional[str] = None, hilos: int = HILOS,
+                  batch: int = BATCH) -> BackendEmbeddings:
+    """
+    Backend `nombre` (ver `BACKENDS`). Si ONNX Runtime no está instalado,
+    los backends onnx se reemplazan por su equivalente en PyTorch.
+    """
+    nombre = nombre or BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de embeddings desconocido: {nombre!r} (opciones: {', '.join(BACKENDS)})")
+    cuantizado = nombre.endswith("_int8")
+    if nombre.startswith("onnx"):
+        if onnx_disponible():
+            return BackendONNX(modelo, hilos, batch, cuantizado)
+        logger.warning(f"Backend '{nombre}' no disponible (falta onnxruntime u optimum); se usará PyTorch")
+    return BackendTorch(modelo, hilos, batch, cuantizado)
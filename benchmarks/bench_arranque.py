@@ -0,0 +1,65 @@
+"""
+Mide el costo de arranque: tiempo de importar los módulos del proyecto y
+latencia de la primera petición de métricas, cada uno en un proceso nuevo.
+
+Para comparar antes/después, ejecútalo sobre otra copia del repositorio:
+    git worktree add /tmp/antes <commit>
+    python -m benchmarks.bench_arranque --directorio /tmp/antes
+    python -m benchmarks.bench_arranque
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cada medición corre en un intérprete limpio para no heredar módulos cargados
+SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import {modulo}
+t1 = time.perf_counter()
+resultado = {{"importar": t1 - t0}}
+if {primera_peticion}:
+    import metricas
+    metricas.semantic_relevance_score(
+        "la inteligencia artificial generativa crea contenido",
+        ["que es la inteligencia artificial generativa"],
+    )
+    resultado["primera_peticion"] = time.perf_counter() - t1
+print(json.dumps(resultado))
+"""
+
+
+def medir(directorio: str, modulo: str, primera_peticion: bool) -> dict:
+    codigo = SCRIPT.format(modulo=modulo, primera_peticion=primera_peticion)
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=directorio, capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directorio", default=RAIZ, help="Copia del repositorio a medir")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--modulos", nargs="+", default=["pipeline", "metricas"])
+    parser.add_argument("--sin-primera-peticion", action="store_true",
+                        help="No medir la primera petición (evita cargar el modelo)")
+    args = parser.parse_args()
+
+    print(f"Repositorio: {args.directorio}")
+    for modulo in args.modulos:
+        primera = modulo == "metricas" and not args.sin_primera_peticion
+        medidas = [medir(args.directorio, modulo, primera) for _ in range(args.repeticiones)]
+        linea = f"import {modulo:<12} mediana {statistics.median(m['importar'] for m in medidas):.3f}s"
+        if primera:
+            linea += f"  primera petición {statistics.median(m['primera_peticion'] for m in medidas):.3f}s"
+        print(linea)
+
+
+if __name__ == "__main__":
+    main()
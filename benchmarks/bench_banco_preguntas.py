@@ -0,0 +1,86 @@
+"""
+Genera bancos grandes de preguntas contra el servidor DeepSeek simulado, con
+una sola llamada y repartidos en lotes simultáneos, y reporta el tiempo total,
+las preguntas obtenidas (deben ser exactamente N), las duplicadas descartadas
+y las rondas de reposición. Usa el modelo de embeddings de `metricas`.
+
+Uso:
+    python -m benchmarks.bench_banco_preguntas
+    python -m benchmarks.bench_banco_preguntas --preguntas 50 100 --lote 10 --segundos-por-1k-tokens-salida 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+
+async def generar(ideas, num_preguntas: int, preguntas_por_lote: int, concurrencia: int):
+    from clientes_llm import ClienteDeepSeek, ConfigProveedor, SesionLLM
+    from deepseek_client import generar_preguntas_async
+    from instrumentacion import trazar
+
+    cliente = ClienteDeepSeek(config=ConfigProveedor(concurrencia=concurrencia))
+    async with SesionLLM(deepseek=cliente) as sesion:
+        with trazar("banco_preguntas") as traza:
+            inicio = time.perf_counter()
+            preguntas = await generar_preguntas_async(
+                ideas, num_preguntas, sesion, preguntas_por_lote=preguntas_por_lote
+            )
+            duracion = time.perf_counter() - inicio
+    return preguntas, duracion, traza.a_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preguntas", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--lote", type=int, default=10, help="Preguntas por llamada en el modo por lotes")
+    parser.add_argument("--ideas", type=int, default=16)
+    parser.add_argument("--concurrencia", type=int, default=8, help="Llamadas simultáneas a DeepSeek")
+    argumentos_simulacion(parser)
+    parser.set_defaults(segundos_por_1k_tokens_salida=5.0, jitter=0.0)
+    args = parser.parse_args()
+    temas = [
+        "los transformadores usan atención para relacionar palabras",
+        "el entrenamiento requiere grandes volúmenes de datos",
+        "los sesgos del corpus se reflejan en las respuestas",
+        "la evaluación humana complementa las métricas automáticas",
+        "el ajuste fino adapta un modelo base a una tarea",
+        "la cuantización reduce la memoria necesaria para inferencia",
+        "las alucinaciones son afirmaciones falsas con apariencia plausible",
+        "la recuperación de documentos aporta contexto actualizado",
+        "el costo energético del cómputo intensivo es considerable",
+        "las licencias de los datos condicionan su uso comercial",
+        "los embeddings representan significado como vectores",
+        "la generación de imágenes parte de ruido que se refina",
+        "la privacidad exige anonimizar los datos personales",
+        "los agentes encadenan herramientas para resolver tareas",
+        "la tokenización divide el texto en unidades frecuentes",
+        "la temperatura controla la variedad de las respuestas",
+    ]
+    ideas = [temas[i % len(temas)] for i in range(args.ideas)]
+
+    with servidores_simulados(config_desde_argumentos(args)) as (_, deepseek):
+        os.environ["DEEPSEEK_BASE_URL"] = deepseek.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "simulada")
+        from metricas import calentar
+        calentar()
+        for n in args.preguntas:
+            for lote in (n, args.lote):
+                peticiones = deepseek.contadores["peticiones"]
+                preguntas, duracion, traza = asyncio.run(generar(ideas, n, lote, args.concurrencia))
+                duplicadas = sum(
+                    c["valor"] for c in traza["contadores"]
+                    if c["nombre"] == "preguntas_generadas" and c.get("resultado") == "duplicada"
+                )
+                print(
+                    f"N={n:<4} {'una llamada' if lote >= n else f'lotes de {lote}':<13} {duracion:7.2f}s   "
+                    f"{len(preguntas)} preguntas, {len(set(q['question'] for q in preguntas))} distintas   "
+                    f"{duplicadas} duplicadas descartadas   "
+                    f"{deepseek.contadores['peticiones'] - peticiones} llamadas"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Prueba de carga de extremo a extremo: procesa N documentos sintéticos a la
+vez con el pipeline completo contra los servidores LLM simulados y reporta
+la latencia p50/p95 de cada etapa y el throughput total.
+
+Cada ejecución usa cachés vacías en un directorio temporal, así que todas
+las etapas se calculan de verdad.
+
+Uso:
+    python -m benchmarks.bench_carga_e2e --documentos 16 --concurrencia 4 --paginas 30
+    python -m benchmarks.bench_carga_e2e --latencia 1.0 --tasa-429 0.1 --tasa-error 0.02
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from benchmarks.pdf_sintetico import generar_pdf
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+ETAPAS = ["extraccion", "resumen_tablas", "ideas", "preguntas", "metricas", "total"]
+
+
+def _calentar_worker():
+    # El modelo de embeddings se carga antes de medir, no en el primer documento
+    from metricas import calentar
+    calentar()
+
+
+def _percentiles(valores: list) -> tuple:
+    if not valores:
+        return None, None, None
+    return tuple(float(v) for v in np.percentile(valores, [50, 95, 100]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=8, help="Documentos a procesar")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Documentos en curso a la vez (procesos)")
+    parser.add_argument("--paginas", type=int, default=20, help="Páginas de cada PDF sintético")
+    parser.add_argument("--densidad-tablas", type=float, default=0.2)
+    parser.add_argument("--workers-extraccion", type=int, default=1)
+    parser.add_argument("--salida", help="Guardar los resultados en este archivo JSON")
+    argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    config = config_desde_argumentos(args)
+    with tempfile.TemporaryDirectory() as tmp, servidores_simulados(config) as (gemini, openai):
+        # Las variables se fijan antes de importar el pipeline (las rutas de
+        # caché se leen al importar) y las heredan los procesos del pool
+        os.environ.update({
+            "GEMINI_BASE_URL": gemini.url,
+            "DEEPSEEK_BASE_URL": openai.url,
+            "GEMINI_API_KEY": "simulada",
+            "DEEPSEEK_API_KEY": "simulada",
+            "CACHE_ETAPAS_DIR": os.path.join(tmp, "cache_etapas"),
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+            "KEYWORDS_INDICE_DIR": os.path.join(tmp, "indice_keywords"),
+        })
+        from pipeline import OpcionesPipeline
+        from procesar_lote import procesar_archivo
+
+        rutas = []
+        for i in range(args.documentos):
+            ruta = os.path.join(tmp, f"doc_{i:04d}.pdf")
+            with open(ruta, "wb") as f:
+                f.write(generar_pdf(args.paginas, args.densidad_tablas, semilla=i))
+            rutas.append(ruta)
+
+        opciones = OpcionesPipeline(workers=args.workers_extraccion)
+        with ProcessPoolExecutor(max_workers=args.concurrencia, initializer=_calentar_worker) as pool:
+            # Arranque de los procesos (carga del modelo) fuera de la medición
+            list(pool.map(time.sleep, [0] * args.concurrencia))
+            inicio = time.perf_counter()
+            futuros = [pool.submit(procesar_archivo, ruta, opciones) for ruta in rutas]
+            registros = [futuro.result() for futuro in as_completed(futuros)]
+            transcurrido = time.perf_counter() - inicio
+
+    errores = [r for r in registros if "error" in r]
+    correctos = [r for r in registros if "error" not in r]
+    paginas = sum(r["texto"]["paginas"] for r in correctos)
+    por_etapa = {etapa: [] for etapa in ETAPAS}
+    for r in correctos:
+        for etapa, duracion in r["tiempos"].items():
+            por_etapa.setdefault(etapa, []).append(duracion)
+        por_etapa["total"].append(r["duracion"])
+
+    print(f"{len(registros)} documentos de {args.paginas} páginas, concurrencia {args.concurrencia}, "
+          f"latencia simulada {config.latencia}s, 429 {config.tasa_429:.0%}, 5xx {config.tasa_error:.0%}")
+    print(f"{'etapa':<16}{'n':>5}{'p50 (s)':>10}{'p95 (s)':>10}{'máx (s)':>10}")
+    resumen = {}
+    for etapa, valores in por_etapa.items():
+        p50, p95, maximo = _percentiles(valores)
+        resumen[etapa] = {"n": len(valores), "p50": p50, "p95": p95, "max": maximo}
+        if valores:
+            print(f"{etapa:<16}{len(valores):>5}{p50:>10.2f}{p95:>10.2f}{maximo:>10.2f}")
+    print(
+        f"Throughput: {len(correctos) / transcurrido * 60:.1f} docs/min, {paginas / transcurrido:.1f} págs/s "
+        f"({transcurrido:.1f}s en total, {len(errores)} documentos con error)"
+    )
+    print(f"Peticiones Gemini: {dict(gemini.contadores)}  DeepSeek: {dict(openai.contadores)}")
+    for r in errores:
+        print(f"  {os.path.basename(r['archivo'])}: {r['error']}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({
+                "parametros": vars(args),
+                "etapas": resumen,
+                "duracion": transcurrido,
+                "documentos": len(correctos),
+                "errores": len(errores),
+                "paginas": paginas,
+                "peticiones": {"gemini": dict(gemini.contadores), "deepseek": dict(openai.contadores)},
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
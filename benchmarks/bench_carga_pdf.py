@@ -0,0 +1,92 @@
+"""
+Compara la carga de PDF anterior (PyPDF2 para el texto + copia a un archivo
+temporal + pdfplumber para las tablas) con la carga única de documento_pdf.
+Necesita PyPDF2, que ya no es dependencia de la aplicación
+(`pip install -r requirements-benchmarks.txt`).
+
+Uso:
+    python -m benchmarks.bench_carga_pdf --paginas 300
+    python -m benchmarks.bench_carga_pdf --pdf ia_generativa_tabla.pdf
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import pdfplumber
+from PyPDF2 import PdfReader
+
+from benchmarks.pdf_sintetico import generar_pdf
+from documento_pdf import abrir_pdf
+from extraer_pdf import unir_texto
+from extraer_tabla import tablas_a_csv
+from limpieza_texto import clean_text
+
+
+def ruta_anterior(datos: bytes) -> tuple[str, int]:
+    # Réplica del flujo previo de app.py: dos análisis y una copia a disco.
+    buffer = io.BytesIO(datos)
+    reader = PdfReader(buffer)
+    texto = "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    buffer.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(buffer.read())
+        tmp.flush()
+        filas = 0
+        with pdfplumber.open(tmp.name) as pdf:
+            for page in pdf.pages:
+                for tabla in page.extract_tables() or []:
+                    for fila in tabla:
+                        [clean_text(c) if c is not None else "" for c in fila]
+                        filas += 1
+    os.unlink(tmp.name)
+    return texto, filas
+
+
+def ruta_nueva(datos: bytes) -> tuple[str, int]:
+    with abrir_pdf(io.BytesIO(datos)) as documento:
+        paginas = list(documento.paginas())
+    texto = unir_texto(paginas)
+    csv = tablas_a_csv(paginas)
+    return texto, csv.count("\n")
+
+
+def medir(funcion, datos: bytes, repeticiones: int) -> list[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(datos)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF a medir (por defecto se genera uno sintético)")
+    parser.add_argument("--paginas", type=int, default=100, help="Páginas del PDF sintético")
+    parser.add_argument("--densidad-tablas", type=float, default=0.2)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            datos = f.read()
+        origen = args.pdf
+    else:
+        datos = generar_pdf(args.paginas, args.densidad_tablas)
+        origen = f"sintético ({args.paginas} páginas, densidad tablas {args.densidad_tablas})"
+
+    print(f"PDF: {origen}, {len(datos) / 1e6:.2f} MB")
+    resultados = {}
+    for nombre, funcion in (("anterior", ruta_anterior), ("carga única", ruta_nueva)):
+        tiempos = medir(funcion, datos, args.repeticiones)
+        resultados[nombre] = statistics.median(tiempos)
+        print(f"{nombre:>12}: mediana {resultados[nombre]:.3f}s  min {min(tiempos):.3f}s")
+    print(f"Aceleración: x{resultados['anterior'] / resultados['carga única']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Paridad y velocidad de los backends de embeddings (`backend_embeddings`)
+sobre nuestro corpus: las líneas del PDF de ejemplo (y de --pdf) más frases
+sintéticas. Con PyTorch en float32 como referencia reporta, para cada backend:
+
+- textos por segundo y aceleración (mejor de --repeticiones pasadas);
+- deriva de los vectores: similitud coseno con el vector de referencia
+  (media y mínima) para cada texto;
+- deriva de las métricas de `metricas.evaluar_preguntas` (relevancia,
+  distractores, cobertura y diversidad) sobre bancos de preguntas
+  sintéticos, guardando los vectores en el almacén como float32, float16
+  e int8 (`EMBEDDING_CACHE_DTYPE`).
+
+Los backends que no están disponibles (p. ej. onnx sin onnxruntime/optimum)
+se omiten. Requiere el modelo de `metricas` en disco o acceso a la red.
+
+Uso:
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --backends torch torch_int8 onnx_int8 --hilos 4 --batch 128
+    python -m benchmarks.bench_embeddings --pdf ia_generativa_tabla.pdf --textos 2000 --bancos 20
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.pdf_sintetico import PALABRAS, generar_pdf
+from extraccion_paralela import extraer_paginas
+
+PDF_EJEMPLO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ia_generativa_tabla.pdf")
+METRICAS = ("relevancia", "distractores", "cobertura", "diversidad")
+DTYPES = ("float32", "float16", "int8")
+
+
+def corpus(rutas: list[str], num_textos: int, semilla: int) -> tuple[list[str], list[str]]:
+    """Textos del corpus (líneas de 4 o más palabras) y el texto de cada página"""
+    paginas = []
+    for ruta in rutas:
+        paginas += [p.texto for p in extraer_paginas(ruta, workers=1) if p.texto.strip()]
+    lineas = [l.strip() for texto in paginas for l in texto.splitlines() if len(l.split()) >= 4]
+    rng = random.Random(semilla)
+    while len(lineas) < num_textos:
+        lineas.append(" ".join(rng.choice(PALABRAS) for _ in range(rng.randint(6, 24))))
+    return lineas[:num_textos], paginas
+
+
+def bancos_preguntas(lineas: list[str], paginas: list[str], num_bancos: int, semilla: int) -> list[tuple]:
+    """(texto, preguntas, ideas) con preguntas armadas a partir de las líneas del corpus"""
+    rng = random.Random(semilla)
+    bancos = []
+    for i in range(num_bancos):
+        texto = paginas[i % len(paginas)]
+        frases = [l for l in re.split(r"(?<=[.!?])\s+|\n", texto) if len(l.split()) >= 4] or lineas
+        preguntas = []
+        for _ in range(8):
+            opciones = rng.sample(lineas, 3) + [rng.choice(frases)]
+            rng.shuffle(opciones)
+            preguntas.append({
+                "question": f"¿Qué afirma el texto sobre {' '.join(rng.choice(frases).split()[:6])}?",
+                "options": opciones,
+                "correct_answer": opciones[0],
+            })
+        bancos.append((texto, preguntas, rng.sample(frases, min(5, len(frases)))))
+    return bancos
+
+
+def cronometrar(backend, textos: list[str], repeticiones: int) -> tuple[float, np.ndarray]:
+    backend.codificar(textos[:backend.batch])  # carga el modelo y calienta
+    mejor, vectores = float("inf"), None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        vectores = backend.codificar(textos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, vectores
+
+
+def medir_metricas(backend, dtype: str, bancos: list[tuple], directorio: str) -> np.ndarray:
+    """Métricas de cada banco con `backend` y los vectores en `dtype` (almacén e índice de keywords nuevos)"""
+    import metricas
+    from almacen_embeddings import AlmacenEmbeddings
+    from cache_etapas import hash_contenido
+    from indice_keywords import IndiceKeywords
+
+    directorio = os.path.join(directorio, f"{backend.identificador}-{dtype}")
+    almacen = AlmacenEmbeddings(os.path.join(directorio, "embeddings"), dtype=dtype)
+    indice = IndiceKeywords(os.path.join(directorio, "keywords"), metricas.obtener_stopwords(), dtype=dtype)
+    metricas.configurar_embeddings(backend, almacen, indice)
+    try:
+        # Como en el pipeline: los documentos entran al IDF antes de evaluarse
+        for texto, _, _ in bancos:
+            metricas.registrar_documento([texto], hash_contenido(texto))
+        return np.array([
+            [metricas.evaluar_preguntas(texto, preguntas, ideas)[m] for m in METRICAS]
+            for texto, preguntas, ideas in bancos
+        ])
+    finally:
+        metricas.configurar_embeddings()
+
+
+def main():
+    from almacen_embeddings import a_almacen, desde_almacen
+    from backend_embeddings import BACKENDS, crear_backend
+    from metricas import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--hilos", type=int, default=0, help="Hilos intra-op (0 = los de la biblioteca)")
+    parser.add_argument("--batch", type=int, default=64, help="Textos por pasada del modelo")
+    parser.add_argument("--pdf", nargs="*", default=[PDF_EJEMPLO], help="PDFs del corpus")
+    parser.add_argument("--paginas-sinteticas", type=int, default=10,
+                        help="Páginas de un PDF sintético que se suman al corpus")
+    parser.add_argument("--textos", type=int, default=1000, help="Textos a codificar")
+    parser.add_argument("--bancos", type=int, default=10, help="Bancos de preguntas para la deriva de métricas")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = list(args.pdf)
+        if args.paginas_sinteticas:
+            rutas.append(os.path.join(tmp, "sintetico.pdf"))
+            with open(rutas[-1], "wb") as f:
+                f.write(generar_pdf(args.paginas_sinteticas, semilla=args.semilla))
+        textos, paginas = corpus(rutas, args.textos, args.semilla)
+        bancos = bancos_preguntas(textos, paginas, args.bancos, args.semilla)
+        print(f"{len(textos)} textos ({sum(len(t) for t in textos) / len(textos):.0f} caracteres de media), "
+              f"{len(bancos)} bancos de preguntas; hilos={args.hilos or 'auto'} batch={args.batch}\n")
+
+        backends = {}
+        for nombre in ["torch"] + [b for b in args.backends if b != "torch"]:
+            backend = crear_backend(MODEL_NAME, nombre, args.hilos, args.batch)
+            if backend.nombre != nombre:
+                print(f"{nombre}: no disponible, se omite")
+                continue
+            backends[nombre] = backend
+
+        print(f"{'backend':<12}{'textos/s':>10}{'aceleración':>13}{'coseno medio':>14}{'coseno mín':>12}")
+        referencia, velocidad_ref = None, None
+        for nombre, backend in backends.items():
+            segundos, vectores = cronometrar(backend, textos, args.repeticiones)
+            velocidad = len(textos) / segundos
+            if referencia is None:
+                referencia, velocidad_ref = vectores, velocidad
+            cosenos = np.sum(vectores * referencia, axis=1)
+            print(f"{nombre:<12}{velocidad:>10.1f}{velocidad / velocidad_ref:>12.2f}x"
+                  f"{cosenos.mean():>14.5f}{cosenos.min():>12.5f}")
+
+        print("\nVectores de referencia guardados en el almacén:")
+        print(f"{'dtype':<12}{'bytes/vector':>13}{'coseno medio':>14}{'coseno mín':>12}")
+        for dtype in DTYPES:
+            filas = a_almacen(referencia, dtype)
+            cosenos = np.sum(desde_almacen(filas, dtype) * referencia, axis=1)
+            print(f"{dtype:<12}{filas[0].nbytes:>13}{cosenos.mean():>14.5f}{cosenos.min():>12.5f}")
+
+        print(f"\nDeriva de métricas frente a torch/float32 (diferencia absoluta media / máxima, en "
+              f"{len(bancos)} bancos):")
+        print(f"{'backend':<12}{'dtype':<9}" + "".join(f"{m:>24}" for m in METRICAS))
+        base = medir_metricas(backends["torch"], "float32", bancos, tmp)
+        for nombre, backend in backends.items():
+            for dtype in DTYPES:
+                valores = base if (nombre, dtype) == ("torch", "float32") else medir_metricas(backend, dtype, bancos, tmp)
+                deriva = np.abs(valores - base)
+                print(f"{nombre:<12}{dtype:<9}" + "".join(
+                    f"{d_media:>15.4f} / {d_max:<6.4f}" for d_media, d_max in zip(deriva.mean(axis=0), deriva.max(axis=0))
+                ))
+        print("\nReferencia (media): " + ", ".join(f"{m} {v:.3f}" for m, v in zip(METRICAS, base.mean(axis=0))))
+
+
+if __name__ == "__main__":
+    main()
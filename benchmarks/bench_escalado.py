@@ -0,0 +1,365 @@
+"""
+Suite de escalado de las etapas locales (CPU) del procesamiento:
+
+- texto: `extraer_pdf.extract_text_from_pdf` (texto y tablas de cada página);
+- tablas: `extraer_tabla.extraer_tablas` (solo tablas, CSV);
+- limpieza: `limpieza_texto.clean_text` sobre el texto de cada página;
+- metricas: `metricas.evaluar_preguntas` con los embeddings ya en el
+  almacén (el costo del modelo lo mide `bench_embeddings`).
+
+Genera PDFs sintéticos de 1 a 1000 páginas con distinta densidad de tablas y
+bancos de preguntas de distintos tamaños. Cada caso corre en un proceso
+nuevo y reporta el mejor tiempo de --repeticiones (las repeticiones se
+cortan al superar --segundos-por-caso), el throughput y cuánto sube el pico
+de memoria (VmHWM) sobre el RSS al empezar la etapa. Al final muestra las
+curvas de escalado de cada etapa con el exponente estimado (tiempo ~ n^k).
+
+--guardar escribe los resultados como línea base (JSON). --comparar vuelve a
+ejecutar la configuración de una línea base y falla si el tiempo o la
+memoria de algún caso empeoran más que --umbral (y más que las tolerancias
+absolutas, para no marcar ruido en los casos de milisegundos).
+
+Uso:
+    python -m benchmarks.bench_escalado
+    python -m benchmarks.bench_escalado --paginas 1 10 100 --densidades 0 0.5 --guardar base.json
+    python -m benchmarks.bench_escalado --comparar base.json --umbral 0.1
+    python -m benchmarks.bench_escalado --etapas limpieza metricas --preguntas 10 100 1000 --csv curvas.csv
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.pdf_sintetico import PALABRAS, generar_pdf
+
+ETAPAS = ("texto", "tablas", "limpieza", "metricas")
+# Etapas que recorren un PDF (el tamaño es en páginas); metricas escala con las preguntas
+ETAPAS_PDF = ("texto", "tablas", "limpieza")
+UNIDADES = {"texto": "páginas", "tablas": "páginas", "limpieza": "páginas", "metricas": "preguntas"}
+
+
+# --- Entradas sintéticas ---------------------------------------------------
+
+def _frase(rng: random.Random, palabras: int) -> str:
+    return " ".join(rng.choice(PALABRAS) for _ in range(palabras))
+
+
+def banco_preguntas(num_preguntas: int, semilla: int) -> dict:
+    """Texto, ideas y `num_preguntas` preguntas de opción múltiple sintéticas"""
+    rng = random.Random(semilla)
+    preguntas = []
+    for _ in range(num_preguntas):
+        opciones = [_frase(rng, rng.randint(3, 8)) for _ in range(4)]
+        preguntas.append({"question": _frase(rng, 12) + "?", "options": opciones, "correct_answer": opciones[0]})
+    return {
+        "texto": "\n".join(_frase(rng, 20) for _ in range(100)),
+        "ideas": [_frase(rng, 15) for _ in range(8)],
+        "preguntas": preguntas,
+    }
+
+
+# --- Medición (en el proceso hijo) -----------------------------------------
+
+def _memoria_mb(campo: str) -> float:
+    """VmRSS (actual) o VmHWM (pico) del proceso, en MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(campo + ":"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reiniciar_pico() -> bool:
+    # Linux permite volver el pico (VmHWM) al RSS actual, así la carga de la
+    # entrada y el calentamiento no tapan el pico de la etapa
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _preparar(args):
+    """Carga la entrada de la etapa y devuelve (función a medir, unidades procesadas)"""
+    if args.hijo == "texto":
+        from extraccion_paralela import iterar_paginas
+        from extraer_pdf import unir_texto
+
+        textos = []
+
+        def paginas():
+            for pagina in iterar_paginas(args.entrada, workers=1, tablas=False):
+                textos.append(pagina.texto)
+                yield pagina
+
+        def etapa():
+            # Lo mismo que `extract_text_from_pdf`, conservando el texto de
+            # cada página: es la entrada de la etapa de limpieza
+            textos.clear()
+            return unir_texto(paginas())
+
+        def guardar_textos():
+            with open(args.textos, "w", encoding="utf-8") as f:
+                json.dump(textos, f, ensure_ascii=False)
+        return etapa, args.tamano, guardar_textos
+    if args.hijo == "tablas":
+        from extraer_tabla import extraer_tablas
+        return (lambda: extraer_tablas(args.entrada, workers=1)), args.tamano, None
+    if args.hijo == "limpieza":
+        from limpieza_texto import clean_text
+        with open(args.textos, encoding="utf-8") as f:
+            textos = json.load(f)
+        return (lambda: [clean_text(t) for t in textos]), len(textos), None
+    if args.hijo == "metricas":
+        from cache_etapas import hash_contenido
+        from metricas import evaluar_preguntas, registrar_documento
+        with open(args.entrada, encoding="utf-8") as f:
+            banco = json.load(f)
+
+        def etapa():
+            return evaluar_preguntas(banco["texto"], banco["preguntas"], banco["ideas"])
+        # Fuera de la medición, como hace el pipeline antes de las métricas:
+        # el documento entra al IDF de las keywords. La primera evaluación
+        # carga el modelo y guarda los embeddings de las preguntas y keywords
+        registrar_documento([banco["texto"]], hash_contenido(banco["texto"]))
+        etapa()
+        return etapa, len(banco["preguntas"]), None
+    raise ValueError(f"Etapa desconocida: {args.hijo!r}")
+
+
+def medir_hijo(args) -> None:
+    """Se ejecuta en un proceso nuevo: mide una etapa e imprime el resultado como JSON"""
+    etapa, unidades, despues = _preparar(args)
+    base = _memoria_mb("VmRSS") if _reiniciar_pico() else _memoria_mb("VmHWM")
+    tiempos = []
+    comienzo = time.perf_counter()
+    while len(tiempos) < args.repeticiones and (not tiempos or time.perf_counter() - comienzo < args.segundos_por_caso):
+        inicio = time.perf_counter()
+        etapa()
+        tiempos.append(time.perf_counter() - inicio)
+    memoria = _memoria_mb("VmHWM") - base
+    if despues:
+        despues()
+    print(json.dumps({
+        "segundos": min(tiempos),
+        "segundos_mediana": statistics.median(tiempos),
+        "repeticiones": len(tiempos),
+        "memoria_mb": memoria,
+        "unidades": unidades,
+    }))
+
+
+# --- Ejecución de la suite -------------------------------------------------
+
+def casos(config: dict) -> list:
+    """(etapa, tamaño, densidad) de cada caso, en el orden en que se ejecutan"""
+    lista = []
+    for paginas in config["paginas"]:
+        for densidad in config["densidades"]:
+            lista += [(e, paginas, densidad) for e in ETAPAS_PDF if e in config["etapas"]]
+    if "metricas" in config["etapas"]:
+        lista += [("metricas", n, None) for n in config["preguntas"]]
+    return lista
+
+
+def _ejecutar_hijo(etapa: str, tamano: int, entrada: str, textos: str, config: dict) -> dict:
+    comando = [sys.executable, "-m", "benchmarks.bench_escalado", "--hijo", etapa, "--entrada", entrada,
+               "--tamano", str(tamano), "--textos", textos, "--repeticiones", str(config["repeticiones"]),
+               "--segundos-por-caso", str(config["segundos_por_caso"])]
+    salida = subprocess.run(comando, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def ejecutar(config: dict, directorio: str) -> list:
+    resultados = []
+    documentos = {}
+    print(f"{'etapa':<10}{'tamaño':>8}{'densidad':>9}{'reps':>6}{'tiempo (s)':>12}{'por segundo':>13}{'memoria (MB)':>14}")
+    for etapa, tamano, densidad in casos(config):
+        if etapa == "metricas":
+            entrada = os.path.join(directorio, f"preguntas_{tamano}.json")
+            with open(entrada, "w", encoding="utf-8") as f:
+                json.dump(banco_preguntas(tamano, config["semilla"]), f, ensure_ascii=False)
+        else:
+            entrada = documentos.get((tamano, densidad))
+            if entrada is None:
+                entrada = os.path.join(directorio, f"doc_{tamano}_{densidad}.pdf")
+                with open(entrada, "wb") as f:
+                    f.write(generar_pdf(tamano, densidad, config["semilla"]))
+                documentos[(tamano, densidad)] = entrada
+        textos = os.path.join(directorio, f"textos_{tamano}_{densidad}.json")
+        if etapa == "limpieza" and not os.path.exists(textos):
+            # Sin la etapa de texto en esta ejecución: se extrae solo para tener la entrada
+            from extraccion_paralela import iterar_paginas
+            with open(textos, "w", encoding="utf-8") as f:
+                json.dump([p.texto for p in iterar_paginas(entrada, workers=1, tablas=False)], f,
+                          ensure_ascii=False)
+        m = _ejecutar_hijo(etapa, tamano, entrada, textos, config)
+        r = {"etapa": etapa, "tamano": tamano, "densidad": densidad, **m,
+             "por_segundo": m["unidades"] / m["segundos"] if m["segundos"] else float("inf")}
+        resultados.append(r)
+        print(f"{etapa:<10}{tamano:>8}{'-' if densidad is None else densidad:>9}{r['repeticiones']:>6}"
+              f"{r['segundos']:>12.4f}{r['por_segundo']:>13.1f}{r['memoria_mb']:>14.1f}")
+    return resultados
+
+
+def exponente(puntos: list) -> float:
+    """Pendiente de log(tiempo) frente a log(tamaño) por mínimos cuadrados"""
+    puntos = [(math.log(n), math.log(t)) for n, t in puntos if n > 0 and t > 0]
+    if len(puntos) < 2:
+        return float("nan")
+    media_x = statistics.fmean(x for x, _ in puntos)
+    media_y = statistics.fmean(y for _, y in puntos)
+    varianza = sum((x - media_x) ** 2 for x, _ in puntos)
+    if not varianza:
+        return float("nan")
+    return sum((x - media_x) * (y - media_y) for x, y in puntos) / varianza
+
+
+def mostrar_curvas(resultados: list) -> None:
+    series: dict = {}
+    for r in resultados:
+        series.setdefault((r["etapa"], r["densidad"]), []).append(r)
+    for (etapa, densidad), filas in series.items():
+        unidad = UNIDADES[etapa]
+        titulo = etapa if densidad is None else f"{etapa} (densidad de tablas {densidad})"
+        k = exponente([(r["tamano"], r["segundos"]) for r in filas])
+        print(f"\n{titulo}" + ("" if math.isnan(k) else f": tiempo ~ n^{k:.2f}"))
+        print(f"  {unidad:>10}{'tiempo (s)':>12}{'ms por unidad':>15}{unidad + '/s':>14}{'memoria (MB)':>14}")
+        for r in sorted(filas, key=lambda r: r["tamano"]):
+            print(f"  {r['tamano']:>10}{r['segundos']:>12.4f}{1000 * r['segundos'] / max(r['unidades'], 1):>15.3f}"
+                  f"{r['por_segundo']:>14.1f}{r['memoria_mb']:>14.1f}")
+
+
+def entorno() -> dict:
+    import numpy
+    import pdfminer
+    import pdfplumber
+
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "pdfplumber": pdfplumber.__version__,
+        "pdfminer": pdfminer.__version__,
+        "numpy": numpy.__version__,
+    }
+
+
+def comparar(base: dict, resultados: list, umbral: float, tolerancia_s: float, tolerancia_mb: float) -> int:
+    """Muestra cada caso frente a la línea base y devuelve la cantidad de regresiones"""
+    if base["entorno"] != entorno():
+        print("\nAviso: la línea base se midió en otro entorno:")
+        actual = entorno()
+        for clave, valor in base["entorno"].items():
+            if actual.get(clave) != valor:
+                print(f"  {clave}: {valor} -> {actual.get(clave)}")
+
+    previos = {(r["etapa"], r["tamano"], r["densidad"]): r for r in base["resultados"]}
+    regresiones = 0
+    print(f"\nComparación con la línea base del {base['fecha']} (umbral {umbral:.0%}):")
+    print(f"{'etapa':<10}{'tamaño':>8}{'densidad':>9}{'base (s)':>11}{'actual (s)':>12}{'x':>7}"
+          f"{'base (MB)':>11}{'actual (MB)':>13}  estado")
+    for r in resultados:
+        previo = previos.get((r["etapa"], r["tamano"], r["densidad"]))
+        if previo is None:
+            continue
+        razon = r["segundos"] / previo["segundos"] if previo["segundos"] else float("inf")
+        peor_tiempo = razon > 1 + umbral and r["segundos"] - previo["segundos"] > tolerancia_s
+        peor_memoria = (r["memoria_mb"] > previo["memoria_mb"] * (1 + umbral)
+                        and r["memoria_mb"] - previo["memoria_mb"] > tolerancia_mb)
+        estados = [nombre for nombre, peor in (("tiempo", peor_tiempo), ("memoria", peor_memoria)) if peor]
+        if estados:
+            regresiones += 1
+            estado = "REGRESIÓN " + " y ".join(estados)
+        elif razon < 1 - umbral and previo["segundos"] - r["segundos"] > tolerancia_s:
+            estado = "mejora"
+        else:
+            estado = "ok"
+        densidad = "-" if r["densidad"] is None else r["densidad"]
+        print(f"{r['etapa']:<10}{r['tamano']:>8}{densidad:>9}{previo['segundos']:>11.4f}{r['segundos']:>12.4f}"
+              f"{razon:>7.2f}{previo['memoria_mb']:>11.1f}{r['memoria_mb']:>13.1f}  {estado}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="Tamaños de documento (páginas)")
+    parser.add_argument("--densidades", type=float, nargs="+", default=[0.0, 0.3],
+                        help="Fracción de páginas con tabla")
+    parser.add_argument("--preguntas", type=int, nargs="+", default=[10, 50, 200],
+                        help="Tamaños de los bancos de preguntas (metricas)")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones por caso (se toma la mejor)")
+    parser.add_argument("--segundos-por-caso", type=float, default=20.0,
+                        help="No se repite un caso cuando ya lleva más que esto")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--guardar", help="Guardar los resultados como línea base en este archivo JSON")
+    parser.add_argument("--csv", help="Guardar los resultados (un caso por fila) en este archivo CSV")
+    parser.add_argument("--comparar", help="Línea base JSON: repite su configuración y marca las regresiones")
+    parser.add_argument("--umbral", type=float, default=0.15, help="Empeoramiento relativo que cuenta como regresión")
+    parser.add_argument("--tolerancia-ms", type=float, default=5.0,
+                        help="Diferencias de tiempo menores que esto no son regresión")
+    parser.add_argument("--tolerancia-mb", type=float, default=8.0,
+                        help="Diferencias de memoria menores que esto no son regresión")
+    parser.add_argument("--hijo", choices=ETAPAS, help=argparse.SUPPRESS)
+    parser.add_argument("--entrada", help=argparse.SUPPRESS)
+    parser.add_argument("--tamano", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--textos", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        medir_hijo(args)
+        return
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        config = base["config"]
+    else:
+        config = {clave: getattr(args, clave) for clave in
+                  ("etapas", "paginas", "densidades", "preguntas", "repeticiones", "segundos_por_caso", "semilla")}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Los procesos hijos heredan el entorno: cachés de metricas vacías y temporales
+        os.environ.update({
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+            "KEYWORDS_INDICE_DIR": os.path.join(tmp, "indice_keywords"),
+        })
+        resultados = ejecutar(config, tmp)
+    mostrar_curvas(resultados)
+
+    datos = {"fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "entorno": entorno(), "config": config,
+             "resultados": resultados}
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        print(f"\nLínea base guardada en {args.guardar}")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=list(resultados[0]))
+            escritor.writeheader()
+            escritor.writerows(resultados)
+    if base is not None:
+        regresiones = comparar(base, resultados, args.umbral, args.tolerancia_ms / 1000, args.tolerancia_mb)
+        if regresiones:
+            raise SystemExit(f"{regresiones} casos empeoraron más de {args.umbral:.0%} respecto de la línea base")
+
+
+if __name__ == "__main__":
+    main()
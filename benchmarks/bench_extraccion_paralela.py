@@ -0,0 +1,50 @@
+"""
+Mide la extracción de páginas secuencial frente al pool de procesos y
+comprueba que ambos caminos devuelven exactamente lo mismo.
+
+Uso:
+    python -m benchmarks.bench_extraccion_paralela --paginas 300 --workers 1 4 16
+"""
+import argparse
+import os
+import time
+
+from benchmarks.pdf_sintetico import generar_pdf
+from extraccion_paralela import extraer_paginas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF a medir (por defecto se genera uno sintético)")
+    parser.add_argument("--paginas", type=int, default=100, help="Páginas del PDF sintético")
+    parser.add_argument("--densidad-tablas", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--paginas-por-bloque", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            datos = f.read()
+    else:
+        datos = generar_pdf(args.paginas, args.densidad_tablas)
+
+    referencia = None
+    base = None
+    print(f"CPUs disponibles: {os.cpu_count()}")
+    for workers in sorted(set(args.workers)):
+        inicio = time.perf_counter()
+        paginas = extraer_paginas(datos, workers=workers, paginas_por_bloque=args.paginas_por_bloque)
+        duracion = time.perf_counter() - inicio
+        if referencia is None:
+            referencia, base = paginas, duracion
+        identico = paginas == referencia
+        print(
+            f"workers={workers:>3}: {duracion:.2f}s  {len(paginas) / duracion:.1f} pág/s  "
+            f"x{base / duracion:.2f}  {'idéntico' if identico else 'DIFERENTE'}"
+        )
+        if not identico:
+            raise SystemExit("El resultado paralelo difiere del secuencial")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Mide el filtro previo de páginas sin tablas y comprueba su exhaustividad:
+con el filtro seguro (nivel 1) las tablas extraídas deben ser idénticas a
+las de buscar en todas las páginas.
+
+Para cada PDF se mide la etapa de tablas sola (`texto=False`, como
+`extraer_tablas`) y la extracción de una pasada (texto + tablas) del pipeline.
+
+Uso:
+    python -m benchmarks.bench_filtro_tablas
+    python -m benchmarks.bench_filtro_tablas --paginas 300 --densidad-tablas 0.1 --pdf otro.pdf
+"""
+import argparse
+import os
+import time
+
+from benchmarks.pdf_sintetico import generar_pdf
+from extraccion_paralela import extraer_paginas
+
+
+def medir(datos: bytes, texto: bool, filtro: int):
+    inicio = time.perf_counter()
+    paginas = extraer_paginas(datos, workers=1, texto=texto, filtro_tablas=filtro)
+    return paginas, time.perf_counter() - inicio
+
+
+def exhaustividad(referencia, paginas) -> float:
+    """Fracción de tablas de la referencia que el filtro conserva"""
+    total = encontradas = 0
+    for ref, pag in zip(referencia, paginas):
+        for tabla in ref.tablas:
+            total += 1
+            encontradas += tabla in pag.tablas
+    return encontradas / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDFs reales adicionales")
+    parser.add_argument("--paginas", type=int, default=100, help="Páginas del PDF sintético")
+    parser.add_argument("--densidad-tablas", type=float, default=0.1)
+    args = parser.parse_args()
+
+    documentos = {f"sintético ({args.paginas} págs)": generar_pdf(args.paginas, args.densidad_tablas)}
+    for ruta in ["ia_generativa_tabla.pdf", *args.pdf]:
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as f:
+                documentos[ruta] = f.read()
+
+    fallos = 0
+    for nombre, datos in documentos.items():
+        print(f"\n{nombre}")
+        for texto, etapa in ((False, "solo tablas"), (True, "texto + tablas")):
+            referencia, base = medir(datos, texto, 0)
+            print(f"  {etapa:<15} sin filtro: {base:7.2f}s  ({sum(len(p.tablas) for p in referencia)} tablas)")
+            for filtro in (1, 2):
+                paginas, duracion = medir(datos, texto, filtro)
+                omitidas = [p.numero for p in paginas if p.tablas_omitidas]
+                identico = [p.tablas for p in paginas] == [p.tablas for p in referencia]
+                recall = exhaustividad(referencia, paginas)
+                print(
+                    f"  {etapa:<15} filtro {filtro}:   {duracion:7.2f}s  x{base / duracion:5.1f}  "
+                    f"exhaustividad {recall:.0%}  {'idéntico' if identico else 'DIFERENTE'}  "
+                    f"{len(omitidas)}/{len(paginas)} páginas omitidas"
+                )
+                if len(omitidas) <= 20:
+                    print(f"      omitidas: {omitidas}")
+                if filtro == 1 and not identico:
+                    fallos += 1
+    if fallos:
+        raise SystemExit("El filtro seguro cambió las tablas extraídas")
+
+
+if __name__ == "__main__":
+    main()
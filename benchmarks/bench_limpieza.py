@@ -0,0 +1,148 @@
+"""
+Compara `limpieza_texto.clean_text` / `clean_texts` con la implementación
+original (copiada abajo como referencia) y verifica que el resultado sea
+idéntico byte a byte.
+
+Casos:
+- textos aleatorios con HTML, tildes, caracteres combinantes, espacios y
+  separadores de línea Unicode (prueba diferencial);
+- entradas de varios megabytes;
+- las celdas de un documento con muchas tablas.
+
+Uso:
+    python -m benchmarks.bench_limpieza
+    python -m benchmarks.bench_limpieza --megas 8 --casos 20000 --pdf ia_generativa_tabla.pdf
+"""
+import argparse
+import random
+import re
+import time
+import unicodedata
+
+from benchmarks.pdf_sintetico import PALABRAS, generar_pdf
+from extraccion_paralela import extraer_paginas
+from limpieza_texto import clean_text, clean_texts
+
+
+def clean_text_original(text: str, lowercase: bool = True, remove_punctuation: bool = True) -> str:
+    """Implementación anterior, sin cambios, como referencia"""
+    text = re.sub(r'<[^>]+>', ' ', text)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'\n[ \t]*\n[ \t\n]*', '\n', text)
+    text = re.sub(r"[ ]{2,}", " ", text)
+    if lowercase:
+        text = text.lower()
+    if remove_punctuation:
+        text = re.sub(r"[^\w\s]", "", text)
+    lines = [line.strip() for line in text.splitlines()]
+    text = "\n".join(lines)
+    return text.strip()
+
+
+# Fragmentos que ejercitan cada paso de la limpieza
+PIEZAS = [
+    "<b>", "</p>", "<a href='x'>", "<", ">", "<>", "a<b", " ", "  ", "\t", "\n", "\n \n", "\n\t\n\n",
+    "\r\n", "\r", "\x0b", "\x0c", "\x1c", "\x1e", "\x85", " ", " ", " ", "　",
+    "á", "É", "ñ", "Ñ", "ü", "ç", "é", "ñ", "İ", "ß", "ﬁ", "K", "Å", "²", "½", "Ⅻ",
+    "ǅ", "ﬀ", "ｶ", "한", "한국어 텍스트", "中文", "\ud800", "ا", "😀", "‐", "—", "¿", "¡", "%", "$", "_", "-", ",", ".", ";",
+    "0", "42", "3.14", "Δ", "σς", "Ω",
+]
+
+
+def texto_aleatorio(rng: random.Random, piezas: int) -> str:
+    partes = []
+    for _ in range(piezas):
+        if rng.random() < 0.5:
+            partes.append(rng.choice(PALABRAS))
+        else:
+            partes.append(rng.choice(PIEZAS))
+    return "".join(partes)
+
+
+def verificar(casos, opciones=((True, True), (True, False), (False, True), (False, False))) -> int:
+    diferencias = 0
+    for texto in casos:
+        for lowercase, remove_punctuation in opciones:
+            esperado = clean_text_original(texto, lowercase, remove_punctuation)
+            obtenido = clean_text(texto, lowercase, remove_punctuation)
+            if obtenido != esperado:
+                diferencias += 1
+                if diferencias <= 5:
+                    print(f"DIFERENCIA lowercase={lowercase} remove_punctuation={remove_punctuation}: {texto!r}")
+                    print(f"  esperado: {esperado!r}\n  obtenido: {obtenido!r}")
+    return diferencias
+
+
+def cronometrar(funcion, *args, repeticiones: int = 3) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def comparar(nombre: str, original, nueva, *args) -> None:
+    t_original = cronometrar(original, *args)
+    t_nueva = cronometrar(nueva, *args)
+    print(f"{nombre:<36} original {t_original * 1000:9.1f} ms   nuevo {t_nueva * 1000:9.1f} ms   x{t_original / t_nueva:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", type=int, default=5000, help="Textos aleatorios de la prueba diferencial")
+    parser.add_argument("--megas", type=float, default=4, help="Tamaño de las entradas grandes (MB)")
+    parser.add_argument("--paginas", type=int, default=60, help="Páginas del PDF sintético con tablas")
+    parser.add_argument("--pdf", help="PDF real adicional (texto y celdas)")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.semilla)
+
+    # Prueba diferencial
+    casos = [texto_aleatorio(rng, rng.randint(0, 40)) for _ in range(args.casos)]
+    casos += ["", " ", "\n", "<", "<>", "\n\n", "  a  ", "İ", "K"] + PIEZAS
+    documentos = [generar_pdf(args.paginas, densidad_tablas=0.9, semilla=args.semilla)]
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            documentos.append(f.read())
+    paginas = [p for datos in documentos for p in extraer_paginas(datos)]
+    textos_paginas = [p.texto for p in paginas]
+    celdas = [c if c is not None else "" for p in paginas for t in p.tablas for fila in t for c in fila]
+    diferencias = verificar(casos + textos_paginas + celdas)
+    if clean_texts(celdas) != [clean_text_original(c) for c in celdas]:
+        diferencias += 1
+        print("DIFERENCIA en clean_texts")
+    print(f"Prueba diferencial: {len(casos) + len(textos_paginas) + len(celdas)} textos x 4 combinaciones, "
+          f"{diferencias} diferencias")
+    if diferencias:
+        raise SystemExit("clean_text no coincide con la implementación original")
+
+    # Rendimiento
+    tam = int(args.megas * 1024 * 1024)
+    ascii_grande = (" ".join(textos_paginas) * (tam // max(1, len(" ".join(textos_paginas))) + 1))[:tam]
+    espanol = "La <b>información</b> está en    el índice;\n \n¿Qué métricas evalúan la educación? "
+    espanol_grande = (espanol * (tam // len(espanol) + 1))[:tam]
+    mixto_grande = "".join(texto_aleatorio(rng, 40) for _ in range(tam // 200))[:tam]
+    # Muchos caracteres distintos que cambian al normalizar (sílabas hangul)
+    hangul_grande = "".join(chr(rng.randint(0xAC00, 0xD7A3)) + rng.choice(" ,.\n") for _ in range(tam // 2))
+    grandes = [ascii_grande, espanol_grande, mixto_grande, hangul_grande]
+    diferencias = verificar(grandes, opciones=((True, True), (False, False)))
+    print(f"Prueba diferencial con entradas grandes: {diferencias} diferencias")
+    if diferencias:
+        raise SystemExit("clean_text no coincide con la implementación original")
+
+    comparar(f"ASCII {args.megas:g} MB", clean_text_original, clean_text, ascii_grande)
+    comparar(f"Español con tildes {args.megas:g} MB", clean_text_original, clean_text, espanol_grande)
+    comparar(f"Unicode mixto {args.megas:g} MB", clean_text_original, clean_text, mixto_grande)
+    comparar(f"Hangul {args.megas:g} MB", clean_text_original, clean_text, hangul_grande)
+    comparar(f"Páginas ({len(textos_paginas)})",
+             lambda ts: [clean_text_original(t) for t in ts], lambda ts: [clean_text(t) for t in ts], textos_paginas)
+    comparar(f"Celdas una a una ({len(celdas)})",
+             lambda cs: [clean_text_original(c) for c in cs], lambda cs: [clean_text(c) for c in cs], celdas)
+    comparar(f"Celdas con clean_texts ({len(celdas)})",
+             lambda cs: [clean_text_original(c) for c in cs], clean_texts, celdas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Pico de memoria frente al tamaño del documento, con y sin el modo de
+memoria baja (`OpcionesPipeline.memoria_baja`). Genera PDFs sintéticos de
+distinto número de páginas, cada una con una imagen de fondo como un
+escaneo, y procesa cada uno en un proceso nuevo para medir su pico de RSS:
+por defecto huellas, extracción, limpieza y tablas; con --completo el
+pipeline entero contra los servidores LLM simulados (usa el modelo de
+embeddings de `metricas`).
+
+Uso:
+    python -m benchmarks.bench_memoria
+    python -m benchmarks.bench_memoria --paginas 50 200 800 --kb-imagen 1024 --workers 2
+    python -m benchmarks.bench_memoria --completo --latencia 0.2
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.pdf_sintetico import generar_pdf
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+MODOS = ("normal", "memoria_baja")
+
+
+def _rss_pico_mb() -> float:
+    # VmHWM es el pico del proceso actual; ru_maxrss (en KB en Linux) además
+    # conserva el del proceso padre al momento de crearlo
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir_hijo(args) -> None:
+    """Se ejecuta en un proceso nuevo: procesa el PDF e imprime su medición como JSON"""
+    from pipeline import AcumuladorPaginas, OpcionesPipeline, procesar_documento, procesar_paginas
+    from documento_pdf import huellas_paginas
+
+    memoria_baja = args.modo == "memoria_baja"
+    base = _rss_pico_mb()
+    inicio = time.perf_counter()
+    if args.completo:
+        from cache_etapas import CacheEtapas
+
+        opciones = OpcionesPipeline(workers=args.workers, memoria_baja=memoria_baja)
+        resultado = procesar_documento(args.hijo, opciones, CacheEtapas(args.cache))
+        paginas = resultado.num_paginas
+        caracteres = sum(len(t) for t in resultado.paginas_limpias)
+    else:
+        huellas_paginas(args.hijo, memoria_baja)
+        acumulado = AcumuladorPaginas(en_disco=memoria_baja)
+        for pagina in procesar_paginas(args.hijo, args.workers, memoria_baja=memoria_baja):
+            acumulado.agregar(pagina)
+        paginas = acumulado.paginas
+        caracteres = sum(len(t) for t in acumulado.paginas_limpias)
+    print(json.dumps({
+        "segundos": time.perf_counter() - inicio,
+        "rss_base_mb": base,
+        "rss_pico_mb": _rss_pico_mb(),
+        "rss_pico_workers_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "paginas": paginas,
+        "caracteres": caracteres,
+    }))
+
+
+def medir(ruta: str, modo: str, args, directorio: str) -> dict:
+    comando = [sys.executable, "-m", "benchmarks.bench_memoria", "--hijo", ruta, "--modo", modo,
+               "--workers", str(args.workers), "--cache", os.path.join(directorio, f"cache_{modo}")]
+    if args.completo:
+        comando.append("--completo")
+    salida = subprocess.run(comando, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[20, 80, 320],
+                        help="Tamaños de documento (páginas)")
+    parser.add_argument("--kb-imagen", type=int, default=512, help="KB de la imagen de cada página (0 = sin imagen)")
+    parser.add_argument("--densidad-tablas", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para extraer páginas")
+    parser.add_argument("--completo", action="store_true",
+                        help="Pipeline completo (LLMs simulados y métricas) en vez de solo la extracción")
+    parser.add_argument("--hijo", help=argparse.SUPPRESS)
+    parser.add_argument("--modo", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--cache", help=argparse.SUPPRESS)
+    argumentos_simulacion(parser)
+    args = parser.parse_args()
+    if args.hijo:
+        medir_hijo(args)
+        return
+
+    config = config_desde_argumentos(args)
+    with tempfile.TemporaryDirectory() as tmp, servidores_simulados(config) as (gemini, openai):
+        # Los procesos hijos heredan el entorno
+        os.environ.update({
+            "GEMINI_BASE_URL": gemini.url,
+            "DEEPSEEK_BASE_URL": openai.url,
+            "GEMINI_API_KEY": "simulada",
+            "DEEPSEEK_API_KEY": "simulada",
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+            "KEYWORDS_INDICE_DIR": os.path.join(tmp, "indice_keywords"),
+            "MEMORIA_BAJA_DIR": tmp,
+        })
+        print(f"{'páginas':>8}{'PDF (MB)':>10}  {'modo':<14}{'base (MB)':>10}{'pico (MB)':>11}"
+              f"{'pico - base':>13}{'tiempo (s)':>12}")
+        for num_paginas in args.paginas:
+            ruta = os.path.join(tmp, f"doc_{num_paginas}.pdf")
+            with open(ruta, "wb") as f:
+                f.write(generar_pdf(num_paginas, args.densidad_tablas, args.semilla,
+                                    bytes_imagen=args.kb_imagen * 1024))
+            tamano = os.path.getsize(ruta) / 2**20
+            caracteres = set()
+            for modo in MODOS:
+                m = medir(ruta, modo, args, tmp)
+                caracteres.add(m["caracteres"])
+                pico = max(m["rss_pico_mb"], m["rss_pico_workers_mb"])
+                print(f"{num_paginas:>8}{tamano:>10.1f}  {modo:<14}{m['rss_base_mb']:>10.1f}{pico:>11.1f}"
+                      f"{pico - m['rss_base_mb']:>13.1f}{m['segundos']:>12.2f}")
+            if len(caracteres) > 1:
+                raise SystemExit(f"El texto limpio difiere entre modos en el documento de {num_paginas} páginas")
+            os.remove(ruta)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compara la generación de preguntas con y sin streaming contra el servidor
+DeepSeek simulado: tiempo hasta la primera pregunta completa y tiempo total.
+Con `--tasa-corte` se cortan streams a la mitad para comprobar que solo se
+pierde la pregunta incompleta del final.
+
+Uso:
+    python -m benchmarks.bench_preguntas_stream
+    python -m benchmarks.bench_preguntas_stream --preguntas 12 --segundos-por-1k-tokens-salida 30 --tasa-corte 0.3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+
+async def generar(ideas, num_preguntas: int, stream: bool, repeticiones: int):
+    from clientes_llm import SesionLLM
+    from deepseek_client import call_deepseek_async
+
+    resultados = []
+    async with SesionLLM() as sesion:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            llegadas = []
+            preguntas = await call_deepseek_async(
+                ideas, num_preguntas, sesion, stream=stream,
+                al_recibir_pregunta=lambda q: llegadas.append(time.perf_counter() - inicio),
+            )
+            resultados.append((llegadas[0] if llegadas else None, time.perf_counter() - inicio, len(preguntas)))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preguntas", type=int, default=8)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    argumentos_simulacion(parser)
+    parser.set_defaults(segundos_por_1k_tokens_salida=20.0, jitter=0.0)
+    args = parser.parse_args()
+    ideas = [f"Idea número {i + 1} sobre el contenido del documento" for i in range(args.preguntas)]
+
+    with servidores_simulados(config_desde_argumentos(args)) as (_, deepseek):
+        os.environ["DEEPSEEK_BASE_URL"] = deepseek.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "simulada")
+        for stream in (False, True):
+            resultados = asyncio.run(generar(ideas, args.preguntas, stream, args.repeticiones))
+            primeras = [r[0] for r in resultados if r[0] is not None]
+            print(
+                f"{'streaming' if stream else 'sin stream':<11} "
+                f"primera pregunta {statistics.median(primeras) if primeras else float('nan'):6.2f}s   "
+                f"total {statistics.median(r[1] for r in resultados):6.2f}s   "
+                f"preguntas por respuesta {[r[2] for r in resultados]}"
+            )
+        print(f"Servidor: {dict(deepseek.contadores)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compara el prompt del analizador de tablas con el CSV completo y con el
+resumen local (`tabla_estructurada.resumen_para_prompt`): tokens estimados,
+tiempo de armar el resumen y latencia de la llamada contra el servidor Gemini
+simulado (cuya latencia crece con los tokens del prompt).
+
+Casos: las tablas de un PDF sintético y tablas numéricas grandes generadas
+directamente (sin PDF).
+
+Uso:
+    python -m benchmarks.bench_resumen_tablas
+    python -m benchmarks.bench_resumen_tablas --tablas 20 --filas 2000 --max-tokens 1500 --latencia-por-1k-tokens 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.pdf_sintetico import PALABRAS, generar_pdf
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+from extraccion_paralela import extraer_paginas
+from extraer_tabla import tablas_de_paginas
+from fragmentacion import estimar_tokens
+from limpieza_texto import clean_texts
+from tabla_estructurada import MAX_TOKENS_TABLAS, estructurar_tabla, resumen_para_prompt
+
+
+def tablas_grandes(cantidad: int, filas: int, columnas: int, semilla: int = 0):
+    rng = random.Random(semilla)
+    tablas = []
+    for t in range(cantidad):
+        crudas = [["categoria"] + [f"medida {c}" for c in range(1, columnas)]]
+        for _ in range(filas):
+            crudas.append([rng.choice(PALABRAS)] + [f"{rng.uniform(0, 10000):,.2f}" for _ in range(1, columnas)])
+        celdas = clean_texts(c for fila in crudas for c in fila)
+        limpias = [celdas[i * columnas:(i + 1) * columnas] for i in range(len(crudas))]
+        tablas.append(estructurar_tabla(t + 1, 0, limpias, crudas))
+    return tablas
+
+
+async def analizar(texto: str) -> float:
+    from clientes_llm import SesionLLM
+    from gemini_client_analyser import call_gemini_analyzer_async
+
+    async with SesionLLM() as sesion:
+        inicio = time.perf_counter()
+        await call_gemini_analyzer_async(texto, sesion)
+        return time.perf_counter() - inicio
+
+
+def comparar(nombre: str, tablas, max_tokens: int) -> None:
+    csv = "".join(t.a_csv() for t in tablas)
+    inicio = time.perf_counter()
+    resumen = resumen_para_prompt(tablas, max_tokens)
+    t_resumen = time.perf_counter() - inicio
+    t_csv = asyncio.run(analizar(csv))
+    t_llamada = asyncio.run(analizar(resumen))
+    print(f"\n{nombre}: {len(tablas)} tablas, {sum(t.num_filas for t in tablas)} filas")
+    print(f"  CSV completo   {estimar_tokens(csv):>9} tokens   llamada {t_csv:6.2f}s")
+    print(f"  resumen local  {estimar_tokens(resumen):>9} tokens   llamada {t_llamada:6.2f}s   "
+          f"(armado {t_resumen * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, default=60, help="Páginas del PDF sintético")
+    parser.add_argument("--tablas", type=int, default=10, help="Tablas numéricas grandes")
+    parser.add_argument("--filas", type=int, default=1000)
+    parser.add_argument("--columnas", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS_TABLAS)
+    argumentos_simulacion(parser)
+    parser.set_defaults(latencia_por_1k_tokens=0.2, jitter=0.0)
+    args = parser.parse_args()
+
+    with servidores_simulados(config_desde_argumentos(args)) as (gemini, _):
+        os.environ["GEMINI_BASE_URL"] = gemini.url
+        os.environ.setdefault("GEMINI_API_KEY", "simulada")
+        paginas = extraer_paginas(generar_pdf(args.paginas, densidad_tablas=0.5), texto=False)
+        comparar(f"PDF sintético ({args.paginas} págs)", tablas_de_paginas(paginas), args.max_tokens)
+        comparar("Tablas numéricas grandes", tablas_grandes(args.tablas, args.filas, args.columnas), args.max_tokens)
+
+
+if __name__ == "__main__":
+    main()
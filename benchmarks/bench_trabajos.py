@@ -0,0 +1,134 @@
+"""
+Cola de trabajos y servicio de embeddings compartido.
+
+1. Envía N documentos sintéticos a la vez a `trabajos.ColaTrabajos` contra
+   los servidores LLM simulados y reporta los admitidos y rechazados por la
+   cola, la espera en cola y la duración de cada trabajo (p50/p95), y cuánto
+   tarda en detenerse un trabajo cancelado a mitad de las etapas LLM.
+2. Varios hilos piden embeddings de pocos textos a la vez (como el filtro
+   de preguntas duplicadas de varias sesiones): llamando al modelo desde
+   cada hilo frente a pasar por `servicio_embeddings.ServicioEmbeddings`.
+   Usa el modelo de embeddings de `metricas`.
+
+Uso:
+    python -m benchmarks.bench_trabajos
+    python -m benchmarks.bench_trabajos --documentos 12 --workers 2 --max-en-cola 6 --hilos 16 --latencia 1.0
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.pdf_sintetico import PALABRAS, generar_pdf
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+
+def _percentiles(valores: list) -> str:
+    if not valores:
+        return "-"
+    p50, p95 = np.percentile(valores, [50, 95])
+    return f"p50 {p50:6.2f}s  p95 {p95:6.2f}s"
+
+
+def medir_cola(args, directorio: str) -> None:
+    from cache_etapas import CacheEtapas
+    from trabajos import ColaLlena, ColaTrabajos
+
+    cola = ColaTrabajos(workers=args.workers, max_en_cola=args.max_en_cola,
+                        cache=CacheEtapas(os.path.join(directorio, "cache_etapas")))
+    admitidos, rechazados = [], 0
+    for i in range(args.documentos):
+        try:
+            admitidos.append(cola.enviar(generar_pdf(args.paginas, 0.3, semilla=i), nombre=f"doc_{i}"))
+        except ColaLlena:
+            rechazados += 1
+    while not all(t.terminado for t in admitidos):
+        time.sleep(0.05)
+    completados = [t for t in admitidos if t.estado == "completado"]
+    print(f"{args.documentos} documentos enviados a la vez ({args.workers} workers, "
+          f"máximo {args.max_en_cola} en espera): {len(admitidos)} admitidos, {rechazados} rechazados, "
+          f"{len(completados)} completados")
+    print(f"  espera en cola  {_percentiles([t.iniciado - t.creado for t in completados])}")
+    print(f"  procesamiento   {_percentiles([t.finalizado - t.iniciado for t in completados])}")
+
+    # Cancelación a mitad de las etapas LLM
+    trabajo = cola.enviar(generar_pdf(args.paginas, 0.3, semilla=10_000), nombre="cancelado")
+    while not trabajo.terminado and trabajo.progreso < 0.6:
+        time.sleep(0.01)
+    inicio = time.perf_counter()
+    cola.cancelar(trabajo.id)
+    while not trabajo.terminado:
+        time.sleep(0.005)
+    print(f"  cancelación durante '{trabajo.avance.etapa if trabajo.avance else '-'}': "
+          f"{trabajo.estado} en {time.perf_counter() - inicio:.3f}s")
+    cola.detener()
+
+
+def medir_embeddings(args) -> None:
+    from metricas import obtener_backend
+    from servicio_embeddings import ServicioEmbeddings
+
+    backend = obtener_backend()
+    rng = np.random.default_rng(0)
+    pedidos = [
+        [" ".join(rng.choice(PALABRAS, 12)) for _ in range(args.textos_por_pedido)]
+        for _ in range(args.hilos * args.pedidos_por_hilo)
+    ]
+
+    def ejecutar(codificar) -> float:
+        def hilo(inicio: int) -> None:
+            for pedido in pedidos[inicio::args.hilos]:
+                codificar(pedido)
+
+        hilos = [threading.Thread(target=hilo, args=(i,)) for i in range(args.hilos)]
+        comienzo = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return time.perf_counter() - comienzo
+
+    backend.codificar(["calentamiento"])
+    directo = ejecutar(backend.codificar)
+    servicio = ServicioEmbeddings(backend.codificar)
+    compartido = ejecutar(servicio.codificar)
+    servicio.detener()
+    print(f"{len(pedidos)} pedidos de {args.textos_por_pedido} textos desde {args.hilos} hilos:")
+    print(f"  modelo desde cada hilo  {directo:7.2f}s  ({len(pedidos) / directo:7.1f} pedidos/s)")
+    print(f"  servicio compartido     {compartido:7.2f}s  ({len(pedidos) / compartido:7.1f} pedidos/s)  "
+          f"x{directo / compartido:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=8)
+    parser.add_argument("--paginas", type=int, default=6, help="Páginas de cada PDF sintético")
+    parser.add_argument("--workers", type=int, default=2, help="Trabajos en curso a la vez")
+    parser.add_argument("--max-en-cola", type=int, default=4, help="Trabajos en espera admitidos")
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos que piden embeddings a la vez")
+    parser.add_argument("--pedidos-por-hilo", type=int, default=50)
+    parser.add_argument("--textos-por-pedido", type=int, default=1)
+    argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    config = config_desde_argumentos(args)
+    with tempfile.TemporaryDirectory() as tmp, servidores_simulados(config) as (gemini, openai):
+        os.environ.update({
+            "GEMINI_BASE_URL": gemini.url,
+            "DEEPSEEK_BASE_URL": openai.url,
+            "GEMINI_API_KEY": "simulada",
+            "DEEPSEEK_API_KEY": "simulada",
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+            "KEYWORDS_INDICE_DIR": os.path.join(tmp, "indice_keywords"),
+        })
+        from metricas import calentar
+        calentar()
+        medir_cola(args, tmp)
+    medir_embeddings(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Reprocesamiento incremental de versiones revisadas de un PDF: procesa un
+documento sintético, luego una revisión que modifica algunas páginas e
+inserta otras, y compara con procesar la revisión con la caché vacía.
+Reporta el tiempo, las peticiones a cada LLM simulado, el informe de
+reutilización y si el resultado coincide con el procesamiento desde cero.
+
+Uso:
+    python -m benchmarks.bench_versiones
+    python -m benchmarks.bench_versiones --paginas 200 --modificadas 3 --insertadas 1 --latencia 1.0
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.pdf_sintetico import contenidos_paginas, pagina_aleatoria, pdf_de_paginas
+from benchmarks.servidores_simulados import argumentos_simulacion, config_desde_argumentos, servidores_simulados
+
+
+def procesar(datos: bytes, directorio_cache: str, servidores) -> tuple:
+    from cache_etapas import CacheEtapas
+    from pipeline import procesar_documento
+
+    antes = [dict(s.contadores) for s in servidores]
+    inicio = time.perf_counter()
+    resultado = procesar_documento(datos, cache=CacheEtapas(directorio_cache))
+    duracion = time.perf_counter() - inicio
+    peticiones = [s.contadores["peticiones"] - a.get("peticiones", 0) for s, a in zip(servidores, antes)]
+    return resultado, duracion, peticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, default=60, help="Páginas de la versión original")
+    parser.add_argument("--densidad-tablas", type=float, default=0.3)
+    parser.add_argument("--modificadas", type=int, default=2, help="Páginas modificadas en la revisión")
+    parser.add_argument("--insertadas", type=int, default=1, help="Páginas nuevas en la revisión")
+    argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    original = contenidos_paginas(args.paginas, args.densidad_tablas, args.semilla)
+    revision = list(original)
+    for i, posicion in enumerate(rng.sample(range(args.paginas), args.modificadas)):
+        revision[posicion] = pagina_aleatoria(10_000 + i, con_tabla=rng.random() < args.densidad_tablas)
+    for i in range(args.insertadas):
+        revision.insert(rng.randrange(len(revision) + 1), pagina_aleatoria(20_000 + i))
+
+    config = config_desde_argumentos(args)
+    with tempfile.TemporaryDirectory() as tmp, servidores_simulados(config) as (gemini, openai):
+        os.environ.update({
+            "GEMINI_BASE_URL": gemini.url,
+            "DEEPSEEK_BASE_URL": openai.url,
+            "GEMINI_API_KEY": "simulada",
+            "DEEPSEEK_API_KEY": "simulada",
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+            "KEYWORDS_INDICE_DIR": os.path.join(tmp, "indice_keywords"),
+        })
+        from metricas import calentar
+        calentar()
+        servidores = (gemini, openai)
+        incremental = os.path.join(tmp, "incremental")
+        _, t_original, p_original = procesar(pdf_de_paginas(original), incremental, servidores)
+        r_incremental, t_incremental, p_incremental = procesar(pdf_de_paginas(revision), incremental, servidores)
+        r_cero, t_cero, p_cero = procesar(pdf_de_paginas(revision), os.path.join(tmp, "desde_cero"), servidores)
+
+    print(f"Original: {args.paginas} páginas; revisión: {args.modificadas} modificadas, {args.insertadas} insertadas")
+    print(f"{'':<26}{'tiempo (s)':>11}{'Gemini':>8}{'DeepSeek':>10}")
+    for nombre, duracion, peticiones in (
+        ("versión original", t_original, p_original),
+        ("revisión desde cero", t_cero, p_cero),
+        ("revisión incremental", t_incremental, p_incremental),
+    ):
+        print(f"{nombre:<26}{duracion:>11.2f}{peticiones[0]:>8}{peticiones[1]:>10}")
+    print(f"Aceleración de la revisión: x{t_cero / t_incremental:.1f}")
+
+    informe = r_incremental.reutilizacion
+    cambios = informe["paginas"] or {}
+    print("Páginas respecto de la versión anterior: " + ", ".join(
+        f"{clase} {len(paginas)}" for clase, paginas in cambios.items()
+    ))
+    for clase in ("modificadas", "nuevas", "eliminadas"):
+        if cambios.get(clase):
+            print(f"  {clase}: {cambios[clase]}")
+    for etapa, cuenta in informe["etapas"].items():
+        print(f"  {etapa:<20} reutilizados {cuenta['reutilizados']:>4}   recalculados {cuenta['recalculados']:>4}")
+
+    iguales = (
+        r_incremental.paginas_limpias == r_cero.paginas_limpias
+        and r_incremental.tablas_csv == r_cero.tablas_csv
+        and json.dumps([t.a_dict() for t in r_incremental.tablas]) == json.dumps([t.a_dict() for t in r_cero.tablas])
+    )
+    print(f"Extracción incremental {'idéntica' if iguales else 'DIFERENTE'} a la de la revisión desde cero")
+    if not iguales:
+        raise SystemExit("La extracción incremental no coincide con la completa")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Generador de PDFs sintéticos para los benchmarks.
+
+Escribe PDFs mínimos sin dependencias externas: texto en Helvetica y tablas
+dibujadas con líneas, de forma que pdfplumber las detecte como en un
+documento real, y opcionalmente una imagen por página (como un escaneo).
+"""
+import random
+
+PALABRAS = (
+    "la inteligencia artificial generativa permite crear texto imagenes y "
+    "codigo a partir de modelos entrenados con grandes volumenes de datos "
+    "los transformadores utilizan mecanismos de atencion para capturar "
+    "relaciones entre palabras y el aprendizaje profundo requiere computo "
+    "intensivo evaluacion cuidadosa y datos de calidad para evitar sesgos"
+).split()
+
+ANCHO, ALTO = 595, 842  # A4 en puntos
+MARGEN = 50
+INTERLINEADO = 14
+
+
+def _escapar(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _texto(x: float, y: float, texto: str, tam: int = 10) -> str:
+    return f"BT /F1 {tam} Tf {x:.1f} {y:.1f} Td ({_escapar(texto)}) Tj ET\n"
+
+
+def _frase(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(PALABRAS) for _ in range(n))
+
+
+def _contenido_tabla(rng: random.Random, y_sup: float, filas: int, columnas: int) -> tuple[str, float]:
+    ancho_col = (ANCHO - 2 * MARGEN) / columnas
+    alto_fila = 18
+    partes = []
+    for f in range(filas + 1):
+        y = y_sup - f * alto_fila
+        partes.append(f"{MARGEN} {y:.1f} m {ANCHO - MARGEN} {y:.1f} l S\n")
+    y_inf = y_sup - filas * alto_fila
+    for c in range(columnas + 1):
+        x = MARGEN + c * ancho_col
+        partes.append(f"{x:.1f} {y_sup:.1f} m {x:.1f} {y_inf:.1f} l S\n")
+    for f in range(filas):
+        for c in range(columnas):
+            if f == 0:
+                celda = f"columna {c + 1}"
+            elif c == 0:
+                celda = rng.choice(PALABRAS)
+            else:
+                celda = f"{rng.uniform(0, 1000):.2f}"
+            x = MARGEN + c * ancho_col + 4
+            y = y_sup - (f + 1) * alto_fila + 5
+            partes.append(_texto(x, y, celda, 9))
+    return "".join(partes), y_inf
+
+
+def _contenido_pagina(rng: random.Random, con_tabla: bool) -> str:
+    partes = ["0.5 w\n"]
+    y = ALTO - MARGEN
+    if con_tabla:
+        tabla, y_inf = _contenido_tabla(rng, y, rng.randint(4, 12), rng.randint(3, 6))
+        partes.append(tabla)
+        y = y_inf - 2 * INTERLINEADO
+    while y > MARGEN:
+        partes.append(_texto(MARGEN, y, _frase(rng, 12)))
+        y -= INTERLINEADO
+    return "".join(partes)
+
+
+def contenidos_paginas(num_paginas: int, densidad_tablas: float = 0.2, semilla: int = 0) -> list[str]:
+    """
+    Flujos de contenido de `num_paginas` páginas donde una fracción
+    `densidad_tablas` de ellas contiene una tabla con bordes.
+    """
+    rng = random.Random(semilla)
+    return [_contenido_pagina(rng, rng.random() < densidad_tablas) for _ in range(num_paginas)]
+
+
+def pagina_aleatoria(semilla: int, con_tabla: bool = False) -> str:
+    """Flujo de contenido de una página suelta (p. ej. para simular una revisión)"""
+    return _contenido_pagina(random.Random(semilla), con_tabla)
+
+
+def generar_pdf(num_paginas: int, densidad_tablas: float = 0.2, semilla: int = 0,
+                bytes_imagen: int = 0) -> bytes:
+    """
+    Genera un PDF de `num_paginas` páginas donde una fracción
+    `densidad_tablas` de ellas contiene una tabla con bordes.
+    """
+    return pdf_de_paginas(contenidos_paginas(num_paginas, densidad_tablas, semilla), bytes_imagen)
+
+
+def pdf_de_paginas(contenidos: list[str], bytes_imagen: int = 0) -> bytes:
+    """
+    Escribe un PDF con una página por flujo de contenido. Con `bytes_imagen`
+    cada página lleva además de fondo una imagen en escala de grises de
+    ese tamaño (sin comprimir), para simular un documento escaneado con texto.
+    """
+    objetos: list[bytes] = []
+
+    def agregar(cuerpo: bytes) -> int:
+        objetos.append(cuerpo)
+        return len(objetos)
+
+    catalogo = agregar(b"")  # se completa al final
+    paginas_id = agregar(b"")
+    fuente = agregar(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>"
+    )
+
+    rng = random.Random(len(contenidos))
+    hijos = []
+    for texto in contenidos:
+        recursos = f"/Font << /F1 {fuente} 0 R >>"
+        if bytes_imagen:
+            ancho_img = 1024
+            alto_img = max(1, bytes_imagen // ancho_img)
+            imagen = agregar(
+                (
+                    f"<< /Type /XObject /Subtype /Image /Width {ancho_img} /Height {alto_img} "
+                    f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {ancho_img * alto_img} >>\nstream\n"
+                ).encode() + rng.randbytes(ancho_img * alto_img) + b"\nendstream"
+            )
+            recursos += f" /XObject << /Im1 {imagen} 0 R >>"
+            texto = f"q {ANCHO} 0 0 {ALTO} 0 0 cm /Im1 Do Q\n" + texto
+        contenido = texto.encode("latin-1")
+        stream = agregar(
+            b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"endstream"
+        )
+        hijos.append(agregar(
+            (
+                f"<< /Type /Page /Parent {paginas_id} 0 R /MediaBox [0 0 {ANCHO} {ALTO}] "
+                f"/Resources << {recursos} >> /Contents {stream} 0 R >>"
+            ).encode()
+        ))
+
+    kids = " ".join(f"{h} 0 R" for h in hijos)
+    objetos[paginas_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(hijos)} >>".encode()
+    objetos[catalogo - 1] = f"<< /Type /Catalog /Pages {paginas_id} 0 R >>".encode()
+
+    salida = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, cuerpo in enumerate(objetos, 1):
+        offsets.append(len(salida))
+        salida += b"%d 0 obj\n" % i + cuerpo + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for off in offsets:
+        salida += b"%010d 00000 n \n" % off
+    salida += (
+        b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objetos) + 1, catalogo, inicio_xref)
+    )
+    return bytes(salida)
@@ -0,0 +1,403 @@
+"""
+Servidores locales que imitan las APIs de Gemini (generateContent) y de
+DeepSeek (chat/completions compatible con OpenAI), para medir el pipeline
+sin gastar cuota ni depender de la red.
+
+Las respuestas tienen el mismo formato que las reales: ideas numeradas,
+resumen de tablas en puntos y preguntas en JSON dentro de un bloque ```json.
+El servidor de DeepSeek también responde en streaming (SSE) con `stream=True`.
+La latencia, la velocidad de generación, la tasa de errores 5xx, la de
+respuestas 429 y la de streams cortados a la mitad son configurables.
+
+Uso independiente (para apuntar la aplicación a ellos):
+    python -m benchmarks.servidores_simulados --latencia 0.5 --tasa-429 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8701 DEEPSEEK_BASE_URL=http://127.0.0.1:8702 \\
+        DEEPSEEK_API_KEY=simulada streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Tuple
+
+from fragmentacion import estimar_tokens
+
+
+@dataclass
+class ConfigSimulacion:
+    """
+    Comportamiento de los servidores simulados. La latencia de cada respuesta
+    es `latencia` + `latencia_por_1k_tokens` por cada mil tokens del prompt,
+    más un jitter uniforme de hasta `jitter` segundos. Generar la respuesta
+    toma además `segundos_por_1k_tokens_salida` por cada mil tokens de salida
+    (en streaming, repartidos entre los fragmentos).
+    """
+    latencia: float = 0.2
+    latencia_por_1k_tokens: float = 0.05
+    jitter: float = 0.1
+    segundos_por_1k_tokens_salida: float = 0.0
+    tasa_error: float = 0.0
+    tasa_429: float = 0.0
+    tasa_corte: float = 0.0
+    retry_after: float = 1.0
+    semilla: int = 0
+
+
+# --- Contenido de las respuestas ---------------------------------------------
+
+def _terminos(texto: str, cantidad: int) -> List[str]:
+    # Palabras más frecuentes del texto, para que cada fragmento tenga ideas propias
+    palabras = re.findall(r"[a-záéíóúñü]{6,}", texto.lower())
+    return [p for p, _ in Counter(palabras).most_common(cantidad)] or ["documento"]
+
+
+def respuesta_ideas(texto: str, cantidad: int = 6) -> str:
+    terminos = _terminos(texto, cantidad + 1)
+    lineas = []
+    for i in range(cantidad):
+        a = terminos[i % len(terminos)]
+        b = terminos[(i + 1) % len(terminos)]
+        lineas.append(f"{i + 1}. El concepto de {a} se relaciona con {b} en el contexto del texto.")
+    return "\n".join(lineas)
+
+
+def respuesta_resumen_tablas(resumen: str) -> str:
+    # Columnas y filas del resumen de tablas que arma tabla_estructurada.resumen_para_prompt
+    columnas = re.findall(r"^- (.+?) \[", resumen, re.M)
+    if not columnas:
+        cabecera = next((l for l in resumen.splitlines() if l.strip() and not l.startswith("Tabla ")), "")
+        columnas = [c.strip() for c in cabecera.split(",") if c.strip()]
+    columnas = columnas or ["datos"]
+    filas = sum(int(n) for n in re.findall(r"(\d+) filas", resumen)) or sum(1 for l in resumen.splitlines() if l.strip())
+    puntos = [
+        f"* **Estructura:** las tablas tienen {len(columnas)} columnas y {filas} filas en total.",
+        f"* **Columna principal:** {columnas[0]} agrupa la información.",
+        f"* **Comparación:** {columnas[-1]} muestra diferencias entre filas.",
+        "* **Tendencia:** los valores crecen de forma moderada.",
+        "* **Conclusión:** los datos respaldan las ideas del texto.",
+    ]
+    return "\n".join(puntos)
+
+
+PLANTILLAS_PREGUNTAS = [
+    "¿Cuál de las siguientes afirmaciones es correcta según el texto sobre: {idea}?",
+    "¿Qué consecuencia se desprende de la siguiente idea del texto: {idea}?",
+    "¿Qué ejemplo ilustra mejor esta idea del texto: {idea}?",
+    "¿Por qué es importante, según el texto, que {idea}?",
+    "¿Qué opción contradice la siguiente idea del texto: {idea}?",
+    "¿Con qué otro concepto del texto se relaciona que {idea}?",
+    "¿Qué limitación menciona el texto respecto a que {idea}?",
+    "¿En qué situación práctica se aplica que {idea}?",
+]
+
+
+def preguntas_simuladas(ideas: List[str], num_questions: int, evitar: List[str] = ()) -> List[dict]:
+    # Cada pregunta combina una idea con una plantilla y se omiten las de
+    # `evitar`, como haría un LLM. Cuando se agotan las combinaciones se
+    # repiten, así que pedir más preguntas que ideas x plantillas produce duplicadas
+    ideas = ideas or ["el contenido del documento"]
+    evitar = set(evitar)
+    combinaciones = len(ideas) * len(PLANTILLAS_PREGUNTAS)
+    preguntas = []
+    i = 0
+    while len(preguntas) < num_questions:
+        idea = ideas[i % len(ideas)]
+        plantilla = PLANTILLAS_PREGUNTAS[(i // len(ideas)) % len(PLANTILLAS_PREGUNTAS)]
+        texto = plantilla.format(idea=idea.rstrip("."))
+        i += 1
+        if texto in evitar and i <= combinaciones:
+            continue
+        preguntas.append({
+            "question": texto,
+            "options": [
+                idea,
+                f"Lo contrario de: {idea}",
+                f"Una afirmación no relacionada ({i})",
+                "Ninguna de las anteriores",
+            ],
+            "correct_answer": idea,
+        })
+    return preguntas
+
+
+def respuesta_preguntas(contenido_usuario: str) -> str:
+    try:
+        datos = json.loads(contenido_usuario)
+    except json.JSONDecodeError:
+        datos = {}
+    preguntas = preguntas_simuladas(
+        datos.get("ideas", []), int(datos.get("num_questions", 8)), datos.get("evitar_preguntas", [])
+    )
+    return "```json\n" + json.dumps({"questions": preguntas}, ensure_ascii=False, indent=2) + "\n```"
+
+
+# --- Servidores ---------------------------------------------------------------
+
+class _ManejadorBase(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servidor: "ServidorSimulado"
+
+    def log_message(self, formato, *args):
+        # Sin una línea por petición en la salida del benchmark
+        pass
+
+    def _enviar_json(self, estado: int, cuerpo: dict, cabeceras: dict = None) -> None:
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self) -> dict:
+        largo = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(largo) or b"{}")
+
+    def _simular(self, prompt: str) -> bool:
+        """Aplica latencia y fallos; devuelve False si ya respondió con un error"""
+        config = self.servidor.config
+        sorteo, jitter = self.servidor.sortear()
+        time.sleep(
+            config.latencia + config.latencia_por_1k_tokens * estimar_tokens(prompt) / 1000
+            + jitter * config.jitter
+        )
+        if sorteo < config.tasa_429:
+            self.servidor.contar("429")
+            self._enviar_json(
+                429, {"error": {"code": 429, "message": "Límite de peticiones simulado"}},
+                {"Retry-After": f"{config.retry_after:g}"},
+            )
+            return False
+        if sorteo < config.tasa_429 + config.tasa_error:
+            self.servidor.contar("5xx")
+            self._enviar_json(503, {"error": {"code": 503, "message": "Error simulado"}})
+            return False
+        self.servidor.contar("ok")
+        return True
+
+    def _segundos_generacion(self, texto: str) -> float:
+        return self.servidor.config.segundos_por_1k_tokens_salida * estimar_tokens(texto) / 1000
+
+
+class _ManejadorGemini(_ManejadorBase):
+    def do_POST(self):
+        m = re.match(r"^/v1beta/models/([^/:]+):generateContent", self.path)
+        if not m:
+            self._enviar_json(404, {"error": {"code": 404, "message": f"Ruta desconocida: {self.path}"}})
+            return
+        datos = self._leer_json()
+        prompt = "".join(
+            parte.get("text", "")
+            for contenido in datos.get("contents", [])
+            for parte in contenido.get("parts", [])
+        )
+        self.servidor.contar("peticiones")
+        if not self._simular(prompt):
+            return
+        if prompt.startswith("Eres un asistente que resume datos"):
+            texto = respuesta_resumen_tablas(prompt.split("\n\n", 1)[-1])
+        else:
+            texto = respuesta_ideas(prompt.split("\n\n", 1)[-1])
+        time.sleep(self._segundos_generacion(texto))
+        self._enviar_json(200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": texto}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": estimar_tokens(prompt),
+                "candidatesTokenCount": estimar_tokens(texto),
+                "totalTokenCount": estimar_tokens(prompt) + estimar_tokens(texto),
+            },
+            "modelVersion": m.group(1),
+        })
+
+
+class _ManejadorOpenAI(_ManejadorBase):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._enviar_json(404, {"error": {"message": f"Ruta desconocida: {self.path}"}})
+            return
+        datos = self._leer_json()
+        mensajes = datos.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in mensajes)
+        self.servidor.contar("peticiones")
+        if not self._simular(prompt):
+            return
+        usuario = next((m.get("content", "") for m in reversed(mensajes) if m.get("role") == "user"), "")
+        texto = respuesta_preguntas(usuario)
+        id_respuesta = f"chatcmpl-{uuid.uuid4().hex}"
+        modelo = datos.get("model", "simulado")
+        uso = {
+            "prompt_tokens": estimar_tokens(prompt),
+            "completion_tokens": estimar_tokens(texto),
+            "total_tokens": estimar_tokens(prompt) + estimar_tokens(texto),
+        }
+        if datos.get("stream"):
+            incluir_uso = bool((datos.get("stream_options") or {}).get("include_usage"))
+            self._enviar_stream(texto, id_respuesta, modelo, uso if incluir_uso else None)
+            return
+        time.sleep(self._segundos_generacion(texto))
+        self._enviar_json(200, {
+            "id": id_respuesta,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": modelo,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": texto},
+                "finish_reason": "stop",
+            }],
+            "usage": uso,
+        })
+
+    def _enviar_stream(self, texto: str, id_respuesta: str, modelo: str, uso: dict = None,
+                       caracteres_por_fragmento: int = 16) -> None:
+        """Respuesta como eventos SSE (`chat.completion.chunk`), igual que la API real"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def evento(choices: list, **extra) -> None:
+            datos = {"id": id_respuesta, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": modelo, "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(datos, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        fragmentos = [texto[i:i + caracteres_por_fragmento] for i in range(0, len(texto), caracteres_por_fragmento)]
+        pausa = self._segundos_generacion(texto) / max(1, len(fragmentos))
+        # Stream cortado: se cierra la conexión a mitad de la respuesta
+        cortar = self.servidor.sortear()[0] < self.servidor.config.tasa_corte
+        if cortar:
+            self.servidor.contar("cortados")
+            fragmentos = fragmentos[:len(fragmentos) // 2]
+        evento([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for fragmento in fragmentos:
+            time.sleep(pausa)
+            evento([{"index": 0, "delta": {"content": fragmento}, "finish_reason": None}])
+        if cortar:
+            return
+        evento([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if uso is not None:
+            evento([], usage=uso)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class ServidorSimulado:
+    """
+    Servidor HTTP en un hilo de fondo. `tipo` es "gemini" u "openai";
+    con `puerto=0` se elige uno libre.
+    """
+
+    def __init__(self, tipo: str, config: ConfigSimulacion, puerto: int = 0, host: str = "127.0.0.1"):
+        base = {"gemini": _ManejadorGemini, "openai": _ManejadorOpenAI}[tipo]
+        manejador = type(base.__name__, (base,), {"servidor": self})
+        self.tipo = tipo
+        self.config = config
+        self.contadores: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(f"{tipo}:{config.semilla}")
+        self._http = ThreadingHTTPServer((host, puerto), manejador)
+        self._http.daemon_threads = True
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._http.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def sortear(self) -> Tuple[float, float]:
+        with self._lock:
+            return self._rng.random(), self._rng.random()
+
+    def contar(self, evento: str) -> None:
+        with self._lock:
+            self.contadores[evento] += 1
+
+    def iniciar(self) -> "ServidorSimulado":
+        self._hilo.start()
+        return self
+
+    def detener(self) -> None:
+        self._http.shutdown()
+        self._http.server_close()
+
+
+@contextmanager
+def servidores_simulados(config: ConfigSimulacion, puerto_gemini: int = 0,
+                         puerto_openai: int = 0) -> Iterator[Tuple[ServidorSimulado, ServidorSimulado]]:
+    """Inicia ambos servidores y los detiene al salir del bloque"""
+    gemini = ServidorSimulado("gemini", config, puerto_gemini).iniciar()
+    openai = ServidorSimulado("openai", config, puerto_openai).iniciar()
+    try:
+        yield gemini, openai
+    finally:
+        gemini.detener()
+        openai.detener()
+
+
+def argumentos_simulacion(parser: argparse.ArgumentParser) -> None:
+    """Agrega a `parser` las opciones de ConfigSimulacion"""
+    base = ConfigSimulacion()
+    parser.add_argument("--latencia", type=float, default=base.latencia, help="Latencia base (s)")
+    parser.add_argument("--latencia-por-1k-tokens", type=float, default=base.latencia_por_1k_tokens)
+    parser.add_argument("--jitter", type=float, default=base.jitter, help="Jitter máximo (s)")
+    parser.add_argument("--segundos-por-1k-tokens-salida", type=float, default=base.segundos_por_1k_tokens_salida,
+                        help="Tiempo de generación por cada mil tokens de respuesta (s)")
+    parser.add_argument("--tasa-error", type=float, default=base.tasa_error, help="Fracción de respuestas 503")
+    parser.add_argument("--tasa-429", type=float, default=base.tasa_429, help="Fracción de respuestas 429")
+    parser.add_argument("--tasa-corte", type=float, default=base.tasa_corte,
+                        help="Fracción de streams cortados a la mitad")
+    parser.add_argument("--retry-after", type=float, default=base.retry_after, help="Retry-After de los 429 (s)")
+    parser.add_argument("--semilla", type=int, default=base.semilla)
+
+
+def config_desde_argumentos(args: argparse.Namespace) -> ConfigSimulacion:
+    return ConfigSimulacion(
+        latencia=args.latencia,
+        latencia_por_1k_tokens=args.latencia_por_1k_tokens,
+        jitter=args.jitter,
+        segundos_por_1k_tokens_salida=args.segundos_por_1k_tokens_salida,
+        tasa_error=args.tasa_error,
+        tasa_429=args.tasa_429,
+        tasa_corte=args.tasa_corte,
+        retry_after=args.retry_after,
+        semilla=args.semilla,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto-gemini", type=int, default=8701)
+    parser.add_argument("--puerto-openai", type=int, default=8702)
+    argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    with servidores_simulados(config_desde_argumentos(args), args.puerto_gemini, args.puerto_openai) as (gemini, openai):
+        print(f"Gemini simulado:   GEMINI_BASE_URL={gemini.url}")
+        print(f"DeepSeek simulado: DEEPSEEK_BASE_URL={openai.url}")
+        print("Ctrl+C para detener")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        print(f"Gemini: {dict(gemini.contadores)}  DeepSeek: {dict(openai.contadores)}")
+
+
+if __name__ == "__main__":
+    main()
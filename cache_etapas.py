@@ -0,0 +1,280 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from instrumentacion import contar
+
+logger = logging.getLogger(__name__)
+
+# Configuración global
+CACHE_DIR = os.getenv("CACHE_ETAPAS_DIR", "cache_etapas")
+MAX_BYTES = int(float(os.getenv("CACHE_ETAPAS_MAX_MB", "512")) * 1024 * 1024)
+# Segundos mínimos entre dos actualizaciones del último acceso de una entrada:
+# un acierto solo escribe si la marca guardada es más vieja
+INTERVALO_ACCESO = float(os.getenv("CACHE_ETAPAS_INTERVALO_ACCESO", "60"))
+# Al superar el máximo se expulsa hasta bajar a esta fracción de él, así no
+# se expulsa (ni se recorre la caché) en cada escritura
+FRACCION_TRAS_EXPULSAR = 0.9
+# Bytes que se cuentan por fila de huellas además del hash del documento y la huella
+_BYTES_FILA_HUELLA = 16
+_TAMANO_HUELLAS = f"SUM(LENGTH(doc_hash) + LENGTH(huella) + {_BYTES_FILA_HUELLA})"
+
+
+def hash_contenido(datos: bytes | str) -> str:
+    """Identificador del contenido (sha256)"""
+    if isinstance(datos, str):
+        datos = datos.encode("utf-8")
+    return hashlib.sha256(datos).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def version_codigo(*modulos: str) -> str:
+    """
+    Versión del código de una etapa: hash del fuente de los módulos que la
+    implementan. Cambiar cualquiera de ellos invalida sus entradas en caché.
+    """
+    h = hashlib.sha256()
+    for nombre in modulos:
+        spec = importlib.util.find_spec(nombre)
+        with open(spec.origin, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class CacheEtapas:
+    """
+    Caché persistente de resultados por etapa del pipeline, direccionada por
+    contenido y con expulsión LRU cuando se supera el tamaño máximo (que
+    incluye las huellas de las páginas de cada documento). El total de bytes
+    se lleva en la tabla `meta`, así escribir no recorre la caché.
+    Los valores se guardan como JSON en SQLite, que admite varios procesos.
+    """
+
+    def __init__(self, directorio: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta = os.path.join(directorio, "etapas.sqlite")
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS etapas ("
+                " clave TEXT PRIMARY KEY,"
+                " etapa TEXT NOT NULL,"
+                " valor TEXT NOT NULL,"
+                " tamano INTEGER NOT NULL,"
+                " ultimo_acceso REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_acceso ON etapas (ultimo_acceso)")
+            # Huellas de las páginas de cada documento procesado, para reconocer
+            # versiones anteriores del mismo documento; `registrado` es el
+            # último uso del documento y las ordena en la expulsión LRU
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS huellas ("
+                " doc_hash TEXT NOT NULL,"
+                " pagina INTEGER NOT NULL,"
+                " huella TEXT NOT NULL,"
+                " registrado REAL NOT NULL,"
+                " PRIMARY KEY (doc_hash, pagina))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_huella ON huellas (huella)")
+            # Bytes ocupados por etapas y huellas; en una caché anterior a este
+            # contador se calcula una vez
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+            if conn.execute("SELECT 1 FROM meta WHERE nombre = 'bytes'").fetchone() is None:
+                total = conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM etapas").fetchone()[0]
+                total += conn.execute(f"SELECT COALESCE({_TAMANO_HUELLAS}, 0) FROM huellas").fetchone()[0]
+                conn.execute("INSERT OR IGNORE INTO meta (nombre, valor) VALUES ('bytes', ?)", (total,))
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        # Una conexión por hilo y proceso, reutilizada entre operaciones:
+        # segura entre hilos de Streamlit y procesos, sin abrir el archivo
+        # en cada consulta. Cada bloque es una transacción.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=30)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        with conn:
+            yield conn
+
+    @staticmethod
+    def clave(doc_hash: str, etapa: str, prompt: str = "", modelo: str = "",
+              version: str = "", entrada: str = "") -> str:
+        """
+        Clave de una etapa: hash del PDF + etapa + prompt + modelo + versión
+        del código + hash de la entrada concreta de la etapa.
+        """
+        partes = [doc_hash, etapa, hash_contenido(prompt), modelo, version, hash_contenido(entrada)]
+        return hash_contenido("\x1f".join(partes))
+
+    def obtener(self, clave: str) -> Tuple[bool, Any]:
+        with self._conectar() as conn:
+            fila = conn.execute("SELECT valor, ultimo_acceso FROM etapas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None:
+                return False, None
+            ahora = time.time()
+            if ahora - fila[1] > INTERVALO_ACCESO:
+                conn.execute("UPDATE etapas SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+        return True, json.loads(fila[0])
+
+    def guardar(self, clave: str, etapa: str, valor: Any) -> None:
+        serializado = json.dumps(valor, ensure_ascii=False)
+        tamano = len(serializado.encode("utf-8"))
+        if tamano > self.max_bytes:
+            logger.warning(f"Resultado de '{etapa}' demasiado grande para la caché ({tamano} bytes)")
+            return
+        with self._conectar() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            anterior = conn.execute("SELECT tamano FROM etapas WHERE clave = ?", (clave,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO etapas (clave, etapa, valor, tamano, ultimo_acceso) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (clave, etapa, serializado, tamano, time.time()),
+            )
+            self._sumar(conn, tamano - (anterior[0] if anterior else 0))
+            self._expulsar(conn)
+
+    @staticmethod
+    def _sumar(conn: sqlite3.Connection, bytes_: int) -> None:
+        conn.execute("UPDATE meta SET valor = valor + ? WHERE nombre = 'bytes'", (bytes_,))
+
+    @staticmethod
+    def _total(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT valor FROM meta WHERE nombre = 'bytes'").fetchone()[0]
+
+    def tamano(self) -> int:
+        """Bytes ocupados por las etapas y las huellas"""
+        with self._conectar() as conn:
+            return self._total(conn)
+
+    def _expulsar(self, conn: sqlite3.Connection) -> None:
+        # Pasado el máximo, elimina las entradas y las huellas de documentos
+        # menos usadas recientemente hasta bajar a FRACCION_TRAS_EXPULSAR
+        total = self._total(conn)
+        if total <= self.max_bytes:
+            return
+        liberar = total - int(self.max_bytes * FRACCION_TRAS_EXPULSAR)
+        liberados = 0
+        for tabla, clave, tamano, _ in conn.execute(
+            "SELECT 'etapas', clave, tamano, ultimo_acceso FROM etapas"
+            f" UNION ALL SELECT 'huellas', doc_hash, {_TAMANO_HUELLAS}, MAX(registrado) FROM huellas"
+            " GROUP BY doc_hash ORDER BY 4"
+        ).fetchall():
+            if tabla == "etapas":
+                conn.execute("DELETE FROM etapas WHERE clave = ?", (clave,))
+            else:
+                conn.execute("DELETE FROM huellas WHERE doc_hash = ?", (clave,))
+            liberados += tamano
+            if liberados >= liberar:
+                break
+        self._sumar(conn, -liberados)
+
+    def memoizar(self, etapa: str, doc_hash: str, funcion: Callable[[], Any], *,
+                 prompt: str = "", modelo: str = "", version: str = "", entrada: str = "",
+                 es_valido: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Devuelve el resultado en caché de la etapa o lo calcula con `funcion`.
+        Con `es_valido` se evita guardar resultados fallidos (p. ej. listas vacías
+        cuando la API devolvió error).
+        """
+        clave = self.clave(doc_hash, etapa, prompt, modelo, version, entrada)
+        encontrado, valor = self.obtener(clave)
+        contar("cache", cache="etapas", etapa=etapa, resultado="acierto" if encontrado else "fallo")
+        if encontrado:
+            return valor
+        valor = funcion()
+        if es_valido is None or es_valido(valor):
+            self.guardar(clave, etapa, valor)
+        return valor
+
+    async def memoizar_async(self, etapa: str, doc_hash: str, funcion: Callable[[], Awaitable[Any]], *,
+                             prompt: str = "", modelo: str = "", version: str = "", entrada: str = "",
+                             es_valido: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Igual que `memoizar` para etapas asíncronas (llamadas a LLMs).
+        """
+        clave = self.clave(doc_hash, etapa, prompt, modelo, version, entrada)
+        encontrado, valor = self.obtener(clave)
+        contar("cache", cache="etapas", etapa=etapa, resultado="acierto" if encontrado else "fallo")
+        if encontrado:
+            return valor
+        valor = await funcion()
+        if es_valido is None or es_valido(valor):
+            self.guardar(clave, etapa, valor)
+        return valor
+
+    def registrar_huellas(self, doc_hash: str, huellas: List[str]) -> None:
+        """Guarda las huellas de las páginas de un documento procesado"""
+        ahora = time.time()
+        tamano = sum(len(doc_hash) + len(huella) + _BYTES_FILA_HUELLA for huella in huellas)
+        with self._conectar() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            anterior = conn.execute(
+                f"SELECT COALESCE({_TAMANO_HUELLAS}, 0) FROM huellas WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()[0]
+            conn.execute("DELETE FROM huellas WHERE doc_hash = ?", (doc_hash,))
+            conn.executemany(
+                "INSERT INTO huellas (doc_hash, pagina, huella, registrado) VALUES (?, ?, ?, ?)",
+                [(doc_hash, i, huella, ahora) for i, huella in enumerate(huellas)],
+            )
+            self._sumar(conn, tamano - anterior)
+            self._expulsar(conn)
+
+    def usar_huellas(self, doc_hash: str) -> bool:
+        """
+        Marca como recién usadas las huellas de un documento; False si no
+        están registradas (p. ej. las expulsó el límite de tamaño)
+        """
+        with self._conectar() as conn:
+            registrado = conn.execute(
+                "SELECT MAX(registrado) FROM huellas WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()[0]
+            if registrado is None:
+                return False
+            ahora = time.time()
+            if ahora - registrado > INTERVALO_ACCESO:
+                conn.execute("UPDATE huellas SET registrado = ? WHERE doc_hash = ?", (ahora, doc_hash))
+        return True
+
+    def version_anterior(self, doc_hash: str, huellas: List[str]) -> Optional[Tuple[str, List[str]]]:
+        """
+        Documento ya procesado (distinto de `doc_hash`) que comparte más páginas
+        con `huellas` (ante un empate, el usado más recientemente), junto con las huellas
+        de sus páginas; None si ninguno comparte páginas.
+        """
+        distintas = list(set(huellas))
+        compartidas: dict = {}
+        recientes: dict = {}
+        with self._conectar() as conn:
+            # Por bloques: SQLite limita la cantidad de parámetros por consulta
+            for inicio in range(0, len(distintas), 500):
+                bloque = distintas[inicio:inicio + 500]
+                for otro, cantidad, registrado in conn.execute(
+                    f"SELECT doc_hash, COUNT(*), MAX(registrado) FROM huellas WHERE doc_hash != ? "
+                    f"AND huella IN ({','.join('?' * len(bloque))}) GROUP BY doc_hash",
+                    (doc_hash, *bloque),
+                ):
+                    compartidas[otro] = compartidas.get(otro, 0) + cantidad
+                    recientes[otro] = registrado
+            if not compartidas:
+                return None
+            anterior = max(compartidas, key=lambda d: (compartidas[d], recientes[d]))
+            filas = conn.execute(
+                "SELECT huella FROM huellas WHERE doc_hash = ? ORDER BY pagina", (anterior,)
+            ).fetchall()
+        return anterior, [fila[0] for fila in filas]
+
+    def limpiar(self) -> None:
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM etapas")
+            conn.execute("DELETE FROM huellas")
+            conn.execute("UPDATE meta SET valor = 0 WHERE nombre = 'bytes'")
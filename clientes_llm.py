@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI
+
+from instrumentacion import anotar, contar, medir
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Endpoints por defecto; se pueden cambiar con GEMINI_BASE_URL / DEEPSEEK_BASE_URL
+# (p. ej. para apuntar a los servidores simulados de benchmarks/servidores_simulados.py)
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
+
+@dataclass
+class ConfigProveedor:
+    """
+    Límites de un proveedor: llamadas simultáneas, timeout por llamada y
+    política de reintentos (backoff exponencial con jitter).
+    """
+    concurrencia: int = 4
+    timeout: float = 120.0
+    reintentos: int = 4
+    espera_base: float = 1.0
+    espera_max: float = 30.0
+
+    @classmethod
+    def desde_entorno(cls, prefijo: str) -> "ConfigProveedor":
+        base = cls()
+        return cls(
+            concurrencia=int(os.getenv(f"{prefijo}_CONCURRENCIA", base.concurrencia)),
+            timeout=float(os.getenv(f"{prefijo}_TIMEOUT", base.timeout)),
+            reintentos=int(os.getenv(f"{prefijo}_REINTENTOS", base.reintentos)),
+            espera_base=float(os.getenv(f"{prefijo}_ESPERA_BASE", base.espera_base)),
+            espera_max=float(os.getenv(f"{prefijo}_ESPERA_MAX", base.espera_max)),
+        )
+
+
+class ErrorLLM(Exception):
+    """Error de un proveedor LLM. `reintentable` indica si conviene reintentar."""
+
+    def __init__(self, mensaje: str, reintentable: bool = False, espera: Optional[float] = None):
+        super().__init__(mensaje)
+        self.reintentable = reintentable
+        self.espera = espera
+
+
+def _espera_retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _es_reintentable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class _Proveedor:
+    """
+    Base común: semáforo de concurrencia y reintentos con backoff exponencial
+    y jitter completo. Respeta `Retry-After` si el proveedor lo envía.
+    """
+    nombre = "proveedor"
+
+    def __init__(self, config: ConfigProveedor):
+        self.config = config
+        self._semaforo = asyncio.Semaphore(config.concurrencia)
+
+    async def _con_reintentos(self, operacion, modelo: str, caracteres_prompt: int,
+                              timeout_total: bool = True):
+        # Cada llamada (con todos sus reintentos) es un tramo de la traza actual.
+        # Con `timeout_total=False` (streams) solo rige el timeout de cada lectura
+        # del cliente HTTP, no uno para la respuesta completa
+        limite = self.config.timeout if timeout_total else None
+        with medir(f"llm_{self.nombre.lower()}", modelo=modelo, caracteres_prompt=caracteres_prompt):
+            contar("llm_caracteres", caracteres_prompt, proveedor=self.nombre, tipo="prompt")
+            intento = 0
+            espera_cola = 0.0
+            while True:
+                try:
+                    inicio_cola = time.perf_counter()
+                    async with self._semaforo:
+                        espera_cola += time.perf_counter() - inicio_cola
+                        resultado = await asyncio.wait_for(operacion(), timeout=limite)
+                    anotar(reintentos=intento, espera_cola=round(espera_cola, 6))
+                    return resultado
+                except (asyncio.TimeoutError, httpx.TimeoutException, APITimeoutError) as e:
+                    error = ErrorLLM(f"{self.nombre}: timeout ({e.__class__.__name__})", reintentable=True)
+                except (httpx.TransportError, APIConnectionError) as e:
+                    error = ErrorLLM(f"{self.nombre}: error de conexión ({e})", reintentable=True)
+                except APIStatusError as e:
+                    error = ErrorLLM(
+                        f"{self.nombre}: HTTP {e.status_code}",
+                        reintentable=_es_reintentable(e.status_code),
+                        espera=_espera_retry_after(e.response.headers),
+                    )
+                except ErrorLLM as e:
+                    error = e
+
+                intento += 1
+                if not error.reintentable or intento > self.config.reintentos:
+                    anotar(reintentos=intento - 1, espera_cola=round(espera_cola, 6))
+                    contar("llm_errores", proveedor=self.nombre)
+                    raise error
+                contar("llm_reintentos", proveedor=self.nombre)
+                espera = error.espera
+                if espera is None:
+                    espera = random.uniform(0, min(self.config.espera_max, self.config.espera_base * 2 ** (intento - 1)))
+                logger.warning(f"{error}; reintento {intento}/{self.config.reintentos} en {espera:.2f}s")
+                await asyncio.sleep(espera)
+
+    def _registrar_respuesta(self, texto: str, tokens_prompt: Optional[int],
+                             tokens_respuesta: Optional[int]) -> None:
+        # Tamaño y tokens informados por el proveedor (si los envía)
+        anotar(caracteres_respuesta=len(texto), tokens_prompt=tokens_prompt, tokens_respuesta=tokens_respuesta)
+        contar("llm_caracteres", len(texto), proveedor=self.nombre, tipo="respuesta")
+        if tokens_prompt:
+            contar("llm_tokens", tokens_prompt, proveedor=self.nombre, tipo="prompt")
+        if tokens_respuesta:
+            contar("llm_tokens", tokens_respuesta, proveedor=self.nombre, tipo="respuesta")
+
+
+class ClienteGemini(_Proveedor):
+    """Cliente asíncrono de la API REST de Gemini con conexiones reutilizadas."""
+    nombre = "Gemini"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 config: Optional[ConfigProveedor] = None):
+        super().__init__(config or ConfigProveedor.desde_entorno("GEMINI"))
+        self._http = httpx.AsyncClient(
+            base_url=base_url or os.getenv("GEMINI_BASE_URL", GEMINI_BASE_URL),
+            headers={"x-goog-api-key": api_key or os.getenv("GEMINI_API_KEY") or ""},
+            timeout=self.config.timeout,
+            limits=httpx.Limits(max_connections=self.config.concurrencia),
+        )
+
+    async def generar(self, prompt: str, modelo: str) -> str:
+        """Devuelve el texto generado para `prompt`."""
+        async def operacion():
+            resp = await self._http.post(
+                f"/v1beta/models/{modelo}:generateContent",
+                json={"contents": [{"role": "user", "parts": [{"text": prompt}]}]},
+            )
+            if resp.status_code != 200:
+                raise ErrorLLM(
+                    f"Gemini: HTTP {resp.status_code}: {resp.text[:200]}",
+                    reintentable=_es_reintentable(resp.status_code),
+                    espera=_espera_retry_after(resp.headers),
+                )
+            datos = resp.json()
+            candidatos = datos.get("candidates") or []
+            if not candidatos:
+                raise ErrorLLM(f"Gemini: respuesta sin candidatos ({datos.get('promptFeedback')})")
+            partes = candidatos[0].get("content", {}).get("parts", [])
+            texto = "".join(p.get("text", "") for p in partes)
+            uso = datos.get("usageMetadata") or {}
+            self._registrar_respuesta(texto, uso.get("promptTokenCount"), uso.get("candidatesTokenCount"))
+            return texto
+
+        return await self._con_reintentos(operacion, modelo, len(prompt))
+
+    async def cerrar(self) -> None:
+        await self._http.aclose()
+
+
+class ClienteDeepSeek(_Proveedor):
+    """Cliente asíncrono compatible con OpenAI (DeepSeek) con conexiones reutilizadas."""
+    nombre = "DeepSeek"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 config: Optional[ConfigProveedor] = None):
+        super().__init__(config or ConfigProveedor.desde_entorno("DEEPSEEK"))
+        # La clave se exige al crear el cliente, no al importar el módulo
+        api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise ValueError("Falta DEEPSEEK_API_KEY en el entorno")
+        self._http = httpx.AsyncClient(
+            timeout=self.config.timeout,
+            limits=httpx.Limits(max_connections=self.config.concurrencia),
+        )
+        # Los reintentos los gestiona _con_reintentos, no el SDK
+        self._cliente = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or os.getenv("DEEPSEEK_BASE_URL", DEEPSEEK_BASE_URL),
+            max_retries=0,
+            timeout=self.config.timeout,
+            http_client=self._http,
+        )
+
+    async def chat(self, messages: list[dict], modelo: str) -> str:
+        """Devuelve el contenido de la respuesta del chat."""
+        async def operacion():
+            resp = await self._cliente.chat.completions.create(
+                model=modelo, messages=messages, stream=False
+            )
+            texto = resp.choices[0].message.content or ""
+            uso = resp.usage
+            self._registrar_respuesta(
+                texto, uso.prompt_tokens if uso else None, uso.completion_tokens if uso else None
+            )
+            return texto
+
+        return await self._con_reintentos(
+            operacion, modelo, sum(len(str(m.get("content", ""))) for m in messages)
+        )
+
+    async def chat_stream(self, messages: list[dict], modelo: str,
+                          al_recibir: Callable[[str], None]) -> str:
+        """
+        Como `chat`, pero con `stream=True`: llama a `al_recibir` con cada
+        fragmento de texto en cuanto llega y devuelve el texto completo.
+        Solo se reintenta si el error ocurre antes del primer fragmento; si
+        el stream se corta después, se devuelve lo recibido hasta entonces.
+        """
+        async def operacion():
+            inicio = time.perf_counter()
+            partes = []
+            uso = None
+            stream = await self._cliente.chat.completions.create(
+                model=modelo, messages=messages, stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                async for chunk in stream:
+                    uso = chunk.usage or uso
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not partes:
+                        anotar(primer_fragmento=round(time.perf_counter() - inicio, 6))
+                    partes.append(delta)
+                    al_recibir(delta)
+            except Exception as e:
+                if not partes:
+                    raise
+                contar("llm_streams_cortados", proveedor=self.nombre)
+                logger.warning(f"{self.nombre}: stream cortado tras {sum(map(len, partes))} caracteres ({e})")
+            finally:
+                await stream.close()
+            texto = "".join(partes)
+            self._registrar_respuesta(
+                texto, uso.prompt_tokens if uso else None, uso.completion_tokens if uso else None
+            )
+            return texto
+
+        return await self._con_reintentos(
+            operacion, modelo, sum(len(str(m.get("content", ""))) for m in messages),
+            timeout_total=False,
+        )
+
+    async def cerrar(self) -> None:
+        await self._cliente.close()
+
+
+class SesionLLM:
+    """
+    Clientes compartidos por todas las llamadas de una ejecución. Cada
+    proveedor se crea al primer uso y mantiene su pool de conexiones hasta
+    cerrar la sesión:
+
+        async with SesionLLM() as sesion:
+            texto = await sesion.gemini.generar(prompt, modelo)
+    """
+
+    def __init__(self, gemini: Optional[ClienteGemini] = None,
+                 deepseek: Optional[ClienteDeepSeek] = None):
+        self._gemini = gemini
+        self._deepseek = deepseek
+
+    @property
+    def gemini(self) -> ClienteGemini:
+        if self._gemini is None:
+            self._gemini = ClienteGemini()
+        return self._gemini
+
+    @property
+    def deepseek(self) -> ClienteDeepSeek:
+        if self._deepseek is None:
+            self._deepseek = ClienteDeepSeek()
+        return self._deepseek
+
+    async def cerrar(self) -> None:
+        for cliente in (self._gemini, self._deepseek):
+            if cliente is not None:
+                await cliente.cerrar()
+
+    async def __aenter__(self) -> "SesionLLM":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.cerrar()
+
+
+@asynccontextmanager
+async def sesion_o_nueva(sesion: Optional[SesionLLM]) -> AsyncIterator[SesionLLM]:
+    """Usa la sesión recibida o abre una temporal para una llamada suelta."""
+    if sesion is not None:
+        yield sesion
+        return
+    async with SesionLLM() as nueva:
+        yield nueva
@@ -1,59 +1,340 @@
-import os
+import asyncio
 import json
+import logging
+import os
 import re
-from openai import OpenAI
-# Carga de API key
-from dotenv import load_dotenv
-load_dotenv()
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+from clientes_llm import SesionLLM, sesion_o_nueva
+from instrumentacion import anotar, contar
+from metricas import FiltroDuplicados
 
-API_KEY = os.getenv("DEEPSEEK_API_KEY")
-if not API_KEY:
-    raise ValueError("Falta DEEPSEEK_API_KEY en el entorno")
+logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=API_KEY, base_url="https://api.deepseek.com")
+MODEL_NAME = "deepseek-chat"
+# Recibir la respuesta en streaming y entregar cada pregunta en cuanto se cierra
+STREAM = os.getenv("DEEPSEEK_STREAM", "1").lower() in ("1", "true", "si", "sí")
+_RE_INICIO_PREGUNTAS = re.compile(r'"questions"\s*:\s*\[')
+# Preguntas por llamada: los bancos grandes se reparten en varias llamadas simultáneas
+PREGUNTAS_POR_LOTE = int(os.getenv("PREGUNTAS_POR_LOTE", "10"))
+# Similitud a partir de la cual dos preguntas se consideran la misma
+UMBRAL_PREGUNTAS_DUPLICADAS = 0.9
+# Rondas extra para reponer las preguntas que faltan tras quitar duplicadas
+MAX_RONDAS_PREGUNTAS = 3
 
-def call_deepseek(ideas: list[str], num_questions: int = 8) -> list[dict]:
+def system_prompt(num_questions: int) -> str:
+    """Instrucciones de sistema para generar `num_questions` preguntas."""
+    return (
+        f"Eres un experto diseñador de evaluaciones académicas en español."
+        f"Genera EXACTAMENTE {num_questions} preguntas de opción múltiple claras, variadas y relevantes"
+        "Incluye 4 opciones por pregunta y marca la correcta. "
+        "Cada pregunta debe abordar un concepto importante distinto del texto, "
+        "evitando repeticiones temáticas y cubriendo la mayor cantidad posible de ideas. "
+        "Las preguntas deben ser precisas, no ambiguas, y con distractores plausibles pero incorrectos. "
+        "IMPORTANTE: Devuelve ÚNICA y EXCLUSIVAMENTE un JSON válido con clave \"questions\" "
+        "y dentro de cada elemento: \"question\", \"options\" y \"correct_answer\"."
+    )
+
+class ParserPreguntas:
+    """
+    Parser incremental del arreglo "questions" de la respuesta. Recibe el
+    texto por fragmentos (`agregar`) y devuelve cada pregunta en cuanto se
+    cierra su objeto JSON, sin esperar al resto de la respuesta. Si la
+    respuesta termina mal, solo se pierde la pregunta incompleta del final.
+    """
+
+    def __init__(self):
+        self.preguntas: List[dict] = []
+        self._buffer = ""
+        self._pos = 0              # siguiente carácter por revisar
+        self._en_arreglo = False
+        self._terminado = False
+        self._profundidad = 0      # llaves y corchetes abiertos dentro del arreglo
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_objeto = 0
+
+    def agregar(self, fragmento: str) -> List[dict]:
+        """Agrega texto y devuelve las preguntas completadas con él"""
+        if self._terminado:
+            return []
+        self._buffer += fragmento
+        if not self._en_arreglo:
+            m = _RE_INICIO_PREGUNTAS.search(self._buffer)
+            if not m:
+                return []
+            self._en_arreglo = True
+            self._buffer = self._buffer[m.end():]
+            self._pos = 0
+        nuevas = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            c = buffer[i]
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+            elif c == '"':
+                self._en_cadena = True
+            elif c in "{[":
+                if self._profundidad == 0:
+                    self._inicio_objeto = i
+                self._profundidad += 1
+            elif c in "}]":
+                if self._profundidad == 0:
+                    # Fin del arreglo de preguntas
+                    self._terminado = True
+                    break
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    pregunta = self._decodificar(buffer[self._inicio_objeto:i + 1])
+                    if pregunta is not None:
+                        nuevas.append(pregunta)
+            i += 1
+        # Descartar lo ya revisado que no forma parte de una pregunta abierta
+        corte = self._inicio_objeto if self._profundidad else i
+        self._buffer = buffer[corte:]
+        self._inicio_objeto = 0
+        self._pos = i - corte
+        self.preguntas.extend(nuevas)
+        return nuevas
+
+    def _decodificar(self, objeto: str) -> Optional[dict]:
+        try:
+            pregunta = json.loads(objeto)
+        except json.JSONDecodeError as e:
+            logger.warning(f"DeepSeek: pregunta con JSON inválido descartada ({e})")
+            return None
+        if not isinstance(pregunta, dict) or "question" not in pregunta:
+            logger.warning("DeepSeek: elemento sin 'question' descartado")
+            return None
+        return pregunta
+
+    @property
+    def incompleta(self) -> bool:
+        """True si quedó una pregunta abierta al terminar la respuesta"""
+        return self._profundidad > 0
+
+
+def _parsear_respuesta_completa(raw: str) -> List[dict]:
+    # Formato anterior: JSON completo, con o sin fence ```json
+    m = re.search(r"```(?:json)?\n([\s\S]+?)```", raw)
+    payload = m.group(1).strip() if m else raw.strip()
+    data = json.loads(payload)
+    return data.get("questions", [])
+
+
+async def call_deepseek_async(ideas: list[str], num_questions: int = 8,
+                              sesion: Optional[SesionLLM] = None,
+                              al_recibir_pregunta: Optional[Callable[[dict], None]] = None,
+                              stream: Optional[bool] = None,
+                              evitar: Optional[List[str]] = None) -> list[dict]:
     """
     Genera preguntas MCQ en español basadas en 'ideas'.
     Devuelve lista de dicts con 'question', 'options' y 'correct_answer'.
+    Con `stream` (por defecto DEEPSEEK_STREAM) la respuesta se lee a medida que
+    llega y `al_recibir_pregunta` se llama con cada pregunta completa.
+    `evitar` son preguntas ya generadas que no deben repetirse.
     """
+    stream = STREAM if stream is None else stream
     system_msg = {
         "role": "system",
-        "content": (
-            f"Eres un experto diseñador de evaluaciones académicas en español."
-            f"Genera EXACTAMENTE {num_questions} preguntas de opción múltiple claras, variadas y relevantes"
-            "Incluye 4 opciones por pregunta y marca la correcta. "
-            "Cada pregunta debe abordar un concepto importante distinto del texto, "
-            "evitando repeticiones temáticas y cubriendo la mayor cantidad posible de ideas. "
-            "Las preguntas deben ser precisas, no ambiguas, y con distractores plausibles pero incorrectos. "
-            "IMPORTANTE: Devuelve ÚNICA y EXCLUSIVAMENTE un JSON válido con clave \"questions\" "
-            "y dentro de cada elemento: \"question\", \"options\" y \"correct_answer\"."
-        )
+        "content": system_prompt(num_questions)
     }
+    contenido = {"ideas": ideas, "num_questions": num_questions}
+    if evitar:
+        contenido["evitar_preguntas"] = evitar
     user_msg = {
         "role": "user",
-        "content": json.dumps(
-            {"ideas": ideas, "num_questions": num_questions},
-            ensure_ascii=False
-        )
+        "content": json.dumps(contenido, ensure_ascii=False)
     }
 
+    parser = ParserPreguntas()
+    inicio = time.perf_counter()
+    primera = None
+
+    def entregar(fragmento: str) -> None:
+        nonlocal primera
+        for pregunta in parser.agregar(fragmento):
+            if primera is None:
+                primera = time.perf_counter() - inicio
+            if al_recibir_pregunta is not None:
+                al_recibir_pregunta(pregunta)
+
     # Llamada a la API de DeepSeek para generar preguntas
     try:
-        resp = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[system_msg, user_msg],
-            stream=False
-        )
-        raw = resp.choices[0].message.content
-        # Extraer JSON aunque venga en un fence ```json
-        # se limpia el texto para evitar problemas de formato
-        m = re.search(r"```(?:json)?\n([\s\S]+?)```", raw)
-        payload = m.group(1).strip() if m else raw.strip()
-        data = json.loads(payload)
-        return data.get("questions", [])
-        #devuelve una lista de preguntas con opciones y respuesta correcta
-    
+        async with sesion_o_nueva(sesion) as s:
+            if stream:
+                raw = await s.deepseek.chat_stream([system_msg, user_msg], MODEL_NAME, entregar)
+            else:
+                raw = await s.deepseek.chat([system_msg, user_msg], MODEL_NAME)
+                entregar(raw)
     except Exception as e:
-        print(f"[ERROR] DeepSeek: {e}")
-        return []
\ No newline at end of file
+        # Se conservan las preguntas que ya llegaron completas
+        logger.error(f"DeepSeek: {e}")
+        return parser.preguntas
+
+    anotar(primera_pregunta=round(primera, 6) if primera is not None else None)
+    if parser.incompleta:
+        logger.warning(f"DeepSeek: respuesta cortada; se conservan {len(parser.preguntas)} preguntas completas")
+    if parser.preguntas:
+        return parser.preguntas
+    # Sin arreglo "questions" reconocible: se intenta con la respuesta completa
+    try:
+        preguntas = _parsear_respuesta_completa(raw)
+    except Exception as e:
+        logger.error(f"DeepSeek: {e}")
+        return []
+    for pregunta in preguntas:
+        if al_recibir_pregunta is not None:
+            al_recibir_pregunta(pregunta)
+    return preguntas
+    #devuelve una lista de preguntas con opciones y respuesta correcta
+
+def repartir_ideas(ideas: List[str], num_questions: int,
+                   preguntas_por_lote: int = PREGUNTAS_POR_LOTE) -> List[Tuple[List[str], int]]:
+    """
+    Divide las ideas en lotes consecutivos y reparte entre ellos las
+    `num_questions` preguntas. Si hay más lotes que ideas, varios lotes
+    comparten idea (las preguntas repetidas se filtran después).
+    """
+    lotes = max(1, -(-num_questions // max(1, preguntas_por_lote)))
+    resultado = []
+    for i in range(lotes):
+        if len(ideas) >= lotes:
+            grupo = ideas[i * len(ideas) // lotes:(i + 1) * len(ideas) // lotes]
+        else:
+            grupo = [ideas[i % len(ideas)]] if ideas else []
+        cuota = num_questions // lotes + (i < num_questions % lotes)
+        resultado.append((grupo, cuota))
+    return resultado
+
+# Memoización de las preguntas de un lote: recibe las ideas del lote, su
+# cuota y la función que las genera, y devuelve las guardadas o las generadas
+CacheLote = Callable[[List[str], int, Callable[[], Awaitable[list[dict]]]], Awaitable[list[dict]]]
+
+async def generar_preguntas_async(ideas: list[str], num_questions: int = 8,
+                                  sesion: Optional[SesionLLM] = None,
+                                  al_recibir_pregunta: Optional[Callable[[dict], None]] = None,
+                                  preguntas_por_lote: int = PREGUNTAS_POR_LOTE,
+                                  stream: Optional[bool] = None,
+                                  cache_lote: Optional[CacheLote] = None) -> list[dict]:
+    """
+    Genera exactamente `num_questions` preguntas (si el proveedor responde)
+    repartiendo las ideas en lotes de hasta `preguntas_por_lote` preguntas que
+    se piden a la vez. Las preguntas casi iguales a una ya aceptada se
+    descartan con los embeddings de MiniLM; si faltan preguntas, solo se piden
+    las que faltan, indicando las existentes para que no se repitan.
+    Con `cache_lote` se memoizan las respuestas de los lotes de la primera
+    ronda: si solo cambiaron algunas ideas, los demás lotes no se vuelven a pedir.
+    Sin ideas no se pide nada: las preguntas no tendrían de qué tratar.
+    """
+    if num_questions <= 0:
+        return []
+    if not ideas:
+        logger.warning(f"DeepSeek: sin ideas ni tablas de contexto; no se piden las {num_questions} preguntas")
+        return []
+    filtro = FiltroDuplicados(UMBRAL_PREGUNTAS_DUPLICADAS)
+    aceptadas: List[Tuple[Tuple[int, int, int], dict]] = []
+    # Preguntas recibidas pendientes de filtrar; None cierra la ronda
+    cola: asyncio.Queue = asyncio.Queue()
+
+    def receptor(ronda: int, lote: int) -> Callable[[dict], None]:
+        recibidas = 0
+
+        def recibir(pregunta: dict) -> None:
+            # Se llama desde el stream: solo encola, sin calcular embeddings
+            nonlocal recibidas
+            recibidas += 1
+            cola.put_nowait(((ronda, lote, recibidas), pregunta))
+
+        return recibir
+
+    async def deduplicar() -> None:
+        # Un único consumidor filtra por tandas lo que llegó mientras se
+        # calculaban los embeddings de la tanda anterior. El modelo corre en
+        # otro hilo para no frenar el event loop (y con él los demás streams)
+        fin = False
+        while not fin:
+            tanda = [await cola.get()]
+            while not cola.empty():
+                tanda.append(cola.get_nowait())
+            pendientes = [item for item in tanda if item is not None]
+            fin = len(pendientes) < len(tanda)
+            nuevas = []
+            if pendientes and len(aceptadas) < num_questions:
+                nuevas = await asyncio.to_thread(
+                    filtro.filtrar, [str(pregunta.get("question", "")) for _, pregunta in pendientes]
+                )
+            for i, (orden, pregunta) in enumerate(pendientes):
+                if len(aceptadas) >= num_questions:
+                    contar("preguntas_generadas", resultado="sobrante")
+                elif not nuevas[i]:
+                    contar("preguntas_generadas", resultado="duplicada")
+                else:
+                    contar("preguntas_generadas", resultado="aceptada")
+                    aceptadas.append((orden, pregunta))
+                    if al_recibir_pregunta is not None:
+                        al_recibir_pregunta(pregunta)
+
+    async def pedir_lote(s: SesionLLM, grupo: List[str], cuota: int,
+                         recibir: Callable[[dict], None], evitar: Optional[List[str]]) -> None:
+        entregadas = 0
+
+        def al_recibir(pregunta: dict) -> None:
+            nonlocal entregadas
+            entregadas += 1
+            recibir(pregunta)
+
+        def llamar() -> Awaitable[list[dict]]:
+            nonlocal llamadas
+            llamadas += 1
+            return call_deepseek_async(grupo, cuota, s, al_recibir, stream, evitar)
+
+        if cache_lote is None or evitar:
+            await llamar()
+            return
+        preguntas = await cache_lote(grupo, cuota, llamar)
+        if not entregadas:
+            # Respuesta tomada de la caché: pasa por el mismo filtro que las recibidas
+            for pregunta in preguntas:
+                recibir(pregunta)
+
+    rondas = llamadas = 0
+    async with sesion_o_nueva(sesion) as s:
+        while rondas <= MAX_RONDAS_PREGUNTAS and len(aceptadas) < num_questions:
+            antes = len(aceptadas)
+            lotes = repartir_ideas(ideas, num_questions - antes, preguntas_por_lote)
+            evitar = [q.get("question", "") for _, q in aceptadas] if rondas else None
+            if rondas:
+                logger.info(f"DeepSeek: faltan {num_questions - antes} preguntas; ronda {rondas}")
+            # Todos los lotes a la vez; el semáforo del cliente limita las llamadas simultáneas
+            consumidor = asyncio.create_task(deduplicar())
+            try:
+                await asyncio.gather(*(
+                    pedir_lote(s, grupo, cuota, receptor(rondas, i), evitar)
+                    for i, (grupo, cuota) in enumerate(lotes)
+                ))
+            finally:
+                cola.put_nowait(None)
+                await consumidor
+            rondas += 1
+            if len(aceptadas) == antes:
+                # El proveedor no aporta preguntas nuevas: no tiene sentido insistir
+                break
+
+    anotar(rondas=rondas, llamadas=llamadas)
+    if len(aceptadas) < num_questions:
+        logger.warning(f"DeepSeek: {len(aceptadas)} de {num_questions} preguntas tras {rondas} rondas")
+    # Orden estable: por ronda, lote y orden de llegada dentro de cada lote
+    return [pregunta for _, pregunta in sorted(aceptadas, key=lambda a: a[0])]
+
+def call_deepseek(ideas: list[str], num_questions: int = 8) -> list[dict]:
+    """
+    Versión bloqueante de `call_deepseek_async`.
+    """
+    return asyncio.run(call_deepseek_async(ideas, num_questions))
@@ -0,0 +1,369 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+import pdfplumber
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import PSLiteral
+from pdfplumber.page import Page
+
+logger = logging.getLogger(__name__)
+
+FuentePDF = Union[str, Path, bytes, BinaryIO]
+
+# Filtro previo de páginas sin tablas (la búsqueda de tablas de pdfplumber,
+# con su estrategia por defecto "lines", solo encuentra tablas delimitadas por
+# líneas o rectángulos):
+#   0 = buscar tablas en todas las páginas
+#   1 = omitir páginas sin al menos 2 bordes horizontales y 2 verticales
+#       (no pueden formar ni una celda; el resultado es idéntico)
+#   2 = omitir además recuadros sueltos de una sola celda (marcos, cajas de
+#       texto), que pdfplumber reporta como tablas de 1x1; cambia el CSV
+FILTRO_TABLAS = int(os.getenv("FILTRO_TABLAS", "1"))
+# Modo de memoria acotada para PDFs muy grandes: el PDF se lee desde disco
+# mapeado en memoria y tras cada página se descartan sus objetos ya leídos,
+# así que la memoria depende de la página y no del tamaño del documento
+MEMORIA_BAJA = os.getenv("MEMORIA_BAJA", "0").lower() in ("1", "true", "si", "sí")
+# Directorio de los archivos temporales del modo de memoria baja (None = el del sistema)
+DIRECTORIO_TEMPORAL = os.getenv("MEMORIA_BAJA_DIR") or None
+# Tamaño de los bloques al copiar o leer un PDF por partes
+BLOQUE_BYTES = 1 << 20
+# Operadores de trazado del flujo de contenido: líneas, rectángulos y curvas
+_RE_OPERADOR_TRAZO = re.compile(rb"(?<![^\s\]\)>])(?:re|l|c|v|y)(?=[\s\[\(/<%]|$)")
+# Cadenas de texto literales, que se quitan antes de buscar operadores ("y", "l"...)
+_RE_CADENA = re.compile(rb"\((?:\\.|[^\\)])*\)", re.DOTALL)
+
+
+@dataclass
+class PaginaPDF:
+    """
+    Contenido de una página ya extraído: texto y tablas crudas (sin limpiar).
+    """
+    numero: int
+    texto: str
+    tablas: List[List[List[Optional[str]]]] = field(default_factory=list)
+    # Segundos de extracción de texto y de tablas (no cuentan al comparar páginas)
+    tiempos: Dict[str, float] = field(default_factory=dict, compare=False, repr=False)
+    # True si el filtro previo descartó la página sin buscar tablas
+    tablas_omitidas: bool = field(default=False, compare=False)
+
+
+def _abrir_stream(fuente: FuentePDF):
+    # Rutas se abren directamente; bytes y buffers en memoria (p. ej. el
+    # UploadedFile de Streamlit) se leen sin copiarlos a un archivo temporal.
+    if isinstance(fuente, (str, Path)):
+        return fuente
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return io.BytesIO(fuente)
+    if hasattr(fuente, "seek"):
+        fuente.seek(0)
+    return fuente
+
+
+def volcar_a_disco(fuente: FuentePDF, directorio: Optional[str] = DIRECTORIO_TEMPORAL) -> Path:
+    """
+    Copia un PDF en memoria (bytes o un buffer como el UploadedFile de
+    Streamlit) a un archivo temporal, por bloques y sin copias intermedias.
+    Quien lo llama debe borrar el archivo.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=directorio, delete=False) as destino:
+        if isinstance(fuente, (bytes, bytearray, memoryview)):
+            destino.write(fuente)
+        else:
+            fuente.seek(0)
+            for bloque in iter(lambda: fuente.read(BLOQUE_BYTES), b""):
+                destino.write(bloque)
+    return Path(destino.name)
+
+
+def tiene_trazos(page) -> bool:
+    """
+    Revisa el flujo de contenido de la página, sin analizar su layout, en busca
+    de operadores de trazado. Es conservador: ante la duda (formularios
+    XObject, flujos ilegibles) responde True.
+    """
+    try:
+        objeto = page.page_obj
+        xobjects = resolve1((objeto.resources or {}).get("XObject")) or {}
+        for xobject in xobjects.values():
+            if resolve1(resolve1(xobject).get("Subtype")).name == "Form":
+                return True
+        for flujo in objeto.contents:
+            if _RE_OPERADOR_TRAZO.search(_RE_CADENA.sub(b" ", resolve1(flujo).get_data())):
+                return True
+        return False
+    except Exception:
+        return True
+
+
+def _huella_objeto(objeto, memo: Dict[int, bytes], visitando: set) -> bytes:
+    # Resumen canónico de un objeto PDF según su contenido y no su número de
+    # objeto, para que un PDF regenerado con otra numeración dé la misma huella.
+    # Las referencias ya resumidas se reutilizan (fuentes compartidas por páginas).
+    if isinstance(objeto, PDFObjRef):
+        if objeto.objid in memo:
+            return memo[objeto.objid]
+        if objeto.objid in visitando:
+            return b"ciclo"
+        visitando.add(objeto.objid)
+        resumen = _huella_objeto(objeto.resolve(), memo, visitando)
+        visitando.discard(objeto.objid)
+        memo[objeto.objid] = resumen
+        return resumen
+    h = hashlib.sha256()
+    if isinstance(objeto, PDFStream):
+        h.update(b"s" + _huella_objeto(objeto.attrs, memo, visitando))
+        # Las imágenes no aportan texto ni bordes de tablas: basta con su diccionario
+        subtipo = resolve1(objeto.attrs.get("Subtype"))
+        if not (isinstance(subtipo, PSLiteral) and subtipo.name == "Image"):
+            h.update(objeto.get_data())
+    elif isinstance(objeto, dict):
+        h.update(b"d")
+        for clave in sorted(objeto, key=str):
+            # "Parent" y "P" apuntan hacia arriba en el árbol (y forman ciclos)
+            if clave in ("Parent", "P"):
+                continue
+            h.update(str(clave).encode("utf-8") + _huella_objeto(objeto[clave], memo, visitando))
+    elif isinstance(objeto, (list, tuple)):
+        h.update(b"l")
+        for elemento in objeto:
+            h.update(_huella_objeto(elemento, memo, visitando))
+    elif isinstance(objeto, PSLiteral):
+        h.update(b"/" + str(objeto.name).encode("utf-8"))
+    elif isinstance(objeto, (bytes, bytearray)):
+        h.update(b"b" + bytes(objeto))
+    else:
+        h.update(repr(objeto).encode("utf-8"))
+    return h.digest()
+
+
+def huella_pagina(page, memo: Optional[Dict[int, bytes]] = None) -> str:
+    """
+    Huella del contenido de una página: flujos de contenido, recursos
+    (fuentes, formularios) y geometría, sin analizar su layout. Dos páginas
+    con la misma huella dan el mismo texto y las mismas tablas, aunque estén
+    en documentos o posiciones distintas.
+    """
+    objeto = page.page_obj
+    memo = {} if memo is None else memo
+    visitando: set = set()
+    h = hashlib.sha256()
+    h.update(_huella_objeto(objeto.resources or {}, memo, visitando))
+    for flujo in objeto.contents:
+        h.update(_huella_objeto(flujo, memo, visitando))
+    geometria = {clave: objeto.attrs.get(clave) for clave in ("MediaBox", "CropBox", "Rotate")}
+    h.update(_huella_objeto(geometria, memo, visitando))
+    return h.hexdigest()
+
+
+def _posiciones(valores: List[float], tolerancia: float = 3) -> int:
+    # Cantidad de posiciones distintas, juntando las que están a menos de `tolerancia`
+    distintas = 0
+    ultima = None
+    for valor in sorted(valores):
+        if ultima is None or valor - ultima > tolerancia:
+            distintas += 1
+        ultima = valor
+    return distintas
+
+
+def puede_tener_tablas(page, filtro: int = FILTRO_TABLAS) -> bool:
+    """
+    Clasificador rápido: decide con los bordes que pdfplumber ya conoce
+    (líneas, rectángulos y curvas) si vale la pena buscar tablas en la página.
+    """
+    if filtro <= 0:
+        return True
+    if not any(page.objects.get(tipo) for tipo in ("line", "rect", "curve")):
+        return False
+    horizontales = [e for e in page.edges if e["orientation"] == "h"]
+    verticales = [e for e in page.edges if e["orientation"] == "v"]
+    if len(horizontales) < 2 or len(verticales) < 2:
+        return False
+    if filtro >= 2:
+        # Un recuadro suelto tiene 2 filas de bordes y 2 columnas; una tabla, más
+        filas = _posiciones([e["top"] for e in horizontales])
+        columnas = _posiciones([e["x0"] for e in verticales])
+        return filas >= 2 and columnas >= 2 and (filas > 2 or columnas > 2)
+    return True
+
+
+def extraer_pagina(page, texto: bool = True, filtro_tablas: int = FILTRO_TABLAS,
+                   tablas: bool = True) -> PaginaPDF:
+    """
+    Extrae texto y tablas de una página de pdfplumber reutilizando el mismo
+    análisis de layout para ambos. Las tablas solo se buscan en las páginas
+    que pasan el filtro previo; con `texto=False` las páginas sin trazos ni
+    siquiera se analizan. Con `tablas=False` solo se extrae el texto.
+    """
+    inicio = time.perf_counter()
+    contenido = (page.extract_text() or "") if texto else ""
+    medio = time.perf_counter()
+    candidata = tablas and (
+        (texto or filtro_tablas <= 0 or tiene_trazos(page))
+        and puede_tener_tablas(page, filtro_tablas)
+    )
+    encontradas = []
+    if candidata:
+        try:
+            encontradas = page.extract_tables()
+        except Exception as e:
+            logger.error(f"Error extrayendo tablas de la página {page.page_number}: {str(e)}")
+            encontradas = []
+    tiempos = {"texto": medio - inicio, "tablas": time.perf_counter() - medio}
+    return PaginaPDF(numero=page.page_number, texto=contenido, tablas=encontradas, tiempos=tiempos,
+                     tablas_omitidas=not candidata)
+
+
+class DocumentoPDF:
+    """
+    PDF abierto una sola vez. Sirve a la vez para extraer texto y tablas.
+    Con `memoria_baja` las rutas se leen mapeadas en memoria, las páginas se
+    crean de a una y tras cada página se descartan los objetos PDF ya leídos
+    (flujos de contenido, imágenes) y las partes del archivo mapeadas.
+    """
+
+    def __init__(self, fuente: FuentePDF, memoria_baja: bool = False):
+        self.memoria_baja = memoria_baja
+        self._archivo = self._mapa = None
+        self._refs: Optional[List[tuple]] = None
+        if memoria_baja and isinstance(fuente, (str, Path)):
+            self._archivo = open(fuente, "rb")
+            self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_RANDOM"):
+                # Los objetos se leen salteados: sin lectura anticipada, solo
+                # se cargan las partes del archivo que se usan
+                self._mapa.madvise(mmap.MADV_RANDOM)
+            fuente = self._mapa
+        try:
+            self._pdf = pdfplumber.open(_abrir_stream(fuente))
+        except Exception:
+            self._cerrar_mapa()
+            raise
+
+    @property
+    def num_paginas(self) -> int:
+        if not self.memoria_baja:
+            return len(self._pdf.pages)
+        return len(self._referencias())
+
+    def _referencias(self) -> List[tuple]:
+        # Un solo recorrido del árbol de páginas por documento (y por worker):
+        # de cada página se guardan su id, sus atributos (con los heredados;
+        # los flujos quedan como referencias sin leer), su etiqueta y su
+        # doctop, así que cualquier rango se crea por índice sin volver a
+        # recorrer desde la página 0
+        if self._refs is None:
+            refs = []
+            doctop = 0
+            for indice, page_obj in enumerate(PDFPage.create_pages(self._pdf.doc)):
+                refs.append((page_obj.pageid, page_obj.attrs, page_obj.label, doctop))
+                doctop += Page(self._pdf, page_obj, page_number=indice + 1).height
+                self._liberar()
+            self._refs = refs
+        return self._refs
+
+    def _pages(self, inicio: int = 0, fin: Optional[int] = None) -> Iterator[Page]:
+        # `pdf.pages` de pdfplumber conserva todas las páginas con sus flujos
+        # de contenido ya leídos; con memoria_baja se crean de a una al avanzar
+        if not self.memoria_baja:
+            yield from self._pdf.pages[inicio:fin]
+            return
+        refs = self._referencias()
+        for indice in range(inicio, len(refs) if fin is None else min(fin, len(refs))):
+            pageid, attrs, label, doctop = refs[indice]
+            page_obj = PDFPage(self._pdf.doc, pageid, attrs, label)
+            yield Page(self._pdf, page_obj, page_number=indice + 1, initial_doctop=doctop)
+
+    def _liberar(self) -> None:
+        # Los objetos descartados se vuelven a leer del archivo si otra página
+        # los usa; las fuentes ya interpretadas quedan en el gestor de recursos
+        if not self.memoria_baja:
+            return
+        documento = self._pdf.doc
+        # Cachés internas de `PDFDocument` de pdfminer: si una versión las
+        # cambia, solo se pierde esta liberación, no la extracción
+        for nombre in ("_cached_objs", "_parsed_objs"):
+            objetos = getattr(documento, nombre, None)
+            if hasattr(objetos, "clear"):
+                objetos.clear()
+        if self._mapa is not None and hasattr(mmap, "MADV_DONTNEED"):
+            self._mapa.madvise(mmap.MADV_DONTNEED)
+
+    def paginas(self, inicio: int = 0, fin: Optional[int] = None, texto: bool = True,
+                filtro_tablas: int = FILTRO_TABLAS, tablas: bool = True) -> Iterator[PaginaPDF]:
+        """
+        Recorre las páginas [inicio, fin) devolviendo su texto y tablas.
+        """
+        for page in self._pages(inicio, fin):
+            pagina = extraer_pagina(page, texto, filtro_tablas, tablas)
+            # Liberar el layout de la página ya procesada para que la memoria
+            # dependa de la página y no del documento completo
+            page.close()
+            self._liberar()
+            yield pagina
+
+    def huellas(self) -> List[str]:
+        """
+        Huella de cada página (ver `huella_pagina`), en orden.
+        """
+        memo: Dict[int, bytes] = {}
+        huellas = []
+        for page in self._pages():
+            huellas.append(huella_pagina(page, memo))
+            self._liberar()
+        return huellas
+
+    def _cerrar_mapa(self) -> None:
+        if self._mapa is not None:
+            self._mapa.close()
+            self._archivo.close()
+            self._mapa = self._archivo = None
+
+    def close(self) -> None:
+        if self.memoria_baja:
+            # `close()` de pdfplumber recorre `pdf.pages`, que crearía todas las páginas
+            self._pdf.flush_cache()
+            if not self._pdf.stream_is_external:
+                self._pdf.stream.close()
+        else:
+            self._pdf.close()
+        self._cerrar_mapa()
+
+    def __enter__(self) -> "DocumentoPDF":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def contar_paginas(fuente: FuentePDF, memoria_baja: bool = False) -> int:
+    """
+    Número de páginas del PDF (solo lee el árbol de páginas, no su contenido).
+    """
+    with abrir_pdf(fuente, memoria_baja) as documento:
+        return documento.num_paginas
+
+
+def huellas_paginas(fuente: FuentePDF, memoria_baja: bool = False) -> List[str]:
+    """
+    Huellas de las páginas del PDF (lee los flujos de contenido, no el layout).
+    """
+    with abrir_pdf(fuente, memoria_baja) as documento:
+        return documento.huellas()
+
+
+def abrir_pdf(fuente: FuentePDF, memoria_baja: bool = False) -> DocumentoPDF:
+    """
+    Abre un PDF desde una ruta, bytes o un buffer en memoria.
+    """
+    return DocumentoPDF(fuente, memoria_baja)
@@ -0,0 +1,149 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from documento_pdf import FILTRO_TABLAS, DocumentoPDF, FuentePDF, PaginaPDF, abrir_pdf
+
+# Procesos por defecto para la extracción (1 = secuencial)
+WORKERS_POR_DEFECTO = int(os.getenv("EXTRACCION_WORKERS", "1"))
+# Bloques por proceso cuando no se fija el tamaño: más bloques reparten
+# mejor la carga si hay páginas muy densas, a costa de más mensajes.
+BLOQUES_POR_WORKER = 4
+
+# Documento abierto una sola vez en cada proceso del pool
+_documento: Optional[DocumentoPDF] = None
+
+
+def _inicializar_worker(fuente, memoria_baja: bool = False) -> None:
+    global _documento
+    _documento = abrir_pdf(fuente, memoria_baja)
+
+
+def _extraer_rango(tarea: tuple[int, int, bool, int, bool]) -> List[PaginaPDF]:
+    inicio, fin, texto, filtro_tablas, tablas = tarea
+    return list(_documento.paginas(inicio, fin, texto, filtro_tablas, tablas))
+
+
+def _fuente_transferible(fuente: FuentePDF):
+    # Las rutas viajan tal cual; los buffers se leen a bytes para enviarlos
+    # una única vez a cada proceso (en el initializer, no por tarea).
+    if isinstance(fuente, (str, Path, bytes)):
+        return fuente
+    if isinstance(fuente, (bytearray, memoryview)):
+        return bytes(fuente)
+    if hasattr(fuente, "getvalue"):
+        return fuente.getvalue()
+    fuente.seek(0)
+    return fuente.read()
+
+
+def rangos_de_paginas(num_paginas: int, workers: int,
+                      paginas_por_bloque: Optional[int] = None) -> List[tuple[int, int]]:
+    """
+    Divide [0, num_paginas) en rangos contiguos de páginas.
+    """
+    if not paginas_por_bloque:
+        paginas_por_bloque = max(1, math.ceil(num_paginas / (workers * BLOQUES_POR_WORKER)))
+    return [
+        (inicio, min(inicio + paginas_por_bloque, num_paginas))
+        for inicio in range(0, num_paginas, paginas_por_bloque)
+    ]
+
+
+def rangos_de_indices(indices: Sequence[int], workers: int,
+                      paginas_por_bloque: Optional[int] = None) -> List[tuple[int, int]]:
+    """
+    Agrupa los índices de página (ordenados) en rangos contiguos [inicio, fin)
+    de hasta `paginas_por_bloque` páginas.
+    """
+    if not paginas_por_bloque:
+        paginas_por_bloque = max(1, math.ceil(len(indices) / (workers * BLOQUES_POR_WORKER)))
+    rangos: List[tuple[int, int]] = []
+    for indice in indices:
+        if rangos and rangos[-1][1] == indice and indice - rangos[-1][0] < paginas_por_bloque:
+            rangos[-1] = (rangos[-1][0], indice + 1)
+        else:
+            rangos.append((indice, indice + 1))
+    return rangos
+
+
+def _indices_validos(indices: Optional[Sequence[int]], num_paginas: int) -> List[int]:
+    if indices is None:
+        return list(range(num_paginas))
+    return sorted(i for i in set(indices) if 0 <= i < num_paginas)
+
+
+def iterar_paginas(fuente: FuentePDF, workers: Optional[int] = None,
+                   paginas_por_bloque: Optional[int] = None, texto: bool = True,
+                   filtro_tablas: Optional[int] = None,
+                   indices: Optional[Sequence[int]] = None,
+                   memoria_baja: bool = False,
+                   num_paginas: Optional[int] = None,
+                   tablas: bool = True) -> Iterator[PaginaPDF]:
+    """
+    Extrae las páginas de un PDF en orden. Con `workers` > 1 reparte rangos
+    de páginas entre un pool de procesos y devuelve el mismo resultado que
+    el recorrido secuencial. Con `texto=False` solo se extraen las tablas y
+    con `tablas=False`, solo el texto;
+    `filtro_tablas` es el nivel del filtro previo de páginas sin tablas.
+    Con `indices` (base 0) solo se extraen esas páginas, p. ej. las que
+    cambiaron respecto de una versión anterior del documento.
+    Con `memoria_baja` (ver `documento_pdf.MEMORIA_BAJA`) cada proceso lee
+    el PDF mapeado desde su ruta en vez de recibir una copia en bytes.
+    Si ya se conoce `num_paginas` (p. ej. por las huellas), en paralelo el
+    proceso principal no abre el PDF.
+    """
+    workers = WORKERS_POR_DEFECTO if workers is None else workers
+    filtro_tablas = FILTRO_TABLAS if filtro_tablas is None else filtro_tablas
+    validos = None if num_paginas is None else _indices_validos(indices, num_paginas)
+    if validos is not None and not validos:
+        return
+    if validos is None or workers <= 1 or len(validos) <= 1:
+        with abrir_pdf(fuente, memoria_baja) as documento:
+            if validos is None:
+                num_paginas = documento.num_paginas
+                validos = _indices_validos(indices, num_paginas)
+                if not validos:
+                    return
+            if workers <= 1 or len(validos) <= 1:
+                for inicio, fin in rangos_de_indices(validos, 1, num_paginas):
+                    yield from documento.paginas(inicio, fin, texto=texto, filtro_tablas=filtro_tablas,
+                                                 tablas=tablas)
+                return
+    indices = validos
+
+    workers = min(workers, len(indices))
+    if len(indices) == num_paginas:
+        rangos = rangos_de_paginas(num_paginas, workers, paginas_por_bloque)
+    else:
+        rangos = rangos_de_indices(indices, workers, paginas_por_bloque)
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_inicializar_worker,
+        initargs=(_fuente_transferible(fuente), memoria_baja),
+    )
+    try:
+        # map conserva el orden de los rangos aunque terminen desordenados
+        tareas = [(inicio, fin, texto, filtro_tablas, tablas) for inicio, fin in rangos]
+        for paginas in pool.map(_extraer_rango, tareas):
+            yield from paginas
+    finally:
+        # Si se deja de consumir el generador (p. ej. un trabajo cancelado),
+        # los rangos que aún no empezaron se descartan en vez de esperarlos
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extraer_paginas(fuente: FuentePDF, workers: Optional[int] = None,
+                    paginas_por_bloque: Optional[int] = None, texto: bool = True,
+                    filtro_tablas: Optional[int] = None,
+                    indices: Optional[Sequence[int]] = None,
+                    memoria_baja: bool = False,
+                    num_paginas: Optional[int] = None,
+                    tablas: bool = True) -> List[PaginaPDF]:
+    """
+    Igual que `iterar_paginas` pero devuelve la lista completa.
+    """
+    return list(iterar_paginas(fuente, workers, paginas_por_bloque, texto, filtro_tablas, indices, memoria_baja,
+                               num_paginas, tablas))
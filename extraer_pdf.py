@@ -1,11 +1,22 @@
-from PyPDF2 import PdfReader
+from typing import Iterable, Optional
 
-def extract_text_from_pdf(path: str) -> str:
+from documento_pdf import FuentePDF, PaginaPDF
+from extraccion_paralela import iterar_paginas
+
+
+def unir_texto(paginas: Iterable[PaginaPDF]) -> str:
+    """
+    Concatena el texto de las páginas ya extraídas.
+    """
+    return "\n".join(pagina.texto for pagina in paginas)
+
+
+def extract_text_from_pdf(path: FuentePDF, workers: Optional[int] = None) -> str:
     """
     Lee un PDF y devuelve todo su texto concatenado.
+    Con `workers` > 1 extrae las páginas en paralelo.
+    El texto sale de pdfplumber (antes PyPDF2): los saltos de línea y
+    espacios entre palabras pueden diferir de los de la versión anterior.
+    No se buscan tablas.
     """
-    reader = PdfReader(path)
-    text = []
-    for page in reader.pages:
-        text.append(page.extract_text() or "")
-    return "\n".join(text)
\ No newline at end of file
+    return unir_texto(iterar_paginas(path, workers, tablas=False))
@@ -1,45 +1,77 @@
-import pdfplumber
-import csv
-import io
 from pathlib import Path
 import logging
-from limpieza_texto import clean_text 
+from typing import Iterable, List, Optional
+from documento_pdf import FuentePDF, PaginaPDF
+from extraccion_paralela import iterar_paginas
+from limpieza_texto import clean_texts
+from tabla_estructurada import TablaEstructurada, estructurar_tabla
 
 logger = logging.getLogger(__name__)
 
-def extraer_tablas(path_pdf: str = "texto_ia.pdf") -> str:
+def tablas_de_pagina(pagina: PaginaPDF) -> List[TablaEstructurada]:
+    """
+    Limpia cada celda de las tablas de una página ya extraída y las devuelve
+    como tablas estructuradas (encabezado, columnas tipadas y celdas limpias).
+    """
+    tablas = []
+    for indice, tabla in enumerate(pagina.tablas):
+        # Todas las celdas de la tabla se limpian en una sola llamada
+        celdas = clean_texts(celda if celda is not None else "" for fila in tabla for celda in fila)
+        limpias = []
+        inicio = 0
+        for fila in tabla:
+            limpias.append(celdas[inicio:inicio + len(fila)])
+            inicio += len(fila)
+        tablas.append(estructurar_tabla(pagina.numero, indice, limpias, tabla))
+    return tablas
+
+def tablas_de_paginas(paginas: Iterable[PaginaPDF]) -> List[TablaEstructurada]:
+    return [tabla for pagina in paginas for tabla in tablas_de_pagina(pagina)]
+
+def tablas_a_csv(paginas: Iterable[PaginaPDF]) -> str:
+    """
+    Limpia cada celda de las tablas de las páginas ya extraídas y las devuelve en formato CSV como string.
+    Devuelve cadena vacía si no hay tablas.
+    """
+    return "".join(tabla.a_csv() for tabla in tablas_de_paginas(paginas))
+
+def reporte_filtro_tablas(paginas: Iterable[PaginaPDF]) -> dict:
+    """
+    Páginas que el filtro previo descartó sin buscar tablas y las analizadas.
+    """
+    omitidas, analizadas = [], []
+    for pagina in paginas:
+        (omitidas if pagina.tablas_omitidas else analizadas).append(pagina.numero)
+    return {"paginas_omitidas": omitidas, "paginas_analizadas": analizadas}
+
+def extraer_tablas_estructuradas(path_pdf: FuentePDF, workers: Optional[int] = None,
+                                 filtro_tablas: Optional[int] = None) -> List[TablaEstructurada]:
+    """
+    Como `extraer_tablas`, pero devuelve las tablas estructuradas de cada página.
+    """
+    return tablas_de_paginas(iterar_paginas(path_pdf, workers, texto=False, filtro_tablas=filtro_tablas))
+
+def extraer_tablas(path_pdf: FuentePDF = "texto_ia.pdf", workers: Optional[int] = None,
+                   filtro_tablas: Optional[int] = None) -> str:
     """
     Abre un PDF, extrae tablas por página, limpia cada celda y devuelve el resultado en formato CSV como string.
+    Acepta una ruta, bytes o un buffer en memoria. Con `workers` > 1 extrae las páginas en paralelo.
+    Las páginas sin trazos se descartan sin analizarlas (ver `documento_pdf.FILTRO_TABLAS`).
     Devuelve cadena vacía si no encuentra tablas o hay error.
     """
     try:
-        pdf_file = Path(path_pdf)
-        if not pdf_file.is_file():
+        if isinstance(path_pdf, (str, Path)) and not Path(path_pdf).is_file():
             logger.error(f"El archivo no existe: {path_pdf}")
             return ""
         
-        buffer = io.StringIO()
-        csv_writer = csv.writer(buffer)
-        tablas_encontradas = False
-        
-        with pdfplumber.open(path_pdf) as pdf:
-            for page in pdf.pages:
-                tablas = page.extract_tables()
-                if not tablas:
-                    continue
-                
-                for tabla in tablas:
-                    tablas_encontradas = True
-                    for fila in tabla:
-                        fila_limpia = [
-                            clean_text(celda) if celda is not None else "" 
-                            for celda in fila
-                        ]
-                        csv_writer.writerow(fila_limpia)
-                    buffer.write("\n")
-        
-        return buffer.getvalue() if tablas_encontradas else ""
+        paginas = list(iterar_paginas(path_pdf, workers, texto=False, filtro_tablas=filtro_tablas))
+        reporte = reporte_filtro_tablas(paginas)
+        logger.info(
+            f"Filtro de tablas: {len(reporte['paginas_omitidas'])} de {len(paginas)} páginas omitidas "
+            f"{reporte['paginas_omitidas']}"
+        )
+        return tablas_a_csv(paginas)
     
     except Exception as e:
         logger.error(f"Error extrayendo tablas: {str(e)}")
-        return ""
\ No newline at end of file
+        return ""
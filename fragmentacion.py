@@ -0,0 +1,75 @@
+import hashlib
+import math
+import os
+from typing import List, Sequence
+
+# Tamaño máximo de cada fragmento enviado a un LLM, en tokens estimados
+MAX_TOKENS_FRAGMENTO = int(os.getenv("MAX_TOKENS_FRAGMENTO", "6000"))
+# Aproximación habitual para texto en español/inglés con tokenizadores BPE
+CARACTERES_POR_TOKEN = 4
+# Cortes por contenido: pasada la mitad del tamaño máximo, un fragmento se
+# cierra tras un bloque cuyo hash es múltiplo de este valor. Los cortes
+# dependen del texto y no de su posición, así que editar o insertar una página
+# en general solo cambia los fragmentos vecinos (uno o dos en promedio; tras un
+# corte por tamaño máximo pueden ser algunos más) y el resto se reutiliza de la caché
+DIVISOR_CORTE = 4
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación rápida de tokens sin depender del tokenizador del proveedor"""
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _partir_bloque(bloque: str, max_tokens: int) -> List[str]:
+    # Un bloque demasiado grande se parte por párrafos (líneas) y, si una sola
+    # línea sigue excediendo el límite, por palabras
+    if estimar_tokens(bloque) <= max_tokens:
+        return [bloque]
+    partes = []
+    for linea in bloque.split("\n"):
+        if estimar_tokens(linea) <= max_tokens:
+            partes.append(linea)
+            continue
+        actual: List[str] = []
+        largo = 0
+        for palabra in linea.split(" "):
+            if actual and largo + len(palabra) + 1 > max_tokens * CARACTERES_POR_TOKEN:
+                partes.append(" ".join(actual))
+                actual, largo = [], 0
+            actual.append(palabra)
+            largo += len(palabra) + 1
+        if actual:
+            partes.append(" ".join(actual))
+    return partes
+
+
+def _es_corte(bloque: str) -> bool:
+    return int(hashlib.md5(bloque.encode("utf-8")).hexdigest()[:8], 16) % DIVISOR_CORTE == 0
+
+
+def fragmentar_texto(texto: str | Sequence[str], max_tokens: int = MAX_TOKENS_FRAGMENTO) -> List[str]:
+    """
+    Divide el texto en fragmentos de hasta `max_tokens` tokens estimados,
+    cortando en límites de página (si se recibe una lista de páginas) o de
+    párrafo, y agrupando bloques consecutivos mientras quepan. Pasada la
+    mitad del máximo, los cortes se hacen en bloques elegidos por su
+    contenido (ver `DIVISOR_CORTE`).
+    """
+    bloques = texto.split("\n") if isinstance(texto, str) else texto
+    fragmentos: List[str] = []
+    actual: List[str] = []
+    tokens_actual = 0
+    for bloque in bloques:
+        for parte in _partir_bloque(bloque, max_tokens):
+            tokens = estimar_tokens(parte) + 1  # +1 por el salto de línea
+            if actual and tokens_actual + tokens > max_tokens:
+                fragmentos.append("\n".join(actual))
+                actual, tokens_actual = [], 0
+            actual.append(parte)
+            tokens_actual += tokens
+            if tokens_actual * 2 >= max_tokens and _es_corte(parte):
+                fragmentos.append("\n".join(actual))
+                actual, tokens_actual = [], 0
+    if actual:
+        fragmentos.append("\n".join(actual))
+    return [f for f in fragmentos if f.strip()]
@@ -1,33 +1,33 @@
+import asyncio
+import logging
+import math
 import os
 import re
-import google.generativeai as genai
-from typing import List
-from dotenv import load_dotenv
+from typing import Awaitable, Callable, List, Optional, Sequence
+from clientes_llm import SesionLLM, sesion_o_nueva
+from fragmentacion import MAX_TOKENS_FRAGMENTO, estimar_tokens, fragmentar_texto
+from metricas import agrupar_similares
+
+logger = logging.getLogger(__name__)
 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
 MODEL_NAME = "gemini-1.5-flash"
+# Cantidad de ideas a devolver por documento
+NUM_IDEAS = int(os.getenv("NUM_IDEAS", "8"))
+# Similitud a partir de la cual dos ideas de fragmentos distintos se consideran la misma
+UMBRAL_IDEAS_DUPLICADAS = 0.85
+# El prompt pide entre 5 y 8 ideas por llamada
+MIN_IDEAS_POR_FRAGMENTO = 5
 
-def call_gemini(text: str) -> List[str]:
-    # Llama a la API de Gemini para extraer ideas principales del texto.
-    prompt = (
-        "Eres un asistente experto en comprensión de textos. "
-        "Extrae entre 5 y 8 ideas principales del siguiente texto. "
-        "Cada idea debe cubrir un concepto único y relevante. "
-        "No repitas ideas ni reformules lo mismo. "
-        "Incluye términos técnicos importantes si aparecen. "
-        "Escribe cada idea como una o varias oraciones, y numéralas así: 1., 2., 3., etc.\n\n"
-        + text
-    )
-    try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content([prompt])
-        content = response.text
-    except Exception as e:
-        print(f"Error con Gemini: {e}")
-        return []
+PROMPT_IDEAS = (
+    "Eres un asistente experto en comprensión de textos. "
+    "Extrae entre 5 y 8 ideas principales del siguiente texto. "
+    "Cada idea debe cubrir un concepto único y relevante. "
+    "No repitas ideas ni reformules lo mismo. "
+    "Incluye términos técnicos importantes si aparecen. "
+    "Escribe cada idea como una o varias oraciones, y numéralas así: 1., 2., 3., etc.\n\n"
+)
 
+def parsear_ideas(content: str, max_ideas: int = 8) -> List[str]:
     # Parseo de ideas numeradas
     ideas = []
     #busca las líneas que comienzan con un número seguido de punto y espacio
@@ -39,5 +39,72 @@ def call_gemini(text: str) -> List[str]:
             idea = m.group(1).strip()
             if idea and idea not in ideas:
                 ideas.append(idea)
-    # Retorna hasta 8 ideas únicas
-    return ideas[:8]
\ No newline at end of file
+    # Retorna hasta max_ideas ideas únicas
+    return ideas[:max_ideas]
+
+async def call_gemini_async(text: str, sesion: Optional[SesionLLM] = None,
+                            max_ideas: int = 8) -> List[str]:
+    # Llama a la API de Gemini para extraer ideas principales del texto.
+    prompt = PROMPT_IDEAS + text
+    try:
+        async with sesion_o_nueva(sesion) as s:
+            content = await s.gemini.generar(prompt, MODEL_NAME)
+    except Exception as e:
+        logger.error(f"Error con Gemini: {e}")
+        return []
+    return parsear_ideas(content, max_ideas)
+
+def call_gemini(text: str) -> List[str]:
+    # Versión bloqueante para usos fuera de un event loop
+    return asyncio.run(call_gemini_async(text))
+
+def _reducir_ideas(ideas: List[str], num_ideas: int) -> List[str]:
+    # Fusiona ideas casi iguales con los embeddings de MiniLM y prioriza las que
+    # aparecen en más fragmentos; el resultado respeta el orden del documento
+    grupos = agrupar_similares(ideas, UMBRAL_IDEAS_DUPLICADAS)
+    elegidos = sorted(grupos, key=lambda g: (-len(g), g[0]))[:num_ideas]
+    return [ideas[g[0]] for g in sorted(elegidos, key=lambda g: g[0])]
+
+# Memoización de las ideas de un fragmento: recibe el fragmento y la función
+# que las calcula, y devuelve las ideas guardadas o las calculadas
+CacheFragmento = Callable[[str, Callable[[], Awaitable[List[str]]]], Awaitable[List[str]]]
+
+async def extraer_ideas_async(text: str | Sequence[str], sesion: Optional[SesionLLM] = None,
+                              num_ideas: int = NUM_IDEAS,
+                              max_tokens: int = MAX_TOKENS_FRAGMENTO,
+                              cache_fragmento: Optional[CacheFragmento] = None) -> List[str]:
+    """
+    Extracción map-reduce para documentos largos: divide el texto (o la lista
+    de páginas) en fragmentos, extrae ideas de todos a la vez y luego fusiona
+    las repetidas. Con un solo fragmento equivale a `call_gemini_async`.
+    Con `cache_fragmento` las ideas de cada fragmento se memoizan por separado:
+    en una nueva versión del documento solo se llama al LLM por los fragmentos
+    que cambiaron.
+    """
+    fragmentos = fragmentar_texto(text, max_tokens)
+    # Se necesitan suficientes fragmentos para reunir num_ideas ideas, pero
+    # solo se vuelve a dividir si cada parte queda de al menos medio
+    # fragmento; un texto corto va en una sola llamada
+    minimo = math.ceil(num_ideas / MIN_IDEAS_POR_FRAGMENTO)
+    if 0 < len(fragmentos) < minimo:
+        total = sum(estimar_tokens(f) for f in fragmentos)
+        if total >= minimo * max_tokens // 2:
+            fragmentos = fragmentar_texto(text, max(1, math.ceil(total / minimo)))
+    if not fragmentos:
+        return []
+
+    async with sesion_o_nueva(sesion) as s:
+        def ideas_de(fragmento: str) -> Awaitable[List[str]]:
+            def llamar() -> Awaitable[List[str]]:
+                return call_gemini_async(fragmento, s, max_ideas=num_ideas)
+            return cache_fragmento(fragmento, llamar) if cache_fragmento else llamar()
+
+        if len(fragmentos) == 1:
+            return await ideas_de(fragmentos[0])
+        # Map: la latencia la marca el fragmento más lento, no el largo total
+        resultados = await asyncio.gather(*(ideas_de(f) for f in fragmentos))
+    ideas = [idea for resultado in resultados for idea in resultado]
+    if not ideas:
+        return []
+    # Reduce
+    return _reducir_ideas(ideas, num_ideas)
@@ -1,22 +1,33 @@
+import asyncio
+import logging
 import os
-import argparse
 from dotenv import load_dotenv
-import google.generativeai as genai
-from typing import List
+from typing import List, Optional
+from clientes_llm import SesionLLM, sesion_o_nueva
 
-# Carga de variables de entorno y configuración de la API
-def load_api_key():
+logger = logging.getLogger(__name__)
+
+# Carga de variables de entorno y verificación de la API key
+def load_api_key() -> str:
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("Falta GEMINI_API_KEY en el entorno.")
-    genai.configure(api_key=api_key)
+    return api_key
 
 MODEL_NAME = "gemini-1.5-flash"
 
-def call_gemini_analyzer(text: str) -> List[str]:
+PROMPT_RESUMEN_TABLAS = (
+    "Eres un asistente que resume datos presentados en tablas. "
+    "De cada tabla recibirás su página, sus dimensiones y sus filas en CSV o, si es grande, "
+    "el tipo y las estadísticas de cada columna (calculadas sobre todas las filas) y una muestra. "
+    "Genera un resumen conciso de máximo 5 puntos clave.\n\n"
+)
+
+async def call_gemini_analyzer_async(text: str, sesion: Optional[SesionLLM] = None) -> List[str]:
     """
-    Llama a la API de Gemini para generar un resumen de un CSV.
+    Llama a la API de Gemini para resumir las tablas a partir de su resumen
+    local (ver `tabla_estructurada.resumen_para_prompt`) o de un CSV.
     Maneja casos vacíos y errores.
     """
     # Si no hay texto para analizar
@@ -24,20 +35,22 @@ def call_gemini_analyzer(text: str) -> List[str]:
         return ["No se encontraron tablas para analizar"]
     
     try:
-        prompt = (
-            "Eres un asistente que resume datos presentados en CSV. "
-            "Genera un resumen conciso de máximo 5 puntos clave.\n\n"
-            + text
-        )
+        prompt = PROMPT_RESUMEN_TABLAS + text
         
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content([prompt])
+        async with sesion_o_nueva(sesion) as s:
+            response_text = await s.gemini.generar(prompt, MODEL_NAME)
         
-        if not response.text.strip():
+        if not response_text.strip():
             return ["No se pudo generar interpretación de las tablas"]
             
-        return response.text.splitlines()
+        return response_text.splitlines()
         
     except Exception as e:
-        print(f"Error con Gemini: {e}")
-        return [f"Error en interpretación: {str(e)}"]
\ No newline at end of file
+        logger.error(f"Error con Gemini: {e}")
+        return [f"Error en interpretación: {str(e)}"]
+
+def call_gemini_analyzer(text: str) -> List[str]:
+    """
+    Versión bloqueante de `call_gemini_analyzer_async`.
+    """
+    return asyncio.run(call_gemini_analyzer_async(text))
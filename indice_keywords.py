@@ -0,0 +1,139 @@
+import math
+import os
+import re
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List
+
+from almacen_embeddings import DTYPE_ALMACEN, AlmacenEmbeddings
+
+# Configuración global
+INDICE_DIR = os.getenv("KEYWORDS_INDICE_DIR", "indice_keywords")
+
+# Mismos tokens que TfidfVectorizer: palabras de 2 o más caracteres, en minúsculas
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenizar(texto: str) -> List[str]:
+    return _TOKEN.findall(texto.lower())
+
+
+class IndiceKeywords:
+    """
+    Índice IDF persistente sobre todos los documentos procesados: cuántos
+    documentos contienen cada término (SQLite), actualizado de a un documento
+    con `registrar` (por una clave del documento, así repetirlo no cuenta dos
+    veces). Las keywords de un texto son sus `top_k` términos de mayor
+    tf-idf; calcularlas no modifica el índice.
+
+    Con el índice vacío todos los términos tienen el mismo IDF y el resultado
+    son los términos más frecuentes del texto, como con el vectorizador
+    ajustado a un solo documento. Los embeddings de las keywords se guardan
+    junto al índice, en un almacén por backend (ver `embeddings`).
+    """
+
+    def __init__(self, directorio: str = INDICE_DIR, stopwords: Iterable[str] = (),
+                 dtype: str = DTYPE_ALMACEN):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.ruta_indice = os.path.join(directorio, "idf.sqlite")
+        self.stopwords = frozenset(stopwords)
+        self.dtype = dtype
+        self._almacenes: Dict[str, AlmacenEmbeddings] = {}
+        with self._conexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS documentos (clave TEXT PRIMARY KEY)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS terminos ("
+                " termino TEXT PRIMARY KEY,"
+                " df INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (nombre TEXT PRIMARY KEY, valor INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO meta (nombre, valor) VALUES ('documentos', 0)")
+
+    @contextmanager
+    def _conexion(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.ruta_indice, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def frecuencias(self, texto: str) -> Counter:
+        """Frecuencia de cada término del texto, sin stopwords"""
+        return Counter(t for t in tokenizar(texto) if t not in self.stopwords)
+
+    def _registrar(self, conn: sqlite3.Connection, clave: str, terminos: List[str]) -> bool:
+        conn.execute("BEGIN IMMEDIATE")
+        if not conn.execute("INSERT OR IGNORE INTO documentos (clave) VALUES (?)", (clave,)).rowcount:
+            return False
+        conn.execute("UPDATE meta SET valor = valor + 1 WHERE nombre = 'documentos'")
+        conn.executemany(
+            "INSERT INTO terminos (termino, df) VALUES (?, 1)"
+            " ON CONFLICT (termino) DO UPDATE SET df = df + 1",
+            [(t,) for t in terminos],
+        )
+        return True
+
+    def registrar(self, paginas: Iterable[str], clave: str) -> bool:
+        """
+        Agrega un documento al índice a partir de su texto (las páginas o el
+        texto completo como única página; se recorren una vez). `clave`
+        identifica el documento: si ya está registrado no se lee el texto.
+        Devuelve si el documento era nuevo.
+        """
+        with self._conexion() as conn:
+            if conn.execute("SELECT 1 FROM documentos WHERE clave = ?", (clave,)).fetchone():
+                return False
+        terminos = set()
+        for texto in paginas:
+            terminos.update(self.frecuencias(texto))
+        if not terminos:
+            return False
+        with self._conexion() as conn:
+            return self._registrar(conn, clave, sorted(terminos))
+
+    def _df(self, conn: sqlite3.Connection, terminos: List[str]) -> Dict[str, int]:
+        df = {}
+        # SQLite limita la cantidad de parámetros por consulta
+        for i in range(0, len(terminos), 900):
+            lote = terminos[i:i + 900]
+            marcas = ",".join("?" * len(lote))
+            df.update(conn.execute(
+                f"SELECT termino, df FROM terminos WHERE termino IN ({marcas})", lote
+            ).fetchall())
+        return df
+
+    def keywords(self, texto: str, top_k: int = 20) -> List[str]:
+        """
+        Los `top_k` términos del texto de mayor tf-idf, de mayor a menor, con
+        el IDF del índice tal como está (el texto no se registra)
+        """
+        tf = self.frecuencias(texto)
+        if not tf:
+            return []
+        terminos = list(tf)
+        with self._conexion() as conn:
+            documentos = self._documentos(conn)
+            df = self._df(conn, terminos)
+        # IDF suavizado, como TfidfVectorizer
+        puntajes = {t: tf[t] * (math.log((1 + documentos) / (1 + df.get(t, 0))) + 1) for t in terminos}
+        return sorted(terminos, key=lambda t: (-puntajes[t], t))[:top_k]
+
+    def _documentos(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT valor FROM meta WHERE nombre = 'documentos'").fetchone()[0]
+
+    def documentos(self) -> int:
+        """Documentos distintos registrados en el índice"""
+        with self._conexion() as conn:
+            return self._documentos(conn)
+
+    def embeddings(self, identificador: str) -> AlmacenEmbeddings:
+        """Almacén de los embeddings de las keywords para un modelo y backend"""
+        almacen = self._almacenes.get(identificador)
+        if almacen is None:
+            almacen = AlmacenEmbeddings(os.path.join(self.directorio, "embeddings", identificador), dtype=self.dtype)
+            self._almacenes[identificador] = almacen
+        return almacen
@@ -0,0 +1,405 @@
+"""
+Trazas y métricas del pipeline.
+
+- `medir("etapa", **atributos)` mide un tramo: tiempo real, CPU del proceso,
+  pico de memoria (RSS) y los atributos que se agreguen con `anotar`.
+- `contar("nombre", valor, **etiquetas)` suma a un contador (tokens,
+  reintentos, aciertos de caché...).
+- `trazar("documento")` agrupa los tramos y contadores de una ejecución; al
+  terminar se escribe como una línea JSON y se actualiza el archivo Prometheus.
+
+Todo se acumula además en `REGISTRO`, que se exporta en formato de texto de
+Prometheus a un archivo (`METRICAS_PROMETHEUS_ARCHIVO`) o por HTTP
+(`iniciar_servidor_metricas`). Con `INSTRUMENTACION_PERFIL_DIR` cada
+ejecución guarda además un perfil de cProfile.
+"""
+import cProfile
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuración global
+ARCHIVO_JSONL = os.getenv("INSTRUMENTACION_JSONL", "")
+ARCHIVO_PROMETHEUS = os.getenv("METRICAS_PROMETHEUS_ARCHIVO", "")
+PERFIL_DIR = os.getenv("INSTRUMENTACION_PERFIL_DIR", "")
+PREFIJO = "pdf"
+# Límites superiores (s) de los buckets del histograma de duración
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+def _etiquetas(etiquetas: dict) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _rss_pico_mb() -> float:
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- Registro global (Prometheus) --------------------------------------------
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas acumulados durante la vida del proceso, con
+    exportación al formato de texto de Prometheus.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._contadores: dict = defaultdict(float)
+        self._histogramas: dict = {}
+        self._medidores: dict = {}
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas) -> None:
+        with self._lock:
+            self._contadores[(nombre, _etiquetas(etiquetas))] += valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas) -> None:
+        with self._lock:
+            self._medidores[(nombre, _etiquetas(etiquetas))] = valor
+
+    def observar(self, nombre: str, valor: float, **etiquetas) -> None:
+        with self._lock:
+            clave = (nombre, _etiquetas(etiquetas))
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = {"buckets": [0] * len(self.buckets), "suma": 0.0, "cuenta": 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    h["buckets"][i] += 1
+            h["suma"] += valor
+            h["cuenta"] += 1
+
+    def texto_prometheus(self) -> str:
+        """Todas las métricas en el formato de exposición de texto de Prometheus"""
+        def fmt(etiquetas: Etiquetas, extra: Etiquetas = ()) -> str:
+            pares = etiquetas + extra
+            if not pares:
+                return ""
+            escapar = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+        with self._lock:
+            contadores = dict(self._contadores)
+            medidores = dict(self._medidores)
+            histogramas = {k: {**v, "buckets": list(v["buckets"])} for k, v in self._histogramas.items()}
+
+        lineas = []
+        for tipo, datos in (("counter", contadores), ("gauge", medidores)):
+            for nombre in sorted({n for n, _ in datos}):
+                sufijo = "_total" if tipo == "counter" else ""
+                lineas.append(f"# TYPE {PREFIJO}_{nombre}{sufijo} {tipo}")
+                for (n, etiquetas), valor in sorted(datos.items()):
+                    if n == nombre:
+                        lineas.append(f"{PREFIJO}_{nombre}{sufijo}{fmt(etiquetas)} {valor:g}")
+        for nombre in sorted({n for n, _ in histogramas}):
+            lineas.append(f"# TYPE {PREFIJO}_{nombre} histogram")
+            for (n, etiquetas), h in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                for limite, cuenta in zip(self.buckets, h["buckets"]):
+                    lineas.append(f"{PREFIJO}_{nombre}_bucket{fmt(etiquetas, (('le', f'{limite:g}'),))} {cuenta}")
+                lineas.append(f"{PREFIJO}_{nombre}_bucket{fmt(etiquetas, (('le', '+Inf'),))} {h['cuenta']}")
+                lineas.append(f"{PREFIJO}_{nombre}_sum{fmt(etiquetas)} {h['suma']:g}")
+                lineas.append(f"{PREFIJO}_{nombre}_count{fmt(etiquetas)} {h['cuenta']}")
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = RegistroMetricas()
+
+
+def escribir_prometheus(ruta: str = "") -> Optional[str]:
+    """
+    Escribe las métricas en `ruta` (o en METRICAS_PROMETHEUS_ARCHIVO) de forma
+    atómica, apto para el textfile collector de node_exporter. `{pid}` en la
+    ruta se reemplaza por el PID, para que cada proceso de un lote escriba
+    su propio archivo.
+    """
+    ruta = (ruta or ARCHIVO_PROMETHEUS).format(pid=os.getpid())
+    if not ruta:
+        return None
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(REGISTRO.texto_prometheus())
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def iniciar_servidor_metricas(puerto: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Sirve `GET /metrics` en un hilo de fondo"""
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            datos = REGISTRO.texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    logger.info(f"Métricas Prometheus en http://{host}:{puerto}/metrics")
+    return servidor
+
+
+# --- Trazas por ejecución -----------------------------------------------------
+
+@dataclass
+class Tramo:
+    """Medición de una etapa o llamada dentro de una traza"""
+    nombre: str
+    atributos: dict = field(default_factory=dict)
+    inicio: float = 0.0
+    duracion: float = 0.0
+    cpu: float = 0.0
+    rss_pico_mb: float = 0.0
+    incremento_pico_mb: float = 0.0
+    error: Optional[str] = None
+
+    def a_dict(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "inicio": self.inicio,
+            "duracion": round(self.duracion, 6),
+            "cpu": round(self.cpu, 6),
+            "rss_pico_mb": round(self.rss_pico_mb, 1),
+            "incremento_pico_mb": round(self.incremento_pico_mb, 1),
+            "error": self.error,
+            **self.atributos,
+        }
+
+
+class Traza:
+    """
+    Tramos y contadores de una ejecución (p. ej. un documento). Es segura
+    entre hilos y tareas asíncronas: todas escriben en el mismo objeto.
+    """
+
+    def __init__(self, nombre: str, **atributos):
+        self.id = uuid.uuid4().hex
+        self.nombre = nombre
+        self.atributos = atributos
+        self.inicio = time.time()
+        self.duracion = 0.0
+        self.tramos: list = []
+        self.contadores: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def agregar(self, tramo: Tramo) -> None:
+        with self._lock:
+            self.tramos.append(tramo)
+
+    def contar(self, nombre: str, valor: float, etiquetas: Etiquetas) -> None:
+        with self._lock:
+            self.contadores[(nombre, etiquetas)] += valor
+
+    def por_etapa(self) -> dict:
+        """Tramos agregados por nombre: cantidad, tiempo total, CPU y pico de memoria"""
+        resumen: dict = {}
+        with self._lock:
+            tramos = list(self.tramos)
+        for t in tramos:
+            r = resumen.setdefault(t.nombre, {"n": 0, "segundos": 0.0, "cpu": 0.0, "rss_pico_mb": 0.0, "errores": 0})
+            r["n"] += 1
+            r["segundos"] += t.duracion
+            r["cpu"] += t.cpu
+            r["rss_pico_mb"] = max(r["rss_pico_mb"], t.rss_pico_mb)
+            r["errores"] += t.error is not None
+        return resumen
+
+    def tasas_acierto(self) -> dict:
+        """Fracción de aciertos por caché y etapa, a partir de los contadores `cache`"""
+        totales: dict = defaultdict(lambda: [0.0, 0.0])
+        for (nombre, etiquetas), valor in self.contadores.items():
+            if nombre != "cache":
+                continue
+            e = dict(etiquetas)
+            clave = f"{e.get('cache', '')}:{e.get('etapa', '')}".rstrip(":")
+            totales[clave][1] += valor
+            if e.get("resultado") == "acierto":
+                totales[clave][0] += valor
+        return {clave: aciertos / total for clave, (aciertos, total) in totales.items() if total}
+
+    def a_dict(self) -> dict:
+        with self._lock:
+            tramos = [t.a_dict() for t in self.tramos]
+            contadores = [
+                {"nombre": nombre, **dict(etiquetas), "valor": valor}
+                for (nombre, etiquetas), valor in self.contadores.items()
+            ]
+        return {
+            "traza": self.id,
+            "nombre": self.nombre,
+            **self.atributos,
+            "inicio": self.inicio,
+            "duracion": round(self.duracion, 6),
+            "etapas": self.por_etapa(),
+            "aciertos_cache": self.tasas_acierto(),
+            "contadores": contadores,
+            "tramos": tramos,
+        }
+
+
+_traza_actual: ContextVar[Optional[Traza]] = ContextVar("traza_actual", default=None)
+_tramo_actual: ContextVar[Optional[Tramo]] = ContextVar("tramo_actual", default=None)
+
+
+def traza_actual() -> Optional[Traza]:
+    return _traza_actual.get()
+
+
+@contextmanager
+def medir(nombre: str, **atributos) -> Iterator[Tramo]:
+    """
+    Mide el bloque como un tramo de la traza actual y lo suma al histograma
+    `etapa_segundos`. El CPU es el del proceso completo durante el tramo, así
+    que en tramos que corren a la vez (tareas asíncronas) se solapa.
+    """
+    tramo = Tramo(nombre, dict(atributos), inicio=time.time())
+    token = _tramo_actual.set(tramo)
+    pico_inicial = _rss_pico_mb()
+    inicio, cpu_inicial = time.perf_counter(), time.process_time()
+    try:
+        yield tramo
+    except BaseException as e:
+        tramo.error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        tramo.duracion = time.perf_counter() - inicio
+        tramo.cpu = time.process_time() - cpu_inicial
+        tramo.rss_pico_mb = _rss_pico_mb()
+        tramo.incremento_pico_mb = tramo.rss_pico_mb - pico_inicial
+        _tramo_actual.reset(token)
+        REGISTRO.observar("etapa_segundos", tramo.duracion, etapa=nombre)
+        REGISTRO.incrementar("etapa_cpu_segundos", tramo.cpu, etapa=nombre)
+        if tramo.error:
+            REGISTRO.incrementar("etapa_errores", etapa=nombre)
+        traza = _traza_actual.get()
+        if traza is not None:
+            traza.agregar(tramo)
+        logger.debug(json.dumps(tramo.a_dict(), ensure_ascii=False))
+
+
+def acumular(nombre: str, segundos: float, **atributos) -> None:
+    """
+    Registra un tramo ya medido (p. ej. tiempos de una página medidos en otro
+    proceso). No mide CPU ni memoria.
+    """
+    tramo = Tramo(nombre, dict(atributos), inicio=time.time() - segundos, duracion=segundos)
+    REGISTRO.observar("etapa_segundos", segundos, etapa=nombre)
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.agregar(tramo)
+
+
+def anotar(**atributos) -> None:
+    """Agrega atributos al tramo en curso (tamaños, tokens, modelo...)"""
+    tramo = _tramo_actual.get()
+    if tramo is not None:
+        tramo.atributos.update(atributos)
+
+
+def contar(nombre: str, valor: float = 1, **etiquetas) -> None:
+    """Suma `valor` al contador `nombre` con esas etiquetas (global y de la traza actual)"""
+    REGISTRO.incrementar(nombre, valor, **etiquetas)
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.contar(nombre, valor, _etiquetas(etiquetas))
+
+
+_perfil_activo = threading.Lock()
+
+
+@contextmanager
+def perfil(nombre: str, directorio: str = "") -> Iterator[None]:
+    """
+    Perfil de cProfile del bloque, guardado en `directorio/nombre-<fecha>.prof`
+    si hay directorio configurado. Solo un perfil a la vez por proceso.
+    """
+    directorio = directorio or PERFIL_DIR
+    if not directorio or not _perfil_activo.acquire(blocking=False):
+        yield
+        return
+    perfilador = cProfile.Profile()
+    try:
+        perfilador.enable()
+        try:
+            yield
+        finally:
+            perfilador.disable()
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f"{nombre}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        perfilador.dump_stats(ruta)
+        logger.info(f"Perfil guardado en {ruta}")
+    finally:
+        _perfil_activo.release()
+
+
+@contextmanager
+def trazar(nombre: str, **atributos) -> Iterator[Traza]:
+    """
+    Traza de una ejecución. Al salir se registra como log JSON (y en
+    INSTRUMENTACION_JSONL si está configurado) y se actualiza el archivo Prometheus.
+    """
+    traza = Traza(nombre, **atributos)
+    token = _traza_actual.set(traza)
+    inicio = time.perf_counter()
+    try:
+        with perfil(f"{nombre}-{traza.id[:8]}"):
+            yield traza
+    finally:
+        traza.duracion = time.perf_counter() - inicio
+        _traza_actual.reset(token)
+        REGISTRO.observar("ejecucion_segundos", traza.duracion, tipo=nombre)
+        REGISTRO.fijar("memoria_pico_bytes", _rss_pico_mb() * 1024 * 1024)
+        datos = traza.a_dict()
+        logger.info(f"Traza '{nombre}' completada en {traza.duracion:.2f}s", extra={"datos": datos})
+        if ARCHIVO_JSONL:
+            with open(ARCHIVO_JSONL, "a", encoding="utf-8") as f:
+                f.write(json.dumps(datos, ensure_ascii=False) + "\n")
+        try:
+            escribir_prometheus()
+        except OSError as e:
+            logger.warning(f"No se pudo escribir el archivo de métricas: {e}")
+
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro de log como una línea JSON (incluye `datos` si lo trae)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        registro = {
+            "fecha": self.formatTime(record),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if hasattr(record, "datos"):
+            registro["datos"] = record.datos
+        if record.exc_info:
+            registro["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str)
@@ -1,5 +1,77 @@
 import re
 import unicodedata
+from functools import lru_cache
+from typing import Iterable, List
+
+import numpy as np
+
+# Patrones compilados una sola vez
+_RE_HTML = re.compile(r'<[^>]+>')
+_RE_SALTOS = re.compile(r'\n[ \t]*\n[ \t\n]*')
+_RE_PUNTUACION = re.compile(r"[^\w\s]")
+# Caracteres ASCII que _RE_PUNTUACION elimina: en texto ASCII basta con translate
+_PUNTUACION_ASCII = {i: None for i in range(128) if _RE_PUNTUACION.match(chr(i))}
+_CARACTERES_PUNTUACION_ASCII = [chr(i) for i in _PUNTUACION_ASCII]
+# A partir de este tamaño los caracteres distintos se buscan con NumPy
+_TAMANO_VECTORIZADO = 1 << 14
+# Con más caracteres distintos a reemplazar conviene la normalización del texto completo
+_MAX_REEMPLAZOS = 64
+
+
+def _distintos_no_ascii(text: str) -> List[str]:
+    """Caracteres no ASCII distintos del texto"""
+    if len(text) < _TAMANO_VECTORIZADO:
+        return [c for c in set(text) if c > '\x7f']
+    codigos = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    return [chr(c) for c in np.unique(codigos[codigos > 0x7f])]
+
+
+@lru_cache(maxsize=None)
+def _sin_diacriticos(c: str) -> str:
+    # NFKD de un carácter sin sus combinantes. NFKD descompone carácter a
+    # carácter y solo reordena combinantes, así que aplicarlo por carácter
+    # y quitar los combinantes da lo mismo que hacerlo sobre el texto completo
+    return ''.join(x for x in unicodedata.normalize('NFKD', c) if not unicodedata.combining(x))
+
+
+@lru_cache(maxsize=None)
+def _es_puntuacion(c: str) -> bool:
+    return _RE_PUNTUACION.match(c) is not None
+
+
+def _quitar_diacriticos(text: str) -> str:
+    # Solo se reemplazan los caracteres distintos que cambian (á → a, ﬁ → fi...)
+    cambios = []
+    for c in _distintos_no_ascii(text):
+        sustituto = _sin_diacriticos(c)
+        if sustituto != c:
+            cambios.append((c, sustituto))
+            if len(cambios) > _MAX_REEMPLAZOS:
+                # Muchos caracteres distintos (p. ej. hangul): un solo recorrido
+                text = unicodedata.normalize('NFKD', text)
+                return ''.join(c for c in text if not unicodedata.combining(c))
+    for c, sustituto in cambios:
+        text = text.replace(c, sustituto)
+    return text
+
+
+def _quitar_puntuacion(text: str) -> str:
+    if text.isascii():
+        return text.translate(_PUNTUACION_ASCII)
+    if len(text) < _TAMANO_VECTORIZADO:
+        return _RE_PUNTUACION.sub("", text)
+    # Texto grande: se borra cada signo distinto presente, sin evaluar la
+    # expresión regular carácter a carácter
+    for c in _distintos_no_ascii(text):
+        if _es_puntuacion(c):
+            text = text.replace(c, "")
+    if text.isascii():
+        return text.translate(_PUNTUACION_ASCII)
+    for c in _CARACTERES_PUNTUACION_ASCII:
+        if c in text:
+            text = text.replace(c, "")
+    return text
+
 
 def clean_text(
     text: str,
@@ -14,19 +86,25 @@ def clean_text(
     - Convierte a minúsculas.
     - Elimina puntuación.
     """
+    # Cada paso se omite cuando no puede cambiar el texto (sin '<', sin saltos,
+    # texto ASCII...); el resultado es idéntico al de aplicarlos todos
+
     # 1. Quitar etiquetas HTML
-    text = re.sub(r'<[^>]+>', ' ', text)
+    if '<' in text:
+        text = _RE_HTML.sub(' ', text)
 
-    # 2. Normalización Unicode (é → e, ñ → n, etc.)
-    text = unicodedata.normalize('NFKD', text)
-    text = ''.join(c for c in text if not unicodedata.combining(c))
+    # 2. Normalización Unicode (é → e, ñ → n, etc.). El texto ASCII no cambia
+    if not text.isascii():
+        text = _quitar_diacriticos(text)
 
     # 3. Reducir saltos de línea excesivos y líneas en blanco con espacios
     #    - Colapsar múltiples saltos de línea (incluyendo espacios) a uno
-    text = re.sub(r'\n[ \t]*\n[ \t\n]*', '\n', text)
+    if '\n' in text:
+        text = _RE_SALTOS.sub('\n', text)
 
-    # 4. Reducir espacios múltiples
-    text = re.sub(r"[ ]{2,}", " ", text)
+    # 4. Reducir espacios múltiples (cada pasada reduce a la mitad cada tramo de espacios)
+    while '  ' in text:
+        text = text.replace('  ', ' ')
 
     # 5. Pasar a minúsculas
     if lowercase:
@@ -34,10 +112,32 @@ def clean_text(
 
     # 6. Eliminar puntuación (dejando solo letras y espacios)
     if remove_punctuation:
-        text = re.sub(r"[^\w\s]", "", text)
+        text = _quitar_puntuacion(text)
 
     # 7. Recortar espacios en los extremos de cada línea y del texto completo
-    lines = [line.strip() for line in text.splitlines()]
-    text = "\n".join(lines)
-    
+    lines = text.splitlines()
+    if len(lines) <= 1:
+        return lines[0].strip() if lines else ""
+    text = "\n".join([line.strip() for line in lines])
+
     return text.strip()
+
+
+def clean_texts(
+    texts: Iterable[str],
+    lowercase: bool = True,
+    remove_punctuation: bool = True
+) -> List[str]:
+    """
+    Limpia muchos textos (celdas de tablas, páginas) en una sola llamada.
+    Los textos repetidos, muy comunes en tablas, se limpian una sola vez.
+    Devuelve una lista en el mismo orden, igual a aplicar `clean_text` a cada uno.
+    """
+    limpios: dict = {}
+    resultado = []
+    for text in texts:
+        limpio = limpios.get(text)
+        if limpio is None:
+            limpio = limpios[text] = clean_text(text, lowercase, remove_punctuation)
+        resultado.append(limpio)
+    return resultado
@@ -1,73 +1,176 @@
+import argparse
+import logging
+import os
+import threading
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 from difflib import SequenceMatcher
-from sentence_transformers import SentenceTransformer
-import nltk
-from nltk.corpus import stopwords
-import joblib # libreria para almacenar embeddings en disco
-import os
-import hashlib # Para crear identificadores unicos de texto
-from functools import lru_cache
-nltk.download('stopwords')
+from typing import Iterable, Optional
+from almacen_embeddings import CACHE_DIR, AlmacenEmbeddings
+from backend_embeddings import MODO_OFFLINE, BackendEmbeddings, crear_backend
+from indice_keywords import INDICE_DIR, IndiceKeywords
+from instrumentacion import medir
+from servicio_embeddings import ServicioEmbeddings
+
+logger = logging.getLogger(__name__)
 
 # Configuración global
-CACHE_DIR = "embedding_cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# El modelo, las stopwords y el almacén se cargan al primer uso (o en
+# `calentar`), no al importar: importar este módulo no hace E/S ni red.
+# Sin red (PDF_OFFLINE) nunca se descargan stopwords ni modelos.
+_lock_carga = threading.Lock()
+_backend: Optional[BackendEmbeddings] = None
+_stopwords = None
+_almacen = None
+_servicio = None
+_indice_keywords = None
+
+def obtener_backend() -> BackendEmbeddings:
+    """
+    Backend que calcula los embeddings (ver `backend_embeddings`: PyTorch u
+    ONNX Runtime, cuantizado o no, hilos y tamaño de lote); el modelo se
+    carga al primer uso
+    """
+    global _backend
+    if _backend is None:
+        with _lock_carga:
+            if _backend is None:
+                _backend = crear_backend(MODEL_NAME)
+    return _backend
+
+def obtener_modelo():
+    """Modelo ligero para embeddings (se carga una sola vez, seguro entre hilos)"""
+    # para transformar textos en un vectores que representan la semantica
+    return obtener_backend().sentence_transformer()
+
+def obtener_stopwords() -> list[str]:
+    """Stopwords en español; solo se descargan si faltan y no estamos offline"""
+    global _stopwords
+    if _stopwords is None:
+        with _lock_carga:
+            if _stopwords is None:
+                from nltk.corpus import stopwords
+                try:
+                    _stopwords = stopwords.words('spanish')
+                except LookupError:
+                    if MODO_OFFLINE:
+                        logger.warning("Stopwords de NLTK no disponibles en modo offline; se usará una lista vacía")
+                        _stopwords = []
+                    else:
+                        import nltk
+                        nltk.download('stopwords', quiet=True)
+                        _stopwords = stopwords.words('spanish')
+    return _stopwords
 
-# Descargar stopwords solo si es necesario
-try:
-    stopwords.words('spanish')
-except LookupError:
-    nltk.download('stopwords')
+def obtener_almacen() -> AlmacenEmbeddings:
+    """
+    Almacén de embeddings en disco (un único archivo) para evitar recálculos;
+    uno por modelo y backend, porque sus vectores no son intercambiables
+    """
+    global _almacen
+    backend = obtener_backend()
+    if _almacen is None:
+        with _lock_carga:
+            if _almacen is None:
+                _almacen = AlmacenEmbeddings(os.path.join(CACHE_DIR, backend.identificador))
+    return _almacen
+
+def _codificar_con_modelo(textos: list[str]) -> np.ndarray:
+    return obtener_backend().codificar(textos)
 
-# Modelo ligero para embeddings
-MODEL = SentenceTransformer('all-MiniLM-L6-v2') 
-# para transformar textos en un vectores que representan la semantica
+def obtener_servicio() -> ServicioEmbeddings:
+    """
+    Hilo único que agrupa en lotes los pedidos de embeddings de todas las
+    sesiones y trabajos del proceso (ver `servicio_embeddings`)
+    """
+    global _servicio
+    if _servicio is None:
+        with _lock_carga:
+            if _servicio is None:
+                _servicio = ServicioEmbeddings(_codificar_con_modelo)
+    return _servicio
+
+def obtener_indice_keywords() -> IndiceKeywords:
+    """
+    Índice IDF de todos los documentos procesados, con los embeddings de las
+    keywords guardados a su lado (ver `indice_keywords`)
+    """
+    global _indice_keywords
+    stopwords = obtener_stopwords()
+    if _indice_keywords is None:
+        with _lock_carga:
+            if _indice_keywords is None:
+                _indice_keywords = IndiceKeywords(INDICE_DIR, stopwords)
+    return _indice_keywords
+
+def configurar_embeddings(backend: Optional[BackendEmbeddings] = None,
+                          almacen: Optional[AlmacenEmbeddings] = None,
+                          indice_keywords: Optional[IndiceKeywords] = None) -> None:
+    """
+    Reemplaza el backend, el almacén de embeddings y el índice de keywords
+    del proceso (None = los de la configuración, creados al próximo uso) y
+    detiene el servicio actual
+    """
+    global _backend, _almacen, _servicio, _indice_keywords
+    with _lock_carga:
+        servicio = _servicio
+        _backend, _almacen, _servicio, _indice_keywords = backend, almacen, None, indice_keywords
+    if servicio is not None:
+        servicio.detener()
+
+def __getattr__(nombre: str):
+    # Compatibilidad: `metricas.MODEL` sigue funcionando, pero carga al usarse
+    if nombre == "MODEL":
+        return obtener_modelo()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+def calentar() -> None:
+    """
+    Precarga modelo, stopwords y almacén y ejecuta una codificación de prueba,
+    para que la primera petición real no pague la inicialización.
+    """
+    obtener_stopwords()
+    obtener_almacen()
+    obtener_indice_keywords()
+    obtener_servicio().codificar(["calentamiento"])
+
+def _similitud_coseno(a: np.ndarray, b: np.ndarray | None = None) -> np.ndarray:
+    # Los embeddings ya llegan normalizados (backend y almacén): el coseno es el producto escalar
+    b = a if b is None else b
+    return a @ b.T
 
-# Cache de embeddings para evitar recálculos
 def get_embedding(text: str) -> np.ndarray:
     """Obtiene embedding con caché persistente"""
-    hash_key = hashlib.md5(text.encode()).hexdigest()
-    cache_path = os.path.join(CACHE_DIR, f"{hash_key}.pkl")
-    
-    if os.path.exists(cache_path):
-        return joblib.load(cache_path)
-    
-    embedding = MODEL.encode(text, convert_to_numpy=True)
-    joblib.dump(embedding, cache_path)
-    return embedding
-    #Crea un ID para cada texto con md5
-    #Si calcaulamos el embeddin, lo carga del disco
-    #Si no, lo calcula para usos futuros
+    return get_embeddings_batch([text])[0]
 
-    #Es lo mismo pero procesa para varios textos a la vez
+def _embeddings(texts: list[str], almacen: AlmacenEmbeddings) -> np.ndarray:
+    # Una sola búsqueda en el almacén; los textos sin caché se calculan
+    # juntos, en el lote compartido del servicio, y el resultado conserva
+    # el orden de `texts`
+    def codificar(pendientes: list[str]) -> np.ndarray:
+        with medir("embeddings_modelo", textos=len(pendientes)):
+            return obtener_servicio().codificar(pendientes)
+
+    with medir("embeddings", textos=len(texts)):
+        return almacen.obtener_o_calcular(list(texts), codificar)
 
 def get_embeddings_batch(texts: list[str]) -> np.ndarray:
     """Procesa embeddings por lotes con caché"""
-    embeddings = []
-    texts_to_process = []
-    cache_paths = []
-    
-    for text in texts:
-        hash_key = hashlib.md5(text.encode()).hexdigest()
-        cache_path = os.path.join(CACHE_DIR, f"{hash_key}.pkl")
-        cache_paths.append(cache_path)
-        
-        if os.path.exists(cache_path):
-            embeddings.append(joblib.load(cache_path))
-        else:
-            texts_to_process.append(text)
-    
-    # Procesar solo los textos sin caché
-    if texts_to_process:
-        new_embeddings = MODEL.encode(texts_to_process, convert_to_numpy=True)
-        for text, emb, path in zip(texts_to_process, new_embeddings, 
-                                  [p for p in cache_paths if not os.path.exists(p)]):
-            joblib.dump(emb, path)
-            embeddings.append(emb)
-    
-    return np.array(embeddings)
+    return _embeddings(texts, obtener_almacen())
+
+def get_embeddings_efimeros(texts: list[str]) -> np.ndarray:
+    """
+    Embeddings de textos que no se vuelven a consultar (p. ej. candidatos
+    que pueden descartarse): se calculan en el lote compartido del servicio
+    pero no se guardan en el almacén
+    """
+    with medir("embeddings_modelo", textos=len(texts), almacen=False):
+        return obtener_servicio().codificar(list(texts))
+
+def get_embeddings_keywords(keywords: list[str]) -> np.ndarray:
+    """Embeddings de keywords, del almacén que está junto al índice de keywords"""
+    return _embeddings(keywords, obtener_indice_keywords().embeddings(obtener_backend().identificador))
 
 
 # 1. Relevancia semántica promedio optimizada. Cuan relacionada estan las preguntas del texto limpio. 
@@ -89,7 +192,7 @@ def semantic_relevance_score(text: str, questions: list[str]) -> float:
     
     # Calcular similitudes vectorizadas y promediamos
 
-    sims = cosine_similarity(emb_qs, emb_text).flatten()
+    sims = _similitud_coseno(emb_qs, emb_text).flatten()
     return float(np.mean(sims))
 
 # 2. Índice de calidad de distractores optimizado. Cuan buenas son las opciones.
@@ -107,21 +210,31 @@ def distractor_quality_index(correct: str, distractors: list[str]) -> float:
     emb_d = get_embeddings_batch(valid_distractors)
     
     # Calcular similitudes vectorizadas
-    sims = cosine_similarity(emb_corr, emb_d).flatten()
+    sims = _similitud_coseno(emb_corr, emb_d).flatten()
     return float(1 - np.mean(sims))
 
 
 # 3. Cobertura de conceptos optimizada
-@lru_cache(maxsize=32)
 def get_keywords(text: str, top_k: int = 20) -> list[str]:
-    """Extrae keywords con caché"""
-    spanish_sw = stopwords.words('spanish')
-    vec = TfidfVectorizer(max_features=top_k, stop_words=spanish_sw)
-    try:
-        vec.fit([text])
-        return vec.get_feature_names_out().tolist()
-    except:
-        return []
+    """
+    Términos de mayor tf-idf del texto, con el IDF de todos los documentos
+    procesados; no modifica el índice
+    """
+    return obtener_indice_keywords().keywords(text, top_k)
+
+def registrar_documento(paginas: Iterable[str], clave: str) -> bool:
+    """
+    Agrega un documento (su texto limpio, por páginas) al índice IDF de las
+    keywords; `clave` evita contarlo dos veces
+    """
+    return obtener_indice_keywords().registrar(paginas, clave)
+
+def documentos_keywords() -> int:
+    """
+    Documentos registrados en el índice IDF: identifica el estado del corpus
+    con el que se calculan las keywords
+    """
+    return obtener_indice_keywords().documentos()
     
 # Procentaje de conceptos clave que aparecen en las preguntas
 
@@ -134,19 +247,19 @@ def concept_coverage_semantic(text: str | list[str], questions: list[str],
     if not text.strip() or not questions:
         return 0.0
 
-    # Obtener keywords con caché
+    # Keywords del índice IDF
     keywords = get_keywords(text, top_k)
     if not keywords:
         return 0.0
 
-    # Embeddings de keywords y preguntas
-    kw_emb = get_embeddings_batch(keywords)
+    # Embeddings de keywords (guardados junto al índice) y preguntas
+    kw_emb = get_embeddings_keywords(keywords)
     q_emb = get_embeddings_batch(questions)
     
     # para cada kw, verifica si hay preguntas similares
     
     # Calcular cobertura vectorizada
-    sim_matrix = cosine_similarity(kw_emb, q_emb)
+    sim_matrix = _similitud_coseno(kw_emb, q_emb)
 
     # Calculamos porcentaje
     covered = np.any(sim_matrix >= threshold, axis=1).sum()
@@ -162,11 +275,151 @@ def question_diversity(questions: list[str]) -> float:
     emb_qs = get_embeddings_batch(questions)
     
     # Calcular matriz de similitud completa
-    sim_matrix = cosine_similarity(emb_qs)
+    sim_matrix = _similitud_coseno(emb_qs)
     
     # Obtener solo el triángulo superior sin la diagonal
     n = sim_matrix.shape[0]
     triu_indices = np.triu_indices(n, k=1)
     diversities = 1 - sim_matrix[triu_indices]
     
-    return float(np.mean(diversities))
\ No newline at end of file
+    return float(np.mean(diversities))
+
+# 5. Motor de evaluación unificado. Calcula las cuatro métricas con una sola
+# pasada de embeddings: todos los textos (fuente, preguntas, opciones y respuestas
+# correctas) se deduplican y se codifican en un único lote. Las keywords salen
+# del índice IDF con sus embeddings ya guardados.
+def evaluar_preguntas(text: str, questions: list[dict], ideas: str | list[str],
+                      top_k: int = 25, threshold: float = 0.4) -> dict:
+    """
+    Equivalente a llamar a semantic_relevance_score, distractor_quality_index
+    (promediado por pregunta), concept_coverage_semantic y question_diversity,
+    pero con un único lote de embeddings y operaciones vectorizadas.
+    Devuelve dict con 'relevancia', 'distractores', 'cobertura' y 'diversidad'.
+    """
+    preguntas = [q['question'] for q in questions]
+    texto_ideas = " ".join(ideas) if isinstance(ideas, list) else ideas
+
+    # Pares (correcta, distractores) de las preguntas con distractores válidos
+    pares = []
+    for q in questions:
+        correct = q.get('correct_answer', '')
+        distractors = [d for d in q.get('options', []) if d != correct]
+        if distractors:
+            pares.append((correct, distractors))
+
+    with medir("metrica_keywords"):
+        keywords = get_keywords(texto_ideas, top_k) if texto_ideas.strip() and preguntas else []
+
+    # Índice de cada texto distinto dentro del lote
+    indice: dict[str, int] = {}
+    def idx(t: str) -> int:
+        return indice.setdefault(t, len(indice))
+
+    i_texto = idx(text) if text.strip() else None
+    i_preguntas = np.array([idx(p) for p in preguntas], dtype=np.int64)
+    i_correctas = np.array([idx(c) for c, _ in pares], dtype=np.int64)
+    max_d = max((len(d) for _, d in pares), default=0)
+    i_distractores = np.zeros((len(pares), max_d), dtype=np.int64)
+    mascara = np.zeros((len(pares), max_d), dtype=bool)
+    for fila, (_, distractors) in enumerate(pares):
+        i_distractores[fila, :len(distractors)] = [idx(d) for d in distractors]
+        mascara[fila, :len(distractors)] = True
+
+    resultado = {"relevancia": 0.0, "distractores": 0.0, "cobertura": 0.0, "diversidad": 0.0}
+    if not indice:
+        return resultado
+    emb = get_embeddings_batch(list(indice))
+    q_emb = emb[i_preguntas]
+
+    # Relevancia: similitud media pregunta–texto
+    if i_texto is not None and len(preguntas):
+        with medir("metrica_relevancia"):
+            resultado["relevancia"] = float(np.mean(q_emb @ emb[i_texto]))
+
+    # Distractores: todas las preguntas en una operación (filas con relleno enmascarado)
+    if pares:
+        with medir("metrica_distractores"):
+            sims = np.einsum("pdk,pk->pd", emb[i_distractores], emb[i_correctas])
+            medias = (sims * mascara).sum(axis=1) / mascara.sum(axis=1)
+            resultado["distractores"] = float(np.mean(1 - medias))
+
+    # Cobertura: % de keywords con alguna pregunta similar
+    if len(keywords):
+        with medir("metrica_cobertura"):
+            sim_matrix = get_embeddings_keywords(keywords) @ q_emb.T
+            covered = np.any(sim_matrix >= threshold, axis=1).sum()
+            resultado["cobertura"] = float(covered / len(keywords) * 100)
+
+    # Diversidad: 1 - similitud media entre pares de preguntas
+    if len(preguntas) >= 2:
+        with medir("metrica_diversidad"):
+            sim_matrix = q_emb @ q_emb.T
+            resultado["diversidad"] = float(np.mean(1 - sim_matrix[np.triu_indices(len(preguntas), k=1)]))
+
+    return resultado
+
+
+# 6. Agrupación de textos casi duplicados (ideas o preguntas repetidas con
+# otras palabras). Se compara por similitud de embeddings, no por igualdad exacta.
+def agrupar_similares(textos: list[str], umbral: float = 0.85) -> list[list[int]]:
+    """
+    Agrupa los índices de `textos` cuya similitud coseno con el primer texto
+    del grupo es >= `umbral`. Los grupos y sus miembros conservan el orden de
+    aparición; el primer índice de cada grupo es su representante.
+    """
+    if not textos:
+        return []
+    sim_matrix = _similitud_coseno(get_embeddings_batch(textos))
+    grupos: list[list[int]] = []
+    representantes: list[int] = []
+    for i in range(len(textos)):
+        if representantes:
+            sims = sim_matrix[i, representantes]
+            mejor = int(np.argmax(sims))
+            if sims[mejor] >= umbral:
+                grupos[mejor].append(i)
+                continue
+        representantes.append(i)
+        grupos.append([i])
+    return grupos
+
+
+class FiltroDuplicados:
+    """
+    Versión incremental de `agrupar_similares` para textos que llegan de a
+    uno o por tandas (p. ej. preguntas de varias llamadas en paralelo): un
+    texto se acepta si su similitud coseno con todos los ya aceptados es
+    menor que `umbral`. Los embeddings no se guardan en el almacén.
+    No es seguro usarlo desde varios hilos a la vez.
+    """
+
+    def __init__(self, umbral: float = 0.85):
+        self.umbral = umbral
+        self._aceptados = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._aceptados)
+
+    def filtrar(self, textos: list[str]) -> list[bool]:
+        """Devuelve, para cada texto, si es nuevo; los nuevos quedan aceptados"""
+        if not textos:
+            return []
+        nuevos = np.asarray(get_embeddings_efimeros(textos), dtype=np.float32)
+        if not len(self._aceptados):
+            self._aceptados = np.empty((0, nuevos.shape[1]), dtype=np.float32)
+        resultado = []
+        for emb in nuevos:
+            es_nuevo = not len(self._aceptados) or float(np.max(self._aceptados @ emb)) < self.umbral
+            if es_nuevo:
+                self._aceptados = np.vstack([self._aceptados, emb])
+            resultado.append(es_nuevo)
+        return resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Utilidades del módulo de métricas")
+    parser.add_argument("--calentar", action="store_true",
+                        help="Descarga (si hay red) y precarga modelo y stopwords")
+    args = parser.parse_args()
+    if args.calentar:
+        calentar()
+        print(f"Modelo '{MODEL_NAME}' y stopwords listos")
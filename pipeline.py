@@ -0,0 +1,630 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator, List, Optional, Sequence
+
+from cache_etapas import CacheEtapas, hash_contenido, version_codigo
+from clientes_llm import SesionLLM
+from deepseek_client import MODEL_NAME as MODELO_DEEPSEEK, PREGUNTAS_POR_LOTE, generar_preguntas_async, system_prompt
+from documento_pdf import (BLOQUE_BYTES, FILTRO_TABLAS, MEMORIA_BAJA, FuentePDF, PaginaPDF, contar_paginas,
+                           huellas_paginas, volcar_a_disco)
+from extraccion_paralela import WORKERS_POR_DEFECTO, iterar_paginas
+from extraer_tabla import tablas_de_pagina
+from fragmentacion import MAX_TOKENS_FRAGMENTO, estimar_tokens
+from gemini_client import MODEL_NAME as MODELO_GEMINI, NUM_IDEAS, PROMPT_IDEAS, extraer_ideas_async
+from gemini_client_analyser import PROMPT_RESUMEN_TABLAS, call_gemini_analyzer_async
+from instrumentacion import acumular, anotar, contar, medir, trazar
+from limpieza_texto import clean_text
+from metricas import documentos_keywords, evaluar_preguntas, registrar_documento
+from tabla_estructurada import (MAX_TOKENS_TABLAS, TABLAS_POR_LOTE, TablaEstructurada, agrupar_tablas,
+                                resumen_para_prompt)
+from texto_en_disco import TextoEnDisco
+from versiones import InformeReutilizacion
+
+
+@dataclass
+class PaginaProcesada:
+    """
+    Resultado de extraer, limpiar y buscar tablas en una página.
+    """
+    numero: int
+    total: int
+    texto_limpio: str
+    tablas_csv: str
+    tablas_omitidas: bool = False
+    # Tablas de la página con encabezado y columnas tipadas
+    tablas: List[TablaEstructurada] = field(default_factory=list)
+    # Segundos de cada paso sobre la página: texto, tablas, limpieza y csv
+    tiempos: dict = field(default_factory=dict, compare=False, repr=False)
+    # True si la página se tomó de la caché por su huella, sin extraerla
+    reutilizada: bool = field(default=False, compare=False)
+
+    def a_dict(self) -> dict:
+        """Contenido de la página sin su posición, para la caché por huella"""
+        return {
+            "texto_limpio": self.texto_limpio,
+            "tablas_csv": self.tablas_csv,
+            "tablas_omitidas": self.tablas_omitidas,
+            "tablas": [tabla.a_dict() for tabla in self.tablas],
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: dict, numero: int, total: int) -> "PaginaProcesada":
+        tablas = [TablaEstructurada.desde_dict(t) for t in datos["tablas"]]
+        # La página pudo cambiar de posición respecto del documento original
+        for tabla in tablas:
+            tabla.pagina = numero
+        return cls(
+            numero=numero,
+            total=total,
+            texto_limpio=datos["texto_limpio"],
+            tablas_csv=datos["tablas_csv"],
+            tablas_omitidas=datos["tablas_omitidas"],
+            tablas=tablas,
+            reutilizada=True,
+        )
+
+
+def procesar_pagina(pagina: PaginaPDF, total: int) -> PaginaProcesada:
+    inicio = time.perf_counter()
+    texto_limpio = clean_text(pagina.texto)
+    medio = time.perf_counter()
+    tablas = tablas_de_pagina(pagina)
+    tablas_csv = "".join(tabla.a_csv() for tabla in tablas)
+    tiempos = {**pagina.tiempos, "limpieza": medio - inicio, "csv": time.perf_counter() - medio}
+    return PaginaProcesada(
+        numero=pagina.numero,
+        total=total,
+        texto_limpio=texto_limpio,
+        tablas_csv=tablas_csv,
+        tablas_omitidas=pagina.tablas_omitidas,
+        tablas=tablas,
+        tiempos=tiempos,
+    )
+
+
+def procesar_paginas(fuente: FuentePDF, workers: Optional[int] = None,
+                     filtro_tablas: Optional[int] = None,
+                     indices: Optional[Sequence[int]] = None,
+                     memoria_baja: bool = False,
+                     num_paginas: Optional[int] = None) -> Iterator[PaginaProcesada]:
+    """
+    Extracción → limpieza → detección de tablas como generador: devuelve cada
+    página procesada en cuanto está lista, sin esperar al documento completo.
+    Con `indices` (base 0) solo se procesan esas páginas. Si ya se conoce
+    `num_paginas` no se abre el PDF solo para contarlas.
+    """
+    total = contar_paginas(fuente, memoria_baja) if num_paginas is None else num_paginas
+    for pagina in iterar_paginas(fuente, workers, filtro_tablas=filtro_tablas, indices=indices,
+                                 memoria_baja=memoria_baja, num_paginas=total):
+        yield procesar_pagina(pagina, total)
+
+
+def procesar_paginas_incremental(fuente: FuentePDF, huellas: List[str], cache: CacheEtapas,
+                                 workers: Optional[int] = None,
+                                 filtro_tablas: Optional[int] = None,
+                                 memoria_baja: bool = False) -> Iterator[PaginaProcesada]:
+    """
+    Como `procesar_paginas`, pero las páginas cuya huella ya está en la caché
+    (de este documento o de cualquier otro, p. ej. una versión anterior) se
+    reutilizan: solo se extraen y limpian las páginas nuevas o modificadas.
+    """
+    filtro_tablas = FILTRO_TABLAS if filtro_tablas is None else filtro_tablas
+    total = len(huellas)
+    claves = [
+        cache.clave(huella, "pagina", version=VERSION_EXTRACCION, entrada=str(filtro_tablas))
+        for huella in huellas
+    ]
+    guardadas = {}
+    for i, clave in enumerate(claves):
+        encontrado, valor = cache.obtener(clave)
+        contar("cache", cache="etapas", etapa="pagina", resultado="acierto" if encontrado else "fallo")
+        if encontrado:
+            guardadas[i] = valor
+    faltantes = [i for i in range(total) if i not in guardadas]
+    # El total sale de las huellas: el PDF solo se vuelve a abrir para extraer
+    nuevas = (procesar_paginas(fuente, workers, filtro_tablas, faltantes, memoria_baja, num_paginas=total)
+              if faltantes else iter(()))
+    # Las páginas extraídas llegan en orden y se intercalan con las guardadas
+    for i in range(total):
+        if i in guardadas:
+            yield PaginaProcesada.desde_dict(guardadas.pop(i), i + 1, total)
+            continue
+        pagina = next(nuevas)
+        cache.guardar(claves[i], "pagina", pagina.a_dict())
+        yield pagina
+
+
+class AcumuladorPaginas:
+    """
+    Junta las piezas de cada página a medida que llegan del generador y solo
+    guarda el texto limpio, el CSV y las tablas estructuradas, no las páginas crudas.
+    Con `en_disco` el texto limpio se escribe a un archivo temporal a medida
+    que llega (ver `TextoEnDisco`) en vez de conservarse en memoria.
+    """
+
+    def __init__(self, en_disco: bool = False):
+        self._textos: Sequence[str] = TextoEnDisco() if en_disco else []
+        self._tablas: List[str] = []
+        self.tablas: List[TablaEstructurada] = []
+        self.paginas = 0
+        # Páginas que el filtro previo descartó sin buscar tablas
+        self.paginas_tablas_omitidas: List[int] = []
+
+    def agregar(self, pagina: PaginaProcesada) -> None:
+        self.paginas += 1
+        if pagina.tablas_omitidas:
+            self.paginas_tablas_omitidas.append(pagina.numero)
+        if pagina.texto_limpio:
+            self._textos.append(pagina.texto_limpio)
+        if pagina.tablas_csv:
+            self._tablas.append(pagina.tablas_csv)
+        self.tablas.extend(pagina.tablas)
+
+    @property
+    def paginas_limpias(self) -> Sequence[str]:
+        """Texto limpio de cada página no vacía, en orden"""
+        return self._textos if isinstance(self._textos, TextoEnDisco) else list(self._textos)
+
+    @property
+    def texto_limpio(self) -> str:
+        return "\n".join(self._textos)
+
+    @property
+    def tablas_csv(self) -> str:
+        return "".join(self._tablas)
+
+    def ultimo_texto(self, max_caracteres: int = 3000) -> str:
+        """
+        Final del texto limpio acumulado, para mostrar avances parciales.
+        """
+        fragmento = []
+        largo = 0
+        for texto in reversed(self._textos):
+            fragmento.append(texto)
+            largo += len(texto)
+            if largo >= max_caracteres:
+                break
+        return "\n".join(reversed(fragmento))[-max_caracteres:]
+
+
+# --- Pipeline completo de un documento ---------------------------------------
+
+# Caracteres del texto que recibe la métrica de relevancia con memoria_baja:
+# el modelo de embeddings trunca su entrada a 256 tokens (unos 1500
+# caracteres), así que el resultado es el mismo que con el texto completo
+CARACTERES_RELEVANCIA = 20_000
+
+# Versión del código de la extracción: si cambia, sus resultados en caché se recalculan
+VERSION_EXTRACCION = version_codigo(
+    "documento_pdf", "extraccion_paralela", "extraer_tabla", "limpieza_texto", "tabla_estructurada", "pipeline"
+)
+
+
+@dataclass
+class OpcionesPipeline:
+    workers: int = WORKERS_POR_DEFECTO
+    num_ideas: int = NUM_IDEAS
+    max_tokens_fragmento: int = MAX_TOKENS_FRAGMENTO
+    top_k: int = 25
+    umbral_cobertura: float = 0.4
+    filtro_tablas: int = FILTRO_TABLAS
+    # Tamaño del banco de preguntas (None = una por idea) y preguntas por llamada
+    num_preguntas: Optional[int] = None
+    preguntas_por_lote: int = PREGUNTAS_POR_LOTE
+    # Presupuesto (tokens estimados) del resumen de cada lote de tablas
+    # enviado al analizador y tablas por lote
+    max_tokens_tablas: int = MAX_TOKENS_TABLAS
+    tablas_por_lote: int = TABLAS_POR_LOTE
+    # PDFs muy grandes: leer el PDF desde disco, soltar cada página al
+    # terminarla y guardar el texto limpio en disco (ver `documento_pdf.MEMORIA_BAJA`)
+    memoria_baja: bool = MEMORIA_BAJA
+
+
+@dataclass
+class Avance:
+    """
+    Evento de progreso del pipeline. `progreso` va de 0 a 1 sobre el documento
+    completo; `texto_parcial` trae el final del texto limpio durante la extracción
+    y `preguntas_parciales` las preguntas recibidas hasta el momento.
+    """
+    etapa: str
+    progreso: float
+    mensaje: str
+    texto_parcial: Optional[str] = None
+    preguntas_parciales: Optional[List[dict]] = None
+
+
+@dataclass
+class ResultadoDocumento:
+    doc_hash: str
+    num_paginas: int
+    # Lista de textos o, con memoria_baja, un `TextoEnDisco`
+    paginas_limpias: Sequence[str]
+    tablas_csv: str
+    resumen_tablas: List[str]
+    ideas: List[str]
+    preguntas: List[dict]
+    metricas: dict
+    paginas_tablas_omitidas: List[int] = field(default_factory=list)
+    # Tablas estructuradas y el resumen local que recibió el analizador
+    tablas: List[TablaEstructurada] = field(default_factory=list)
+    resumen_tablas_prompt: str = ""
+    # Qué se reutilizó de versiones anteriores y qué se recalculó (ver `versiones`)
+    reutilizacion: dict = field(default_factory=dict)
+    tiempos: dict = field(default_factory=dict)
+    instrumentacion: dict = field(default_factory=dict)
+
+    @property
+    def texto_limpio(self) -> str:
+        return "\n".join(self.paginas_limpias)
+
+    def inicio_texto(self, max_caracteres: int) -> str:
+        """Primeros caracteres del texto limpio, sin unir el documento completo"""
+        return inicio_texto(self.paginas_limpias, max_caracteres)
+
+    @property
+    def hay_tablas(self) -> bool:
+        return bool(self.tablas_csv.strip())
+
+    @property
+    def incompleto(self) -> List[str]:
+        """
+        Etapas LLM que no dieron resultado (el cliente registró el error y
+        devolvió una lista vacía o el mensaje de error); un documento sin
+        texto no cuenta como fallo
+        """
+        etapas = []
+        if not self.ideas and any(t.strip() for t in self.paginas_limpias):
+            etapas.append("ideas")
+        if self.hay_tablas and (not self.resumen_tablas or any(
+                linea.startswith("Error en interpretación") for linea in self.resumen_tablas)):
+            etapas.append("resumen_tablas")
+        if not self.preguntas and (self.ideas or self.resumen_tablas):
+            etapas.append("preguntas")
+        return etapas
+
+    @property
+    def respuestas(self) -> List[str]:
+        return [q.get('correct_answer', '') for q in self.preguntas]
+
+    def a_registro(self) -> dict:
+        """Registro compacto (sin el texto completo) para exportar a JSONL"""
+        # Se cuenta página a página: el texto unido por saltos de línea tiene
+        # un carácter más por página y las mismas palabras
+        return {
+            "doc_hash": self.doc_hash,
+            "texto": {
+                "paginas": self.num_paginas,
+                "caracteres": sum(len(t) for t in self.paginas_limpias) + max(0, len(self.paginas_limpias) - 1),
+                "palabras": sum(len(t.split()) for t in self.paginas_limpias),
+            },
+            "tablas": {
+                "hay_tablas": self.hay_tablas,
+                "resumen": self.resumen_tablas,
+                "paginas_omitidas": self.paginas_tablas_omitidas,
+                "estructura": [tabla.descripcion() for tabla in self.tablas],
+            },
+            "ideas": self.ideas,
+            "preguntas": self.preguntas,
+            "respuestas": self.respuestas,
+            "metricas": self.metricas,
+            "reutilizacion": self.reutilizacion,
+            "tiempos": self.tiempos,
+            "instrumentacion": self.instrumentacion,
+            "incompleto": self.incompleto,
+        }
+
+
+def hash_fuente(fuente: FuentePDF) -> str:
+    """Hash del contenido del PDF (rutas y buffers se leen por bloques, sin copiarlos)"""
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(fuente).hexdigest()
+    h = hashlib.sha256()
+    if isinstance(fuente, (str, Path)):
+        with open(fuente, "rb") as f:
+            for bloque in iter(lambda: f.read(BLOQUE_BYTES), b""):
+                h.update(bloque)
+        return h.hexdigest()
+    fuente.seek(0)
+    for bloque in iter(lambda: fuente.read(BLOQUE_BYTES), b""):
+        h.update(bloque)
+    return h.hexdigest()
+
+
+def hash_texto(paginas: Sequence[str]) -> str:
+    """Hash del texto de las páginas unido por saltos de línea, sin unirlo en memoria"""
+    h = hashlib.sha256()
+    for i, texto in enumerate(paginas):
+        h.update(("\n" + texto if i else texto).encode("utf-8"))
+    return h.hexdigest()
+
+
+def inicio_texto(paginas: Sequence[str], max_caracteres: int) -> str:
+    """Primeros `max_caracteres` del texto de las páginas unido por saltos de línea"""
+    partes: List[str] = []
+    largo = 0
+    for texto in paginas:
+        if largo >= max_caracteres:
+            break
+        partes.append(texto)
+        largo += len(texto) + 1
+    return "\n".join(partes)[:max_caracteres]
+
+
+async def procesar_documento_async(
+    fuente: FuentePDF,
+    opciones: Optional[OpcionesPipeline] = None,
+    cache: Optional[CacheEtapas] = None,
+    al_avanzar: Optional[Callable[[Avance], None]] = None,
+) -> ResultadoDocumento:
+    """
+    Ejecuta el pipeline completo sobre un PDF: extracción y limpieza por
+    páginas, tablas, ideas, preguntas y métricas. Cada etapa se guarda en la
+    caché por contenido, así que repetir un documento no repite trabajo.
+    En una nueva versión de un documento ya procesado solo se extraen las
+    páginas que cambiaron (según su huella) y solo se vuelve a llamar a los
+    LLMs por los lotes de tablas, fragmentos de texto y lotes de ideas
+    afectados; `ResultadoDocumento.reutilizacion` detalla lo reutilizado.
+    Cada etapa se mide en una traza (ver `instrumentacion`).
+    Con `opciones.memoria_baja` un PDF en memoria se copia una vez a disco
+    y se lee desde allí, y el texto limpio queda en disco (`TextoEnDisco`).
+    """
+    opciones = opciones or OpcionesPipeline()
+    cache = cache or CacheEtapas()
+    if opciones.memoria_baja and not isinstance(fuente, (str, Path)):
+        ruta = volcar_a_disco(fuente)
+        try:
+            return await procesar_documento_async(ruta, opciones, cache, al_avanzar)
+        finally:
+            ruta.unlink(missing_ok=True)
+    avisar = al_avanzar or (lambda avance: None)
+    tiempos = {}
+    doc_hash = hash_fuente(fuente)
+    informe = InformeReutilizacion()
+
+    with trazar("documento", doc_hash=doc_hash) as traza:
+        # 0. Huellas de las páginas y versión anterior del documento, si la
+        #    hay. Solo hacen falta para extraer: un documento que ya está
+        #    entero en la caché no se vuelve a leer. Su cantidad es el total
+        #    de páginas, así que la extracción no abre el PDF para contarlas
+        def comparar_versiones() -> List[str]:
+            with medir("huellas"):
+                huellas = huellas_paginas(fuente, opciones.memoria_baja)
+                anterior = cache.version_anterior(doc_hash, huellas)
+                if anterior is not None:
+                    informe.comparar(anterior[0], anterior[1], huellas)
+                    anotar(version_anterior=anterior[0], paginas_iguales=len(informe.cambios["iguales"]))
+            return huellas
+
+        # 1-3. Extraer, limpiar y buscar tablas página a página
+        def extraer_documento() -> dict:
+            huellas = comparar_versiones()
+            avisar(Avance("extraccion", 0.0, "🔄 Extrayendo texto del PDF..."))
+            acumulado = AcumuladorPaginas(en_disco=opciones.memoria_baja)
+            por_paso = Counter()
+            reutilizadas = 0
+            for pagina in procesar_paginas_incremental(fuente, huellas, cache, workers=opciones.workers,
+                                                       filtro_tablas=opciones.filtro_tablas,
+                                                       memoria_baja=opciones.memoria_baja):
+                acumulado.agregar(pagina)
+                por_paso.update(pagina.tiempos)
+                reutilizadas += pagina.reutilizada
+                # La extracción ocupa la primera mitad del progreso
+                avisar(Avance(
+                    "extraccion", 0.5 * pagina.numero / pagina.total,
+                    f"🔄 Procesando página {pagina.numero} de {pagina.total}...",
+                    acumulado.ultimo_texto(1500),
+                ))
+            # Suma por documento del tiempo de cada paso (con workers > 1, medido en los procesos del pool)
+            for paso, segundos in por_paso.items():
+                acumular(f"pagina_{paso}", segundos, paginas=acumulado.paginas)
+            contar("paginas", acumulado.paginas)
+            omitidas = len(acumulado.paginas_tablas_omitidas)
+            contar("paginas_filtro_tablas", omitidas, resultado="omitida")
+            contar("paginas_filtro_tablas", acumulado.paginas - omitidas, resultado="analizada")
+            informe.registrar("paginas", reutilizados=reutilizadas, recalculados=acumulado.paginas - reutilizadas)
+            cache.registrar_huellas(doc_hash, huellas)
+            return {
+                "num_paginas": acumulado.paginas,
+                "paginas_limpias": acumulado.paginas_limpias,
+                "tablas_csv": acumulado.tablas_csv,
+                "paginas_tablas_omitidas": acumulado.paginas_tablas_omitidas,
+                "tablas": [tabla.a_dict() for tabla in acumulado.tablas],
+                "huellas": huellas,
+            }
+
+        with medir("extraccion", workers=opciones.workers, memoria_baja=opciones.memoria_baja) as tramo:
+            if opciones.memoria_baja:
+                # El texto completo no se guarda en la caché como un solo
+                # valor; las páginas sí, cada una por su huella
+                extraccion = extraer_documento()
+            else:
+                # El mismo PDF ya procesado se toma entero de la caché
+                extraccion = cache.memoizar(
+                    "paginas", doc_hash, extraer_documento,
+                    version=VERSION_EXTRACCION, entrada=str(opciones.filtro_tablas),
+                )
+            if not (informe.reutilizados["paginas"] or informe.recalculados["paginas"]):
+                # Documento tomado entero de la caché; si el límite de tamaño
+                # expulsó sus huellas se registran las guardadas con él (las
+                # entradas anteriores a este campo vuelven a leer el PDF)
+                informe.registrar("paginas", reutilizados=extraccion["num_paginas"])
+                if not cache.usar_huellas(doc_hash):
+                    cache.registrar_huellas(
+                        doc_hash, extraccion.get("huellas") or huellas_paginas(fuente, opciones.memoria_baja)
+                    )
+            anotar(paginas=extraccion["num_paginas"],
+                   paginas_tablas_omitidas=len(extraccion["paginas_tablas_omitidas"]))
+        tiempos["extraccion"] = tramo.duracion
+        paginas_limpias = extraccion["paginas_limpias"]
+        tablas_csv = extraccion["tablas_csv"]
+        hay_tablas = bool(tablas_csv.strip())
+        tablas = [TablaEstructurada.desde_dict(datos) for datos in extraccion["tablas"]]
+        # El analizador recibe, por lotes de tablas, estadísticas calculadas
+        # localmente y filas de muestra dentro de un presupuesto de tokens, no el CSV completo
+        with medir("resumen_tablas_local", tablas=len(tablas)):
+            prompts_lotes = [
+                resumen_para_prompt(lote, opciones.max_tokens_tablas)
+                for lote in agrupar_tablas(tablas, opciones.tablas_por_lote)
+            ]
+            resumen_prompt = "\n\n".join(prompts_lotes)
+            anotar(tokens_csv=estimar_tokens(tablas_csv), tokens_resumen=estimar_tokens(resumen_prompt),
+                   lotes=len(prompts_lotes))
+
+        # 4-7. Etapas LLM. La interpretación de tablas y la extracción de ideas del
+        #      texto son independientes y se ejecutan a la vez, compartiendo las
+        #      conexiones de cada proveedor; las preguntas usan ambos resultados.
+        async with SesionLLM() as sesion:
+            def resumir_lote(prompt_lote: str) -> Awaitable[List[str]]:
+                # Cada lote de tablas se memoiza por su propio resumen local
+                return cache.memoizar_async(
+                    "resumen_tablas", hash_contenido(prompt_lote),
+                    informe.vigilar("lotes_tablas", lambda: call_gemini_analyzer_async(prompt_lote, sesion)),
+                    prompt=PROMPT_RESUMEN_TABLAS, modelo=MODELO_GEMINI,
+                    version=version_codigo("gemini_client_analyser"), entrada=prompt_lote,
+                    es_valido=lambda r: bool(r) and not r[0].startswith("Error en interpretación"),
+                )
+
+            async def resumir_tablas() -> List[str]:
+                if not hay_tablas:
+                    return []
+                with medir("resumen_tablas", lotes=len(prompts_lotes)) as tramo:
+                    resumenes = await asyncio.gather(*(resumir_lote(p) for p in prompts_lotes))
+                tiempos["resumen_tablas"] = tramo.duracion
+                # Eliminar líneas vacías y asteriscos
+                return [line.replace('*', '').strip() for resumen in resumenes for line in resumen if line.strip()]
+
+            def ideas_de_fragmento(fragmento: str, calcular: Callable[[], Awaitable[List[str]]]) -> Awaitable[List[str]]:
+                return cache.memoizar_async(
+                    "ideas_fragmento", hash_contenido(fragmento), informe.vigilar("fragmentos_ideas", calcular),
+                    prompt=PROMPT_IDEAS, modelo=MODELO_GEMINI, version=version_codigo("gemini_client"),
+                    entrada=str(opciones.num_ideas), es_valido=bool,
+                )
+
+            async def extraer_ideas() -> List[str]:
+                # Map-reduce por fragmentos de páginas para documentos largos;
+                # solo se llama al LLM por los fragmentos que no están en la caché
+                with medir("ideas") as tramo:
+                    ideas = await extraer_ideas_async(
+                        paginas_limpias, sesion, num_ideas=opciones.num_ideas,
+                        max_tokens=opciones.max_tokens_fragmento, cache_fragmento=ideas_de_fragmento,
+                    )
+                    anotar(ideas=len(ideas))
+                tiempos["ideas"] = tramo.duracion
+                return ideas
+
+            avisar(Avance(
+                "ideas", 0.6,
+                "🔍 Interpretando tablas y extrayendo ideas principales..." if hay_tablas
+                else "💡 Extrayendo ideas principales...",
+            ))
+            resumen_tablas, ideas = await asyncio.gather(resumir_tablas(), extraer_ideas())
+
+            avisar(Avance("preguntas", 0.8, "❓ Generando preguntas con DeepSeek..."))
+            # Las ideas del texto más los puntos clave de las tablas alimentan
+            # las preguntas; por defecto se pide una pregunta por idea
+            contexto = ideas + resumen_tablas
+            num_preguntas = opciones.num_preguntas or len(ideas)
+            recibidas: List[dict] = []
+
+            def pregunta_recibida(pregunta: dict) -> None:
+                # Cada pregunta se muestra en cuanto llega completa del stream
+                recibidas.append(pregunta)
+                avisar(Avance(
+                    "preguntas", 0.8 + 0.1 * min(1.0, len(recibidas) / max(1, num_preguntas)),
+                    f"❓ Generando preguntas con DeepSeek... ({len(recibidas)} de {num_preguntas})",
+                    preguntas_parciales=list(recibidas),
+                ))
+
+            def preguntas_de_lote(grupo: List[str], cuota: int,
+                                  calcular: Callable[[], Awaitable[List[dict]]]) -> Awaitable[List[dict]]:
+                return cache.memoizar_async(
+                    "preguntas_lote", hash_contenido(json.dumps(grupo, ensure_ascii=False)),
+                    informe.vigilar("lotes_preguntas", calcular),
+                    prompt=system_prompt(cuota), modelo=MODELO_DEEPSEEK,
+                    version=version_codigo("deepseek_client"), entrada=str(cuota), es_valido=bool,
+                )
+
+            with medir("preguntas", num_preguntas=num_preguntas) as tramo:
+                # El banco completo se memoiza por su contexto; si cambió, solo
+                # se piden los lotes de ideas que no están en la caché
+                preguntas = await cache.memoizar_async(
+                    "preguntas", doc_hash,
+                    informe.vigilar("bancos_preguntas", lambda: generar_preguntas_async(
+                        contexto, num_questions=num_preguntas, sesion=sesion,
+                        al_recibir_pregunta=pregunta_recibida,
+                        preguntas_por_lote=opciones.preguntas_por_lote, cache_lote=preguntas_de_lote,
+                    )),
+                    prompt=system_prompt(num_preguntas), modelo=MODELO_DEEPSEEK,
+                    version=version_codigo("deepseek_client", "metricas"),
+                    entrada=json.dumps([num_preguntas, opciones.preguntas_por_lote, contexto], ensure_ascii=False),
+                    es_valido=bool,
+                )
+                anotar(preguntas=len(preguntas))
+            tiempos["preguntas"] = tramo.duracion
+
+        # 8. Métricas de calidad
+        avisar(Avance("metricas", 0.9, "📈 Calculando métricas de calidad..."))
+        # El modelo de embeddings solo lee el comienzo del texto: con
+        # memoria_baja no se une el documento completo para la relevancia
+        texto_limpio = (
+            inicio_texto(paginas_limpias, CARACTERES_RELEVANCIA) if opciones.memoria_baja
+            else "\n".join(paginas_limpias)
+        )
+        hash_paginas = hash_texto(paginas_limpias)
+        with medir("metricas") as tramo:
+            # El documento entra una sola vez en el IDF de las keywords, con su
+            # texto limpio (página a página); la métrica solo consulta el índice.
+            # La cobertura depende del corpus: la clave incluye cuántos
+            # documentos tiene, así un documento reprocesado después de otros
+            # nuevos no recibe la cobertura calculada con el corpus anterior
+            registrar_documento(paginas_limpias, hash_paginas)
+            corpus = documentos_keywords()
+            metricas_calidad = cache.memoizar(
+                "metricas", doc_hash,
+                lambda: evaluar_preguntas(
+                    texto_limpio, preguntas, ideas,
+                    top_k=opciones.top_k, threshold=opciones.umbral_cobertura,
+                ),
+                version=version_codigo("metricas", "indice_keywords"),
+                entrada=json.dumps(
+                    [hash_paginas, ideas, preguntas, opciones.top_k, opciones.umbral_cobertura, corpus],
+                    ensure_ascii=False,
+                ),
+            )
+        tiempos["metricas"] = tramo.duracion
+
+    avisar(Avance("fin", 1.0, "🎉 ¡Procesamiento completado!"))
+    # Resumen de la traza sin el detalle de cada tramo
+    instrumentacion = {k: v for k, v in traza.a_dict().items() if k != "tramos"}
+
+    return ResultadoDocumento(
+        doc_hash=doc_hash,
+        num_paginas=extraccion["num_paginas"],
+        paginas_limpias=paginas_limpias,
+        tablas_csv=tablas_csv,
+        resumen_tablas=resumen_tablas,
+        ideas=ideas,
+        preguntas=preguntas,
+        metricas=metricas_calidad,
+        paginas_tablas_omitidas=extraccion["paginas_tablas_omitidas"],
+        tablas=tablas,
+        resumen_tablas_prompt=resumen_prompt,
+        reutilizacion=informe.a_dict(),
+        tiempos=tiempos,
+        instrumentacion=instrumentacion,
+    )
+
+
+def procesar_documento(fuente: FuentePDF, opciones: Optional[OpcionesPipeline] = None,
+                       cache: Optional[CacheEtapas] = None,
+                       al_avanzar: Optional[Callable[[Avance], None]] = None) -> ResultadoDocumento:
+    """
+    Versión bloqueante de `procesar_documento_async`.
+    """
+    return asyncio.run(procesar_documento_async(fuente, opciones, cache, al_avanzar))
@@ -0,0 +1,169 @@
+"""
+Procesa lotes de PDFs sin interfaz y escribe un registro JSONL por documento.
+
+Uso:
+    python procesar_lote.py cursos/ --salida resultados.jsonl --workers 8
+    python procesar_lote.py "cursos/**/*.pdf" --salida resultados.jsonl
+
+Las ejecuciones se pueden reanudar: los documentos cuyo hash ya figura en el
+archivo de salida (sin error y con todas las etapas completas) se omiten; los
+que fallaron o quedaron incompletos se vuelven a procesar.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, List
+
+from dotenv import load_dotenv
+
+from deepseek_client import PREGUNTAS_POR_LOTE
+from documento_pdf import FILTRO_TABLAS, MEMORIA_BAJA
+from extraccion_paralela import WORKERS_POR_DEFECTO
+from gemini_client import NUM_IDEAS
+from instrumentacion import FormateadorJSON
+from tabla_estructurada import MAX_TOKENS_TABLAS
+from pipeline import OpcionesPipeline, hash_fuente, procesar_documento
+
+logger = logging.getLogger(__name__)
+
+
+def buscar_pdfs(entradas: Iterable[str]) -> List[Path]:
+    """Expande directorios (recursivamente) y patrones glob a una lista de PDFs"""
+    encontrados = []
+    for entrada in entradas:
+        ruta = Path(entrada)
+        if ruta.is_dir():
+            encontrados.extend(ruta.rglob("*.pdf"))
+        elif ruta.is_file():
+            encontrados.append(ruta)
+        else:
+            encontrados.extend(Path(p) for p in glob.glob(entrada, recursive=True))
+    # Sin duplicados y en orden estable
+    return sorted({p.resolve() for p in encontrados if p.suffix.lower() == ".pdf"})
+
+
+def hashes_procesados(salida: Path) -> set:
+    """
+    Hashes de los documentos ya procesados con éxito en una ejecución anterior.
+    Un registro con error o con etapas incompletas (p. ej. un LLM que falló y
+    dejó las ideas o las preguntas vacías) no cuenta: se reintenta.
+    """
+    hechos = set()
+    if not salida.exists():
+        return hechos
+    with open(salida, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea truncada por una interrupción: ese documento se repite
+                continue
+            if "error" not in registro and not registro.get("incompleto") and registro.get("doc_hash"):
+                hechos.add(registro["doc_hash"])
+    return hechos
+
+
+def procesar_archivo(ruta: str, opciones: OpcionesPipeline) -> dict:
+    """Tarea de un worker: procesa un PDF y devuelve su registro"""
+    inicio = time.perf_counter()
+    try:
+        resultado = procesar_documento(ruta, opciones)
+        registro = resultado.a_registro()
+    except Exception as e:
+        registro = {"error": f"{e.__class__.__name__}: {e}"}
+    registro["archivo"] = ruta
+    registro["duracion"] = time.perf_counter() - inicio
+    return registro
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entradas", nargs="+", help="Directorios, archivos o patrones glob")
+    parser.add_argument("--salida", default="resultados.jsonl", help="Archivo JSONL de resultados")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Documentos procesados en paralelo (procesos)")
+    parser.add_argument("--workers-extraccion", type=int, default=WORKERS_POR_DEFECTO,
+                        help="Procesos para extraer las páginas de cada documento")
+    parser.add_argument("--num-ideas", type=int, default=NUM_IDEAS)
+    parser.add_argument("--num-preguntas", type=int, default=None,
+                        help="Preguntas por documento (por defecto, una por idea)")
+    parser.add_argument("--preguntas-por-lote", type=int, default=PREGUNTAS_POR_LOTE,
+                        help="Preguntas por llamada a DeepSeek; los lotes se piden en paralelo")
+    parser.add_argument("--max-tokens-tablas", type=int, default=MAX_TOKENS_TABLAS,
+                        help="Presupuesto (tokens estimados) del resumen de tablas enviado al analizador")
+    parser.add_argument("--filtro-tablas", type=int, choices=[0, 1, 2], default=FILTRO_TABLAS,
+                        help="Filtro de páginas sin tablas: 0 desactivado, 1 seguro, 2 agresivo")
+    parser.add_argument("--memoria-baja", action="store_true", default=MEMORIA_BAJA,
+                        help="PDFs muy grandes: liberar cada página al terminarla y guardar el texto en disco")
+    parser.add_argument("--no-reanudar", action="store_true",
+                        help="Procesar también los documentos ya presentes en la salida")
+    parser.add_argument("--log-json", action="store_true",
+                        help="Logs como líneas JSON (incluye la traza de cada documento)")
+    args = parser.parse_args(argv)
+    manejador = logging.StreamHandler()
+    manejador.setFormatter(
+        FormateadorJSON() if args.log_json else logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+    )
+    logging.basicConfig(level=logging.INFO, handlers=[manejador])
+    # Una línea por petición HTTP tapa el progreso del lote
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    salida = Path(args.salida)
+    pdfs = buscar_pdfs(args.entradas)
+    hechos = set() if args.no_reanudar else hashes_procesados(salida)
+    pendientes = [p for p in pdfs if not hechos or hash_fuente(p) not in hechos]
+    logger.info(f"{len(pdfs)} PDFs encontrados, {len(pdfs) - len(pendientes)} ya procesados, "
+                f"{len(pendientes)} pendientes")
+    if not pendientes:
+        return 0
+
+    opciones = OpcionesPipeline(workers=args.workers_extraccion, num_ideas=args.num_ideas,
+                                filtro_tablas=args.filtro_tablas, num_preguntas=args.num_preguntas,
+                                preguntas_por_lote=args.preguntas_por_lote,
+                                max_tokens_tablas=args.max_tokens_tablas, memoria_baja=args.memoria_baja)
+    inicio = time.perf_counter()
+    documentos = paginas = errores = incompletos = 0
+    with open(salida, "a", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futuros = [pool.submit(procesar_archivo, str(p), opciones) for p in pendientes]
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+            # Una línea por documento, escrita en cuanto termina: si la
+            # ejecución se interrumpe, lo ya escrito no se repite
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            documentos += 1
+            if "error" in registro:
+                errores += 1
+                logger.error(f"{registro['archivo']}: {registro['error']}")
+            else:
+                paginas += registro["texto"]["paginas"]
+                if registro["incompleto"]:
+                    incompletos += 1
+                    logger.warning(f"{registro['archivo']}: etapas incompletas "
+                                   f"({', '.join(registro['incompleto'])}); se reintentará al reanudar")
+            transcurrido = time.perf_counter() - inicio
+            logger.info(
+                f"[{documentos}/{len(pendientes)}] {Path(registro['archivo']).name} "
+                f"({registro['duracion']:.1f}s) — {documentos / transcurrido * 60:.1f} docs/min, "
+                f"{paginas / transcurrido:.1f} págs/s"
+            )
+
+    transcurrido = time.perf_counter() - inicio
+    print(
+        f"Procesados {documentos} documentos ({errores} con error, {incompletos} incompletos), {paginas} páginas en "
+        f"{transcurrido:.1f}s: {documentos / transcurrido * 60:.1f} docs/min, "
+        f"{paginas / transcurrido:.1f} págs/s"
+    )
+    return 1 if errores or incompletos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from instrumentacion import contar
+
+logger = logging.getLogger(__name__)
+
+# Textos máximos por llamada al modelo
+MAX_LOTE = int(os.getenv("EMBEDDINGS_MAX_LOTE", "256"))
+# Espera para juntar pedidos de otros hilos antes de llamar al modelo
+ESPERA_MS = float(os.getenv("EMBEDDINGS_ESPERA_MS", "2"))
+
+Codificador = Callable[[List[str]], np.ndarray]
+
+
+class ServicioEmbeddings:
+    """
+    Único hilo que usa el modelo de embeddings. Los pedidos de todas las
+    sesiones y trabajos se encolan; el hilo junta los que llegan casi a la vez
+    (hasta `max_lote` textos o `espera_ms` milisegundos), codifica los textos
+    distintos en una sola llamada y devuelve a cada pedido sus filas.
+    """
+
+    def __init__(self, codificador: Codificador, max_lote: int = MAX_LOTE, espera_ms: float = ESPERA_MS):
+        self._codificador = codificador
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self._pedidos: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        self._hilo = threading.Thread(target=self._atender, name="servicio-embeddings", daemon=True)
+        self._hilo.start()
+
+    def codificar(self, textos: List[str]) -> np.ndarray:
+        """Embeddings de `textos` en orden (bloquea hasta que el lote se procesa)"""
+        if not textos:
+            return np.empty((0, 0), dtype=np.float32)
+        futuro: Future = Future()
+        self._pedidos.put((list(textos), futuro))
+        return futuro.result()
+
+    def detener(self) -> None:
+        self._pedidos.put(None)
+        self._hilo.join()
+
+    def _juntar(self, primero: Tuple[List[str], Future]) -> Tuple[List[Tuple[List[str], Future]], bool]:
+        # Pedidos que llegan durante la espera, sin pasar de max_lote textos
+        pedidos = [primero]
+        textos = len(primero[0])
+        limite = time.monotonic() + self.espera
+        while textos < self.max_lote:
+            restante = limite - time.monotonic()
+            try:
+                pedido = self._pedidos.get(timeout=restante) if restante > 0 else self._pedidos.get_nowait()
+            except queue.Empty:
+                break
+            if pedido is None:
+                return pedidos, True
+            pedidos.append(pedido)
+            textos += len(pedido[0])
+        return pedidos, False
+
+    def _atender(self) -> None:
+        detener = False
+        while not detener:
+            primero = self._pedidos.get()
+            if primero is None:
+                break
+            pedidos, detener = self._juntar(primero)
+            distintos = list(dict.fromkeys(t for textos, _ in pedidos for t in textos))
+            try:
+                matriz = np.asarray(self._codificador(distintos))
+            except Exception as e:
+                logger.error(f"Error calculando embeddings: {e}")
+                for _, futuro in pedidos:
+                    futuro.set_exception(e)
+                continue
+            contar("embeddings_lotes_modelo")
+            contar("embeddings_pedidos", len(pedidos))
+            fila = {t: i for i, t in enumerate(distintos)}
+            for textos, futuro in pedidos:
+                futuro.set_result(matriz[[fila[t] for t in textos]])
@@ -0,0 +1,327 @@
+import csv
+import hashlib
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from fragmentacion import estimar_tokens
+
+# Presupuesto (tokens estimados) del resumen de tablas que se envía al analizador
+MAX_TOKENS_TABLAS = int(os.getenv("MAX_TOKENS_TABLAS", "1500"))
+# Una columna es numérica si al menos esta fracción de sus celdas no vacías son números
+FRACCION_NUMERICA = 0.7
+# Las tablas con hasta estas filas se envían completas si así ocupan menos
+# que sus estadísticas y una muestra
+MAX_FILAS_COMPLETAS = 30
+FILAS_MUESTRA = 3
+CATEGORIAS_FRECUENTES = 3
+# Tablas por lote del analizador (en promedio; como máximo el doble). Los
+# cortes entre lotes dependen del contenido de las tablas, no de su posición
+TABLAS_POR_LOTE = int(os.getenv("TABLAS_POR_LOTE", "8"))
+
+# Número con signo, moneda, separadores de miles y porcentaje: "-1.234,5", "$ 3,5", "12%"
+_RE_NUMERO = re.compile(r"^[-+−]?\s*[$€£]?\s*[-+−]?\d[\d.,\s]*%?$")
+_RE_MILES_PUNTO = re.compile(r"^\d{1,3}(\.\d{3})+$")
+_RE_MILES_COMA = re.compile(r"^\d{1,3}(,\d{3})+$")
+
+
+def parsear_numero(celda: Optional[str]) -> Optional[float]:
+    """
+    Convierte una celda cruda en número aceptando formatos en español e
+    inglés ("1.234,5", "1,234.5", "3,5", "12%"). Devuelve None si no es un número.
+    """
+    if not celda:
+        return None
+    texto = celda.strip()
+    if not texto or not _RE_NUMERO.match(texto):
+        return None
+    negativo = re.match(r"^[^\d]*[-−]", texto) is not None
+    texto = re.sub(r"[^\d.,]", "", texto)
+    if "." in texto and "," in texto:
+        # El separador que aparece último es el decimal
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif "," in texto:
+        texto = texto.replace(",", "") if _RE_MILES_COMA.match(texto) else texto.replace(",", ".")
+    elif _RE_MILES_PUNTO.match(texto):
+        texto = texto.replace(".", "")
+    try:
+        valor = float(texto)
+    except ValueError:
+        return None
+    return -valor if negativo else valor
+
+
+def _formato(valor: float) -> str:
+    return f"{valor:.4g}" if abs(valor) < 1e6 else f"{valor:.3e}"
+
+
+@dataclass
+class ColumnaTabla:
+    """
+    Una columna de la tabla con su tipo ("numero", "texto" o "vacia") y sus
+    valores: números como float (NaN si la celda no lo es) o el texto limpio.
+    """
+    nombre: str
+    tipo: str
+    valores: np.ndarray
+
+    @classmethod
+    def desde_celdas(cls, nombre: str, limpias: List[str], crudas: List[Optional[str]]) -> "ColumnaTabla":
+        no_vacias = [c for c in crudas if c and c.strip()]
+        if not no_vacias:
+            return cls(nombre, "vacia", np.array(limpias, dtype=object))
+        numeros = [parsear_numero(c) for c in crudas]
+        if sum(n is not None for n in numeros) >= FRACCION_NUMERICA * len(no_vacias):
+            return cls(nombre, "numero", np.array([np.nan if n is None else n for n in numeros], dtype=np.float64))
+        return cls(nombre, "texto", np.array(limpias, dtype=object))
+
+    def estadisticas(self) -> dict:
+        """Estadísticas calculadas localmente con NumPy"""
+        if self.tipo == "numero":
+            validos = self.valores[~np.isnan(self.valores)]
+            return {
+                "valores": int(validos.size),
+                "vacios": int(self.valores.size - validos.size),
+                "min": float(validos.min()),
+                "max": float(validos.max()),
+                "media": float(validos.mean()),
+                "mediana": float(np.median(validos)),
+                "suma": float(validos.sum()),
+            }
+        no_vacios = self.valores[self.valores != ""] if self.valores.size else self.valores
+        if self.tipo == "vacia" or not no_vacios.size:
+            return {"valores": 0, "vacios": int(self.valores.size)}
+        categorias, cuentas = np.unique(no_vacios.astype(str), return_counts=True)
+        orden = np.argsort(-cuentas, kind="stable")[:CATEGORIAS_FRECUENTES]
+        return {
+            "valores": int(no_vacios.size),
+            "vacios": int(self.valores.size - no_vacios.size),
+            "distintos": int(categorias.size),
+            "frecuentes": [(str(categorias[i]), int(cuentas[i])) for i in orden],
+        }
+
+    def resumen(self) -> str:
+        est = self.estadisticas()
+        if self.tipo == "numero":
+            texto = (f"- {self.nombre} [número]: min {_formato(est['min'])}, max {_formato(est['max'])}, "
+                     f"media {_formato(est['media'])}, mediana {_formato(est['mediana'])}")
+        elif est["valores"]:
+            ejemplos = ", ".join(
+                _recortar(c) + (f" ({n})" if n > 1 else "") for c, n in est["frecuentes"]
+            )
+            texto = (f"- {self.nombre} [texto]: {est['distintos']} valores distintos; "
+                     f"{'más frecuentes' if est['frecuentes'][0][1] > 1 else 'p. ej.'}: {ejemplos}")
+        else:
+            return f"- {self.nombre} [vacía]"
+        return texto + (f"; {est['vacios']} vacíos" if est["vacios"] else "")
+
+
+def _recortar(texto: str, largo: int = 40) -> str:
+    texto = " ".join(texto.split())
+    return texto if len(texto) <= largo else texto[:largo - 1] + "…"
+
+
+@dataclass
+class TablaEstructurada:
+    """
+    Tabla de una página con su encabezado y columnas tipadas. `filas` guarda
+    las celdas limpias tal como se extrajeron (encabezado incluido) para
+    generar el CSV que se muestra al usuario.
+    """
+    pagina: int
+    indice: int
+    encabezado: List[str]
+    filas: List[List[str]]
+    columnas: List[ColumnaTabla] = field(default_factory=list)
+    tiene_encabezado: bool = True
+
+    @property
+    def num_filas(self) -> int:
+        """Filas de datos (sin el encabezado)"""
+        return len(self.filas) - (1 if self.tiene_encabezado else 0)
+
+    @property
+    def filas_datos(self) -> List[List[str]]:
+        return self.filas[1:] if self.tiene_encabezado else self.filas
+
+    def a_csv(self) -> str:
+        """CSV de las celdas limpias, seguido de una línea en blanco"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.filas)
+        buffer.write("\n")
+        return buffer.getvalue()
+
+    def resumen(self, nivel: int = 2, numero: Optional[int] = None) -> str:
+        """
+        Descripción compacta para el prompt. Nivel 2: las filas completas si
+        son pocas o, si no, estadísticas por columna y una muestra de filas;
+        1: solo estadísticas; 0: dimensiones y nombres de columnas.
+        """
+        titulo = f"Tabla {numero or self.indice + 1} (página {self.pagina}): {self.num_filas} filas x {len(self.columnas)} columnas"
+        if nivel <= 0:
+            return f"{titulo}; columnas: {', '.join(self.encabezado)}"
+        lineas = [titulo] + [c.resumen() for c in self.columnas]
+        filas = self._filas_prompt(MAX_FILAS_COMPLETAS + 1) if nivel >= 2 else []
+        if filas:
+            muestra = "\n".join(lineas + [f"Primeras {FILAS_MUESTRA} filas:",
+                                          self._csv_compacto([self.encabezado] + filas[:FILAS_MUESTRA])])
+            if len(filas) <= MAX_FILAS_COMPLETAS:
+                completa = "\n".join([titulo, self._csv_compacto([self.encabezado] + filas)])
+                return min(completa, muestra, key=len)
+            return muestra
+        return "\n".join(lineas)
+
+    def _filas_prompt(self, limite: int) -> List[List[str]]:
+        # Primeras filas de datos con los números ya interpretados: la
+        # limpieza de las celdas quita puntos y comas ("3,5" → "35")
+        filas = [list(fila) for fila in self.filas_datos[:limite]]
+        for j, columna in enumerate(self.columnas):
+            if columna.tipo != "numero":
+                continue
+            for fila, valor in zip(filas, columna.valores):
+                if j < len(fila) and not np.isnan(valor):
+                    fila[j] = f"{valor:g}"
+        return filas
+
+    @staticmethod
+    def _csv_compacto(filas: List[List[str]]) -> str:
+        # Sin saltos de línea dentro de las celdas ni espacios repetidos
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows([[" ".join(c.split()) for c in fila] for fila in filas])
+        return buffer.getvalue().rstrip("\n")
+
+    def a_dict(self) -> dict:
+        return {
+            "pagina": self.pagina,
+            "indice": self.indice,
+            "encabezado": self.encabezado,
+            "filas": self.filas,
+            "tiene_encabezado": self.tiene_encabezado,
+            "columnas": [
+                {
+                    "nombre": c.nombre,
+                    "tipo": c.tipo,
+                    "numeros": [None if np.isnan(v) else float(v) for v in c.valores] if c.tipo == "numero" else None,
+                }
+                for c in self.columnas
+            ],
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: dict) -> "TablaEstructurada":
+        tabla = cls(
+            pagina=datos["pagina"], indice=datos["indice"], encabezado=datos["encabezado"],
+            filas=datos["filas"], tiene_encabezado=datos["tiene_encabezado"],
+        )
+        filas = tabla.filas_datos
+        for j, columna in enumerate(datos["columnas"]):
+            if columna["tipo"] == "numero":
+                valores = np.array([np.nan if v is None else v for v in columna["numeros"]], dtype=np.float64)
+            else:
+                valores = np.array([fila[j] if j < len(fila) else "" for fila in filas], dtype=object)
+            tabla.columnas.append(ColumnaTabla(columna["nombre"], columna["tipo"], valores))
+        return tabla
+
+    def descripcion(self) -> dict:
+        """Metadatos sin celdas, para registros"""
+        return {
+            "pagina": self.pagina,
+            "filas": self.num_filas,
+            "columnas": {c.nombre: c.tipo for c in self.columnas},
+        }
+
+
+def estructurar_tabla(pagina: int, indice: int, limpias: List[List[str]],
+                      crudas: List[List[Optional[str]]]) -> TablaEstructurada:
+    """
+    Arma la tabla a partir de sus celdas limpias (para texto y CSV) y crudas
+    (para leer números: la limpieza quita puntos y comas). La primera fila es
+    el encabezado salvo que la mayoría de sus celdas sean números.
+    """
+    ancho = max((len(fila) for fila in limpias), default=0)
+    primera = [c for c in (crudas[0] if crudas else []) if c and c.strip()]
+    tiene_encabezado = len(limpias) > 1 and sum(parsear_numero(c) is not None for c in primera) < 0.5 * max(1, len(primera))
+    if tiene_encabezado:
+        encabezado = [c or f"columna_{j + 1}" for j, c in enumerate(limpias[0] + [""] * (ancho - len(limpias[0])))]
+    else:
+        encabezado = [f"columna_{j + 1}" for j in range(ancho)]
+    # Nombres repetidos se distinguen por su posición
+    vistos = set()
+    for j, nombre in enumerate(encabezado):
+        if nombre in vistos:
+            encabezado[j] = f"{nombre}_{j + 1}"
+        vistos.add(encabezado[j])
+
+    tabla = TablaEstructurada(pagina, indice, encabezado, limpias, tiene_encabezado=tiene_encabezado)
+    inicio = 1 if tiene_encabezado else 0
+    for j, nombre in enumerate(encabezado):
+        columna_limpia = [fila[j] if j < len(fila) else "" for fila in limpias[inicio:]]
+        columna_cruda = [fila[j] if j < len(fila) else None for fila in crudas[inicio:]]
+        tabla.columnas.append(ColumnaTabla.desde_celdas(nombre, columna_limpia, columna_cruda))
+    return tabla
+
+
+def resumen_para_prompt(tablas: List[TablaEstructurada], max_tokens: int = MAX_TOKENS_TABLAS) -> str:
+    """
+    Resumen de todas las tablas para el prompt del analizador, dentro de
+    `max_tokens` tokens estimados. Cada tabla empieza con el máximo detalle y,
+    mientras no quepa, se reduce el de la tabla cuyo resumen es más largo. Si
+    ni las dimensiones de todas caben, se incluyen las primeras y se indica
+    cuántas quedan fuera.
+    """
+    if not tablas:
+        return ""
+    resumenes = [{nivel: t.resumen(nivel, i) for nivel in (2, 1, 0)} for i, t in enumerate(tablas, 1)]
+    niveles = [2] * len(tablas)
+    costos = [estimar_tokens(r[2]) + 1 for r in resumenes]
+    total = sum(costos)
+    while total > max_tokens:
+        candidatas = [i for i, nivel in enumerate(niveles) if nivel > 0]
+        if not candidatas:
+            break
+        i = max(candidatas, key=lambda j: costos[j])
+        niveles[i] -= 1
+        nuevo = estimar_tokens(resumenes[i][niveles[i]]) + 1
+        total += nuevo - costos[i]
+        costos[i] = nuevo
+    if total <= max_tokens:
+        return "\n\n".join(r[nivel] for r, nivel in zip(resumenes, niveles))
+
+    partes = []
+    usados = 0
+    for i, tabla in enumerate(tablas):
+        if usados + costos[i] + 20 > max_tokens:
+            resto = tablas[i:]
+            partes.append(f"... y {len(resto)} tablas más ({sum(t.num_filas for t in resto)} filas)")
+            break
+        partes.append(resumenes[i][0])
+        usados += costos[i]
+    return "\n".join(partes)
+
+
+def agrupar_tablas(tablas: List[TablaEstructurada],
+                   tablas_por_lote: int = TABLAS_POR_LOTE) -> List[List[TablaEstructurada]]:
+    """
+    Divide las tablas en lotes consecutivos para resumirlos por separado. Un
+    lote se cierra tras una tabla cuyo hash de contenido es múltiplo de
+    `tablas_por_lote` (o al llegar al doble de tablas): al modificar, agregar
+    o quitar una tabla solo cambia su lote, y los demás se reutilizan de la caché.
+    """
+    lotes: List[List[TablaEstructurada]] = []
+    actual: List[TablaEstructurada] = []
+    for tabla in tablas:
+        actual.append(tabla)
+        corte = int(hashlib.sha256(tabla.a_csv().encode("utf-8")).hexdigest()[:8], 16)
+        if corte % max(1, tablas_por_lote) == 0 or len(actual) >= 2 * tablas_por_lote:
+            lotes.append(actual)
+            actual = []
+    if actual:
+        lotes.append(actual)
+    return lotes
@@ -0,0 +1,119 @@
+"""
+`almacen_embeddings.AlmacenEmbeddings`: `obtener_o_calcular` devuelve los
+vectores en el orden de los textos con aciertos, fallos y repetidos
+mezclados, y tras `expulsar` / `compactar` cada fila del índice SQLite sigue
+apuntando al vector de su texto.
+
+Uso:
+    python -m pytest tests/
+"""
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import almacen_embeddings
+from almacen_embeddings import SUFIJOS, AlmacenEmbeddings, clave_texto
+
+DIM = 8
+
+
+def vector(texto: str) -> np.ndarray:
+    semilla = int(hashlib.sha1(texto.encode()).hexdigest()[:8], 16)
+    v = np.random.default_rng(semilla).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class Codificador:
+    """Embeddings deterministas por texto; registra los lotes pedidos"""
+
+    def __init__(self):
+        self.lotes = []
+
+    def __call__(self, textos):
+        self.lotes.append(list(textos))
+        return np.stack([vector(t) for t in textos])
+
+
+def filas_matriz(almacen: AlmacenEmbeddings) -> int:
+    return os.path.getsize(almacen.ruta_matriz) // (DIM * np.dtype(almacen.dtype).itemsize)
+
+
+def indice(almacen: AlmacenEmbeddings) -> dict:
+    with sqlite3.connect(almacen.ruta_indice) as conn:
+        return dict(conn.execute("SELECT clave, fila FROM indice").fetchall())
+
+
+def assert_consistente(almacen: AlmacenEmbeddings, textos) -> None:
+    # Filas vivas numeradas 0..n-1 sin huecos, una por clave, y cada una con el vector de su texto
+    filas = indice(almacen)
+    assert sorted(filas.values()) == list(range(len(filas))) == list(range(filas_matriz(almacen)))
+    matriz = np.memmap(almacen.ruta_matriz, dtype=almacen.dtype, mode="r", shape=(len(filas), DIM))
+    for texto in textos:
+        assert np.array_equal(matriz[filas[clave_texto(texto)]], vector(texto))
+
+
+@pytest.mark.parametrize("dtype", list(SUFIJOS))
+def test_orden_con_aciertos_fallos_y_repetidos(tmp_path, dtype):
+    almacen = AlmacenEmbeddings(str(tmp_path), max_filas=0, dtype=dtype)
+    codificar = Codificador()
+    almacen.obtener_o_calcular(["b", "d"], codificar)
+    textos = ["a", "b", "c", "a", "d", "b", "e", "c", "a"]
+    resultado = almacen.obtener_o_calcular(textos, codificar)
+    # Solo los fallos, sin repetidos y en orden de aparición
+    assert codificar.lotes[-1] == ["a", "c", "e"]
+    esperado = np.stack([vector(t) for t in textos])
+    tolerancia = 0 if dtype == "float32" else 2e-2
+    np.testing.assert_allclose(resultado, esperado, atol=tolerancia)
+    # Un texto repetido da siempre el mismo vector, venga de la caché o recién calculado
+    assert np.array_equal(resultado[0], resultado[3]) and np.array_equal(resultado[1], resultado[5])
+    # La segunda vez todo es acierto y coincide con la primera
+    assert np.array_equal(almacen.obtener_o_calcular(textos, codificar), resultado)
+    assert len(codificar.lotes) == 2
+
+
+def test_todo_fallos_y_vacio(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), max_filas=0)
+    assert almacen.obtener_o_calcular([], Codificador()).shape == (0, 0)
+    textos = ["x", "y", "x"]
+    resultado = almacen.obtener_o_calcular(textos, Codificador())
+    assert np.array_equal(resultado, np.stack([vector(t) for t in textos]))
+
+
+def test_expulsar_y_compactar_mantienen_el_indice(tmp_path, monkeypatch):
+    reloj = iter(range(1, 10_000))
+    monkeypatch.setattr(almacen_embeddings.time, "time", lambda: float(next(reloj)))
+    almacen = AlmacenEmbeddings(str(tmp_path), max_filas=0)
+    textos = [f"t{i}" for i in range(20)]
+    for texto in textos:
+        almacen.obtener_o_calcular([texto], Codificador())
+    # Uso reciente de los primeros: los más viejos pasan a ser t5..t19
+    almacen.obtener_o_calcular(textos[:5], Codificador())
+    almacen.expulsar(12)
+    vivos = textos[:5] + textos[13:]
+    assert sorted(indice(almacen)) == sorted(clave_texto(t) for t in vivos)
+    assert_consistente(almacen, vivos)
+
+    # Sin nada que eliminar, compactar no cambia nada
+    almacen.compactar()
+    assert_consistente(almacen, vivos)
+    codificar = Codificador()
+    assert np.array_equal(almacen.obtener_o_calcular(vivos, codificar), np.stack([vector(t) for t in vivos]))
+    assert codificar.lotes == []
+    # Lo expulsado se vuelve a calcular y se agrega al final
+    almacen.obtener_o_calcular(textos[5:8], codificar)
+    assert codificar.lotes == [textos[5:8]]
+    assert_consistente(almacen, vivos + textos[5:8])
+
+
+def test_expulsion_automatica_al_agregar(tmp_path):
+    almacen = AlmacenEmbeddings(str(tmp_path), max_filas=10)
+    textos = [f"t{i}" for i in range(25)]
+    for i in range(0, len(textos), 5):
+        lote = textos[i:i + 5]
+        assert np.array_equal(almacen.obtener_o_calcular(lote, Codificador()), np.stack([vector(t) for t in lote]))
+    vivos = [t for t in textos if clave_texto(t) in indice(almacen)]
+    assert 0 < len(vivos) <= almacen.max_filas
+    assert_consistente(almacen, vivos)
@@ -0,0 +1,73 @@
+"""
+`cache_etapas.CacheEtapas`: el total de bytes que se lleva en `meta` coincide
+con lo guardado, la expulsión respeta el orden LRU (etapas y huellas juntas)
+y un acierto no escribe mientras la marca de acceso sea reciente.
+
+Uso:
+    python -m pytest tests/
+"""
+import sqlite3
+
+import cache_etapas
+from cache_etapas import CacheEtapas
+
+
+def bytes_reales(cache: CacheEtapas) -> int:
+    with sqlite3.connect(cache.ruta) as conn:
+        etapas = conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM etapas").fetchone()[0]
+        huellas = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(doc_hash) + LENGTH(huella) + ?), 0) FROM huellas",
+            (cache_etapas._BYTES_FILA_HUELLA,),
+        ).fetchone()[0]
+    return etapas + huellas
+
+
+def test_total_igual_a_lo_guardado(tmp_path):
+    cache = CacheEtapas(str(tmp_path), max_bytes=10_000_000)
+    cache.guardar("a", "x", "1" * 100)
+    cache.guardar("b", "x", "2" * 50)
+    cache.guardar("a", "x", "3" * 10)  # reemplazo: resta el tamaño anterior
+    cache.registrar_huellas("doc", ["h1", "h2", "h3"])
+    cache.registrar_huellas("doc", ["h1"])
+    assert cache.tamano() == bytes_reales(cache)
+    cache.limpiar()
+    assert cache.tamano() == bytes_reales(cache) == 0
+
+
+def test_total_de_una_cache_anterior_al_contador(tmp_path):
+    cache = CacheEtapas(str(tmp_path))
+    cache.guardar("a", "x", "1" * 100)
+    cache.registrar_huellas("doc", ["h1", "h2"])
+    with sqlite3.connect(cache.ruta) as conn:
+        conn.execute("DROP TABLE meta")
+    assert CacheEtapas(str(tmp_path)).tamano() == bytes_reales(cache)
+
+
+def test_expulsion_lru_con_huellas(tmp_path, monkeypatch):
+    reloj = iter(range(1000))
+    monkeypatch.setattr(cache_etapas.time, "time", lambda: float(next(reloj)))
+    cache = CacheEtapas(str(tmp_path), max_bytes=1000)
+    cache.registrar_huellas("viejo", ["h" * 64] * 5)   # 5 * (5 + 64 + 16) = 425 bytes
+    cache.guardar("k1", "x", "a" * 300)                # 302 bytes
+    cache.guardar("k2", "x", "b" * 400)                # supera el máximo: sale lo más antiguo
+    assert not cache.usar_huellas("viejo")
+    assert cache.obtener("k1")[0] and cache.obtener("k2")[0]
+    assert cache.tamano() == bytes_reales(cache) <= cache.max_bytes
+
+
+def test_acierto_sin_escritura_si_el_acceso_es_reciente(tmp_path, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_etapas.time, "time", lambda: ahora[0])
+    cache = CacheEtapas(str(tmp_path))
+    cache.guardar("a", "x", [1, 2])
+
+    def ultimo_acceso() -> float:
+        with sqlite3.connect(cache.ruta) as conn:
+            return conn.execute("SELECT ultimo_acceso FROM etapas WHERE clave = 'a'").fetchone()[0]
+
+    ahora[0] += cache_etapas.INTERVALO_ACCESO / 2
+    assert cache.obtener("a") == (True, [1, 2])
+    assert ultimo_acceso() == 1000.0
+    ahora[0] += cache_etapas.INTERVALO_ACCESO
+    cache.obtener("a")
+    assert ultimo_acceso() == ahora[0]
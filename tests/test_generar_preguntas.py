@@ -0,0 +1,46 @@
+"""
+`deepseek_client.repartir_ideas` reparte exactamente las preguntas pedidas
+entre los lotes, y `generar_preguntas_async` no llama al proveedor si no hay
+ideas de contexto.
+
+Uso:
+    python -m pytest tests/
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from deepseek_client import generar_preguntas_async, repartir_ideas
+
+
+@pytest.mark.parametrize("preguntas_por_lote", [1, 3, 10])
+@pytest.mark.parametrize("num_ideas", [0, 1, 4, 25])
+def test_cuotas_suman_las_preguntas_pedidas(preguntas_por_lote, num_ideas):
+    ideas = [f"idea {i}" for i in range(num_ideas)]
+    for num_questions in range(0, 45):
+        lotes = repartir_ideas(ideas, num_questions, preguntas_por_lote)
+        cuotas = [cuota for _, cuota in lotes]
+        assert sum(cuotas) == num_questions
+        assert max(cuotas) <= preguntas_por_lote
+        # Cuotas parejas: difieren a lo sumo en una pregunta
+        assert max(cuotas) - min(cuotas) <= 1
+        if ideas:
+            assert all(grupo for grupo, _ in lotes)
+            if len(ideas) >= len(lotes):
+                # Cada idea va a un solo lote, en orden
+                assert [idea for grupo, _ in lotes for idea in grupo] == ideas
+
+
+def test_sin_ideas_no_llama_al_proveedor():
+    llamadas = []
+
+    async def chat(mensajes, modelo, *args):
+        # call_deepseek_async atrapa los errores del proveedor: se cuentan las llamadas
+        llamadas.append(mensajes)
+        return '{"questions": []}'
+
+    sesion = SimpleNamespace(deepseek=SimpleNamespace(chat=chat, chat_stream=chat))
+    for stream in (False, True):
+        assert asyncio.run(generar_preguntas_async([], 8, sesion=sesion, stream=stream)) == []
+    assert llamadas == []
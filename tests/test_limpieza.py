@@ -0,0 +1,51 @@
+"""
+`limpieza_texto.clean_text` / `clean_texts` deben dar exactamente lo mismo que
+la implementación original (`benchmarks.bench_limpieza.clean_text_original`)
+sobre un corpus fijo: textos aleatorios con semilla, los casos límite y
+entradas que pasan por el camino vectorizado.
+
+Uso:
+    python -m pytest tests/
+"""
+import random
+
+import pytest
+
+from benchmarks.bench_limpieza import PIEZAS, clean_text_original, texto_aleatorio
+from limpieza_texto import clean_text, clean_texts
+
+OPCIONES = [(True, True), (True, False), (False, True), (False, False)]
+
+_rng = random.Random(0)
+CORPUS = (
+    ["", " ", "\n", "<", "<>", "\n\n", "  a  ", "İ", "K"]
+    + PIEZAS
+    + [texto_aleatorio(_rng, _rng.randint(0, 40)) for _ in range(2000)]
+)
+# Más largos que un bloque vectorizado de limpieza_texto
+GRANDES = [
+    texto_aleatorio(random.Random(1), 20000),
+    "La <b>información</b> está en    el índice;\n \n¿Qué métricas evalúan la educación? " * 500,
+]
+
+
+@pytest.mark.parametrize("lowercase,remove_punctuation", OPCIONES)
+def test_clean_text_igual_al_original(lowercase, remove_punctuation):
+    for texto in CORPUS:
+        assert clean_text(texto, lowercase, remove_punctuation) == \
+            clean_text_original(texto, lowercase, remove_punctuation), repr(texto)
+
+
+@pytest.mark.parametrize("lowercase,remove_punctuation", OPCIONES)
+def test_clean_text_grandes_igual_al_original(lowercase, remove_punctuation):
+    for texto in GRANDES:
+        assert clean_text(texto, lowercase, remove_punctuation) == \
+            clean_text_original(texto, lowercase, remove_punctuation)
+
+
+@pytest.mark.parametrize("lowercase,remove_punctuation", OPCIONES)
+def test_clean_texts_igual_a_clean_text(lowercase, remove_punctuation):
+    # Con repetidos, como las celdas de una tabla
+    textos = CORPUS[:300] * 2
+    assert clean_texts(textos, lowercase, remove_punctuation) == \
+        [clean_text_original(t, lowercase, remove_punctuation) for t in textos]
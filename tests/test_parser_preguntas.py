@@ -0,0 +1,114 @@
+"""
+`deepseek_client.ParserPreguntas` debe devolver las mismas preguntas sin
+importar cómo llegue partida la respuesta (cortes dentro de cadenas y de
+escapes, llaves dentro de los textos), conservar las completas si la
+respuesta se corta o trae un objeto inválido, y `call_deepseek_async` debe
+recurrir a `_parsear_respuesta_completa` si no reconoce el arreglo.
+
+Uso:
+    python -m pytest tests/
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import deepseek_client
+from deepseek_client import ParserPreguntas, _parsear_respuesta_completa
+
+PREGUNTAS = [
+    {"question": "¿Qué mide la {varianza}?", "options": ["A) [dispersión]", "B) }media{"],
+     "correct_answer": "A"},
+    {"question": 'Cita: "hola \\"mundo\\"" y barra \\', "options": ["A) \\n", "B) \\\\"],
+     "correct_answer": "B"},
+    {"question": "Ñandú, ünicode y \u00e9", "options": ["A) {", "B) ]"], "correct_answer": "A"},
+]
+RESPUESTA = "```json\n" + json.dumps({"questions": PREGUNTAS}, ensure_ascii=False, indent=2) + "\n```"
+
+
+def parsear(fragmentos) -> ParserPreguntas:
+    parser = ParserPreguntas()
+    for fragmento in fragmentos:
+        parser.agregar(fragmento)
+    return parser
+
+
+def test_respuesta_entera():
+    parser = parsear([RESPUESTA])
+    assert parser.preguntas == PREGUNTAS
+    assert not parser.incompleta
+
+
+def test_cualquier_corte_en_dos_fragmentos():
+    # Incluye cortes dentro de cadenas, entre "\" y el carácter escapado
+    # y dentro de `"questions": [`
+    for corte in range(len(RESPUESTA) + 1):
+        parser = parsear([RESPUESTA[:corte], RESPUESTA[corte:]])
+        assert parser.preguntas == PREGUNTAS, corte
+
+
+def test_de_a_un_caracter():
+    assert parsear(RESPUESTA).preguntas == PREGUNTAS
+
+
+def test_preguntas_entregadas_al_cerrarse_cada_objeto():
+    parser = ParserPreguntas()
+    fin_primera = RESPUESTA.index('"correct_answer": "A"\n    }') + len('"correct_answer": "A"\n    }')
+    assert parser.agregar(RESPUESTA[:fin_primera - 1]) == []
+    assert parser.agregar(RESPUESTA[fin_primera - 1:fin_primera]) == PREGUNTAS[:1]
+
+
+def test_objeto_final_truncado():
+    corte = RESPUESTA.index('"Ñandú')
+    parser = parsear([RESPUESTA[:corte]])
+    assert parser.preguntas == PREGUNTAS[:2]
+    assert parser.incompleta
+
+
+def test_objeto_invalido_en_el_medio():
+    texto = json.dumps(PREGUNTAS[0], ensure_ascii=False)
+    respuesta = ('{"questions": [' + texto + ', {"question": "x", "options": [1 2]}, '
+                 + '{"sin_pregunta": 1}, ' + json.dumps(PREGUNTAS[2], ensure_ascii=False) + "]}")
+    parser = parsear([respuesta])
+    assert parser.preguntas == [PREGUNTAS[0], PREGUNTAS[2]]
+    assert not parser.incompleta
+
+
+def test_ignora_lo_posterior_al_arreglo():
+    respuesta = json.dumps({"questions": PREGUNTAS, "extra": [{"question": "no"}]}, ensure_ascii=False)
+    assert parsear([respuesta]).preguntas == PREGUNTAS
+
+
+def test_respuesta_completa_con_y_sin_fence():
+    assert _parsear_respuesta_completa(RESPUESTA) == PREGUNTAS
+    assert _parsear_respuesta_completa(json.dumps({"questions": PREGUNTAS})) == PREGUNTAS
+
+
+def _sesion(respuesta: str) -> SimpleNamespace:
+    async def chat(mensajes, modelo):
+        return respuesta
+
+    async def chat_stream(mensajes, modelo, al_recibir):
+        for i in range(0, len(respuesta), 7):
+            al_recibir(respuesta[i:i + 7])
+        return respuesta
+
+    return SimpleNamespace(deepseek=SimpleNamespace(chat=chat, chat_stream=chat_stream))
+
+
+def test_recurre_a_la_respuesta_completa_sin_arreglo_reconocible():
+    # Con la clave escrita con un escape unicode el parser incremental no
+    # reconoce el arreglo; el JSON completo sí se puede leer
+    respuesta = json.dumps({"questions": PREGUNTAS}, ensure_ascii=False).replace(
+        '"questions"', '"\\u0071uestions"', 1)
+    assert ParserPreguntas().agregar(respuesta) == []
+    for stream in (False, True):
+        recibidas = []
+        preguntas = asyncio.run(deepseek_client.call_deepseek_async(
+            ["idea"], 3, sesion=_sesion(respuesta), al_recibir_pregunta=recibidas.append, stream=stream))
+        assert preguntas == recibidas == PREGUNTAS
+
+
+def test_respuesta_ilegible_devuelve_lista_vacia():
+    preguntas = asyncio.run(deepseek_client.call_deepseek_async(
+        ["idea"], 3, sesion=_sesion("no hay JSON aquí"), stream=False))
+    assert preguntas == []
@@ -0,0 +1,74 @@
+"""
+`tabla_estructurada.parsear_numero` con formatos en español e inglés,
+porcentajes, monedas y negativos, y `resumen_para_prompt` dentro del
+presupuesto de tokens estimados para cualquier cantidad de tablas.
+
+Uso:
+    python -m pytest tests/
+"""
+import random
+
+import pytest
+
+from fragmentacion import estimar_tokens
+from tabla_estructurada import estructurar_tabla, parsear_numero, resumen_para_prompt
+
+
+@pytest.mark.parametrize("celda,valor", [
+    ("1.234,5", 1234.5),
+    ("1,234.5", 1234.5),
+    ("€ 1.000.000,25", 1000000.25),
+    ("1 234,5", 1234.5),
+    ("3,5", 3.5),
+    ("1.5", 1.5),
+    ("1,234", 1234.0),
+    ("1.234", 1234.0),
+    ("2024", 2024.0),
+    ("12%", 12.0),
+    ("$3", 3.0),
+    ("+7", 7.0),
+    ("-3,5", -3.5),
+    ("−1.234", -1234.0),
+    ("$-3", -3.0),
+    ("- 12 %", -12.0),
+])
+def test_parsear_numero(celda, valor):
+    assert parsear_numero(celda) == valor
+
+
+@pytest.mark.parametrize("celda", [None, "", "  ", "abc", "12-5", "1,2,3", "3 kg", "%"])
+def test_parsear_no_numero(celda):
+    assert parsear_numero(celda) is None
+
+
+def tabla_aleatoria(rng: random.Random, indice: int):
+    filas = rng.randint(1, 60)
+    columnas = rng.randint(1, 6)
+    encabezado = [f"col {j} " + "x" * rng.randint(0, 30) for j in range(columnas)]
+    crudas = [encabezado]
+    for _ in range(filas):
+        crudas.append([
+            f"{rng.uniform(-1e5, 1e5):,.2f}" if j % 2 == 0
+            else rng.choice(["norte", "sur", "este", "oeste"]) + " " + "texto largo " * rng.randint(0, 5)
+            for j in range(columnas)
+        ])
+    limpias = [[c.lower() for c in fila] for fila in crudas]
+    return estructurar_tabla(1 + indice // 3, indice, limpias, crudas)
+
+
+@pytest.mark.parametrize("cantidad", [1, 3, 10, 40])
+@pytest.mark.parametrize("max_tokens", [30, 100, 400, 1500, 5000])
+def test_resumen_dentro_del_presupuesto(cantidad, max_tokens):
+    rng = random.Random(cantidad * 1000 + max_tokens)
+    tablas = [tabla_aleatoria(rng, i) for i in range(cantidad)]
+    resumen = resumen_para_prompt(tablas, max_tokens)
+    assert resumen
+    assert estimar_tokens(resumen) <= max_tokens
+
+
+def test_resumen_completo_si_cabe():
+    rng = random.Random(0)
+    tablas = [tabla_aleatoria(rng, i) for i in range(3)]
+    completo = "\n\n".join(t.resumen(2, i) for i, t in enumerate(tablas, 1))
+    assert resumen_para_prompt(tablas, estimar_tokens(completo) + 10) == completo
+    assert resumen_para_prompt([], 100) == ""
@@ -0,0 +1,118 @@
+"""
+Reprocesamiento de versiones revisadas: los fragmentos de
+`fragmentacion.fragmentar_texto` se conservan al insertar una página, la
+clasificación de `versiones.comparar_huellas` en iguales / modificadas /
+nuevas / eliminadas, y `extraccion_paralela.iterar_paginas(indices=...)` da
+lo mismo en paralelo que en secuencial.
+
+Uso:
+    python -m pytest tests/
+"""
+import random
+
+import pytest
+
+from benchmarks.pdf_sintetico import generar_pdf
+from extraccion_paralela import iterar_paginas, rangos_de_indices
+from fragmentacion import fragmentar_texto
+from versiones import comparar_huellas
+
+PALABRAS = ["datos", "tabla", "media", "índice", "valor", "región", "año", "total", "educación", "métrica"]
+MAX_TOKENS = 6000
+
+
+def pagina(rng: random.Random) -> str:
+    return "\n".join(
+        " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(5, 30)))
+        for _ in range(rng.randint(8, 30))
+    )
+
+
+def con_insercion(semilla: int):
+    rng = random.Random(semilla)
+    paginas = [pagina(rng) for _ in range(80)]
+    posicion = rng.randrange(len(paginas) + 1)
+    return paginas, posicion, paginas[:posicion] + [pagina(rng)] + paginas[posicion:]
+
+
+@pytest.mark.parametrize("semilla", range(10))
+def test_fragmentos_sin_perdida_y_anteriores_a_la_insercion_iguales(semilla):
+    paginas, posicion, revision = con_insercion(semilla)
+    antes = fragmentar_texto(paginas, MAX_TOKENS)
+    despues = fragmentar_texto(revision, MAX_TOKENS)
+    assert "\n".join(antes) == "\n".join(paginas)
+    assert "\n".join(despues) == "\n".join(revision)
+    # Los fragmentos cerrados antes de la página insertada no pueden cambiar
+    cerrados = fragmentar_texto(paginas[:posicion], MAX_TOKENS)[:-1]
+    assert antes[:len(cerrados)] == despues[:len(cerrados)] == cerrados
+
+
+def test_insertar_una_pagina_cambia_pocos_fragmentos():
+    # Con cortes por contenido los fragmentos posteriores a la inserción se
+    # vuelven a alinear: en promedio cambian menos de dos y medio (con cortes
+    # por posición cambiarían todos los que siguen a la página insertada)
+    cambiados = []
+    for semilla in range(50):
+        paginas, _, revision = con_insercion(semilla)
+        antes = fragmentar_texto(paginas, MAX_TOKENS)
+        cambiados.append(len(set(antes) - set(fragmentar_texto(revision, MAX_TOKENS))))
+    assert sum(cambiados) / len(cambiados) <= 2.5
+
+
+def test_comparar_huellas_clasifica_paginas():
+    anteriores = list("abcdefgh")
+    actuales = list("abXcdEfh")  # X insertada, e modificada, g eliminada
+    assert comparar_huellas(anteriores, actuales) == {
+        "iguales": [1, 2, 4, 5, 7, 8],
+        "modificadas": [6],
+        "nuevas": [3],
+        "eliminadas": [7],
+    }
+
+
+def test_comparar_huellas_reemplazo_de_distinto_largo():
+    # Dos páginas reemplazadas por tres: dos modificadas y una nueva
+    assert comparar_huellas(list("abcd"), list("aXYZd")) == {
+        "iguales": [1, 5], "modificadas": [2, 3], "nuevas": [4], "eliminadas": [],
+    }
+    # Tres por una: una modificada y dos eliminadas
+    assert comparar_huellas(list("abcde"), list("aXe")) == {
+        "iguales": [1, 3], "modificadas": [2], "nuevas": [], "eliminadas": [3, 4],
+    }
+
+
+def test_comparar_huellas_casos_extremos():
+    assert comparar_huellas(list("abc"), list("abc"))["iguales"] == [1, 2, 3]
+    assert comparar_huellas([], list("ab"))["nuevas"] == [1, 2]
+    assert comparar_huellas(list("ab"), [])["eliminadas"] == [1, 2]
+
+
+def test_rangos_de_indices():
+    assert rangos_de_indices([0, 1, 2, 5, 6, 9], 1, 2) == [(0, 2), (2, 3), (5, 7), (9, 10)]
+    assert rangos_de_indices([], 2, 4) == []
+
+
+@pytest.fixture(scope="module")
+def pdf_sintetico(tmp_path_factory):
+    datos = generar_pdf(12, densidad_tablas=0.3)
+    ruta = tmp_path_factory.mktemp("pdf") / "documento.pdf"
+    ruta.write_bytes(datos)
+    return datos, str(ruta), list(iterar_paginas(datos, workers=1))
+
+
+@pytest.mark.parametrize("indices", [[0], [2, 3, 4, 8, 9, 11], [11, 1, 1, 7, 40, -1]])
+@pytest.mark.parametrize("memoria_baja", [False, True])
+@pytest.mark.parametrize("num_paginas", [None, 12])
+def test_indices_en_paralelo_igual_que_secuencial(pdf_sintetico, indices, memoria_baja, num_paginas):
+    datos, ruta, completas = pdf_sintetico
+    fuente = ruta if memoria_baja else datos
+    esperadas = [completas[i] for i in sorted(set(indices)) if 0 <= i < len(completas)]
+    for workers in (1, 3):
+        paginas = list(iterar_paginas(fuente, workers=workers, paginas_por_bloque=2, indices=indices,
+                                      memoria_baja=memoria_baja, num_paginas=num_paginas))
+        assert paginas == esperadas
+
+
+def test_todas_las_paginas_en_paralelo(pdf_sintetico):
+    datos, _, completas = pdf_sintetico
+    assert list(iterar_paginas(datos, workers=3, indices=range(len(completas)))) == completas
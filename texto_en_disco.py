@@ -0,0 +1,49 @@
+import tempfile
+import threading
+from collections.abc import Sequence
+from typing import Iterator, List, Optional, Tuple
+
+from documento_pdf import DIRECTORIO_TEMPORAL
+
+
+class TextoEnDisco(Sequence):
+    """
+    Lista de textos (el texto limpio de cada página) guardada en un archivo
+    temporal anónimo en vez de en memoria: solo se conservan la posición y
+    el largo de cada texto. Se usa como una lista de solo lectura a la que se
+    agregan elementos; el archivo se borra al cerrarse o liberarse el objeto.
+    """
+
+    def __init__(self, directorio: Optional[str] = DIRECTORIO_TEMPORAL):
+        self._archivo = tempfile.TemporaryFile(dir=directorio)
+        self._posiciones: List[Tuple[int, int]] = []
+        self._fin = 0
+        self._lock = threading.Lock()
+
+    def append(self, texto: str) -> None:
+        datos = texto.encode("utf-8")
+        with self._lock:
+            self._archivo.seek(self._fin)
+            self._archivo.write(datos)
+            self._posiciones.append((self._fin, len(datos)))
+            self._fin += len(datos)
+
+    def _leer(self, posicion: int, largo: int) -> str:
+        with self._lock:
+            self._archivo.seek(posicion)
+            return self._archivo.read(largo).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._posiciones)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._leer(*posicion) for posicion in self._posiciones[indice]]
+        return self._leer(*self._posiciones[indice])
+
+    def __iter__(self) -> Iterator[str]:
+        for posicion in list(self._posiciones):
+            yield self._leer(*posicion)
+
+    def close(self) -> None:
+        self._archivo.close()
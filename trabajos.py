@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cache_etapas import CacheEtapas, hash_contenido
+from documento_pdf import FuentePDF, volcar_a_disco
+from instrumentacion import acumular, contar
+from pipeline import Avance, OpcionesPipeline, ResultadoDocumento, hash_fuente, procesar_documento_async
+
+logger = logging.getLogger(__name__)
+
+# Documentos que se procesan a la vez
+TRABAJOS_WORKERS = int(os.getenv("TRABAJOS_WORKERS", "2"))
+# Trabajos en espera admitidos; con la cola llena los nuevos se rechazan
+TRABAJOS_MAX_EN_COLA = int(os.getenv("TRABAJOS_MAX_EN_COLA", "8"))
+# Trabajos terminados que se conservan para consultar su resultado
+TRABAJOS_TERMINADOS = int(os.getenv("TRABAJOS_TERMINADOS", "50"))
+
+EN_COLA = "en_cola"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+
+
+class ColaLlena(RuntimeError):
+    """La cola de trabajos no admite más documentos en espera"""
+
+
+class TrabajoCancelado(Exception):
+    """Se pidió cancelar el trabajo mientras se procesaba"""
+
+
+@dataclass
+class Trabajo:
+    """
+    Procesamiento de un documento en segundo plano. `avance` es el último
+    evento de progreso del pipeline y `resultado` queda disponible al completarse.
+    """
+    id: str
+    nombre: str
+    clave: str
+    estado: str = EN_COLA
+    avance: Optional[Avance] = None
+    resultado: Optional[ResultadoDocumento] = None
+    error: Optional[str] = None
+    creado: float = field(default_factory=time.time)
+    iniciado: Optional[float] = None
+    finalizado: Optional[float] = None
+    _cancelacion: threading.Event = field(default_factory=threading.Event, repr=False)
+    _bucle: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+    _tarea: Optional[asyncio.Task] = field(default=None, repr=False)
+    # Copia en disco del PDF (memoria_baja), que se borra al terminar
+    _temporal: Optional[Path] = field(default=None, repr=False)
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in (COMPLETADO, FALLIDO, CANCELADO)
+
+    @property
+    def progreso(self) -> float:
+        return self.avance.progreso if self.avance else 0.0
+
+
+def clave_trabajo(fuente: FuentePDF, opciones: OpcionesPipeline) -> str:
+    """Mismo PDF con las mismas opciones = mismo trabajo"""
+    return hash_contenido(hash_fuente(fuente) + repr(opciones))
+
+
+def _datos_fuente(fuente: FuentePDF, memoria_baja: bool = False) -> FuentePDF:
+    # Las rutas se procesan tal cual; los buffers de la sesión (p. ej. el
+    # UploadedFile de Streamlit) se copian a bytes antes de pasar a otro hilo,
+    # o con memoria_baja a un archivo temporal que se borra al terminar
+    if isinstance(fuente, (str, Path)):
+        return fuente
+    if memoria_baja:
+        return volcar_a_disco(fuente)
+    if isinstance(fuente, bytes):
+        return fuente
+    if isinstance(fuente, (bytearray, memoryview)):
+        return bytes(fuente)
+    if hasattr(fuente, "getvalue"):
+        return fuente.getvalue()
+    fuente.seek(0)
+    return fuente.read()
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos del proceso: los documentos se encolan y un pool de
+    `workers` hilos los procesa con el pipeline completo, sin bloquear la
+    sesión que los envió. Con `max_en_cola` trabajos esperando, `enviar`
+    rechaza los nuevos (`ColaLlena`). Un trabajo igual (mismo PDF y opciones)
+    en curso o completado se reutiliza en vez de repetirse.
+    """
+
+    def __init__(self, workers: int = TRABAJOS_WORKERS, max_en_cola: int = TRABAJOS_MAX_EN_COLA,
+                 cache: Optional[CacheEtapas] = None, max_terminados: int = TRABAJOS_TERMINADOS):
+        self.max_en_cola = max_en_cola
+        self.max_terminados = max_terminados
+        self._cache = cache or CacheEtapas()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="trabajo")
+        self._lock = threading.Lock()
+        # Orden de llegada: los primeros en cola son los primeros en procesarse
+        self._trabajos: Dict[str, Trabajo] = {}
+        self._futuros: Dict[str, Future] = {}
+
+    def enviar(self, fuente: FuentePDF, opciones: Optional[OpcionesPipeline] = None,
+               nombre: str = "") -> Trabajo:
+        """
+        Encola el documento y devuelve su trabajo (o el trabajo igual ya en
+        curso o completado). Lanza `ColaLlena` si no se admiten más trabajos.
+        """
+        opciones = opciones or OpcionesPipeline()
+        clave = clave_trabajo(fuente, opciones)
+        with self._lock:
+            existente = self._admitir(clave)
+        if existente is not None:
+            return existente
+        # La copia del PDF (a disco con memoria_baja) se hace sin el lock: no
+        # frena a las demás sesiones ni a las que consultan sus trabajos
+        datos = _datos_fuente(fuente, opciones.memoria_baja)
+        temporal = datos if isinstance(datos, Path) and datos is not fuente else None
+        try:
+            with self._lock:
+                # Otra sesión pudo enviar el mismo documento mientras tanto
+                existente = self._admitir(clave)
+                if existente is not None:
+                    return existente
+                trabajo = Trabajo(id=uuid.uuid4().hex, nombre=nombre or str(fuente)[:80], clave=clave)
+                trabajo._temporal, temporal = temporal, None
+                self._trabajos[trabajo.id] = trabajo
+                self._futuros[trabajo.id] = self._pool.submit(self._ejecutar, trabajo, datos, opciones)
+                self._purgar()
+        finally:
+            if temporal is not None:
+                temporal.unlink(missing_ok=True)
+        contar("trabajos_enviados", resultado="admitido")
+        return trabajo
+
+    def buscar(self, fuente: FuentePDF, opciones: Optional[OpcionesPipeline] = None) -> Optional[Trabajo]:
+        """Último trabajo enviado para este PDF y opciones, en cualquier estado"""
+        clave = clave_trabajo(fuente, opciones or OpcionesPipeline())
+        with self._lock:
+            return self._buscar(clave)
+
+    def obtener(self, id_trabajo: str) -> Optional[Trabajo]:
+        """Trabajo por su id, sin leer el PDF; None si no existe o ya se olvidó"""
+        with self._lock:
+            return self._trabajos.get(id_trabajo)
+
+    def trabajos(self) -> List[Trabajo]:
+        with self._lock:
+            return list(self._trabajos.values())
+
+    def posicion(self, id_trabajo: str) -> int:
+        """Posición en la cola de espera (1 = el próximo); 0 si ya no espera"""
+        with self._lock:
+            esperando = [t.id for t in self._trabajos.values() if t.estado == EN_COLA]
+        return esperando.index(id_trabajo) + 1 if id_trabajo in esperando else 0
+
+    def cancelar(self, id_trabajo: str) -> bool:
+        """
+        Cancela un trabajo: si espera, no llega a ejecutarse; si está en curso,
+        se interrumpe en la próxima página extraída o llamada a un LLM.
+        Devuelve False si el trabajo no existe o ya terminó.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None or trabajo.terminado:
+                return False
+            trabajo._cancelacion.set()
+            if self._futuros[id_trabajo].cancel():
+                self._finalizar(trabajo, CANCELADO)
+                return True
+            bucle, tarea = trabajo._bucle, trabajo._tarea
+        if bucle is not None and tarea is not None:
+            try:
+                bucle.call_soon_threadsafe(tarea.cancel)
+            except RuntimeError:
+                # El bucle ya terminó: el trabajo está cerrando
+                pass
+        return True
+
+    def detener(self, cancelar: bool = False) -> None:
+        if cancelar:
+            for trabajo in self.trabajos():
+                self.cancelar(trabajo.id)
+        self._pool.shutdown(wait=True, cancel_futures=cancelar)
+
+    def _admitir(self, clave: str) -> Optional[Trabajo]:
+        # Con el lock tomado: el trabajo igual que se reutiliza, None si hay
+        # que crear uno nuevo o ColaLlena si no se admiten más
+        existente = self._buscar(clave)
+        if existente is not None and existente.estado not in (FALLIDO, CANCELADO):
+            contar("trabajos_enviados", resultado="reutilizado")
+            return existente
+        en_cola = sum(t.estado == EN_COLA for t in self._trabajos.values())
+        if en_cola >= self.max_en_cola:
+            contar("trabajos_enviados", resultado="rechazado")
+            raise ColaLlena(f"Hay {en_cola} trabajos en espera (máximo {self.max_en_cola})")
+        return None
+
+    def _buscar(self, clave: str) -> Optional[Trabajo]:
+        for trabajo in reversed(self._trabajos.values()):
+            if trabajo.clave == clave:
+                return trabajo
+        return None
+
+    def _purgar(self) -> None:
+        # Se olvidan los trabajos terminados más antiguos (y sus resultados)
+        terminados = [t.id for t in self._trabajos.values() if t.terminado]
+        for id_trabajo in terminados[:max(0, len(terminados) - self.max_terminados)]:
+            del self._trabajos[id_trabajo]
+            del self._futuros[id_trabajo]
+
+    def _finalizar(self, trabajo: Trabajo, estado: str, error: Optional[str] = None) -> None:
+        trabajo.estado = estado
+        trabajo.error = error
+        trabajo.finalizado = time.time()
+        trabajo._bucle = trabajo._tarea = None
+        if trabajo._temporal is not None:
+            trabajo._temporal.unlink(missing_ok=True)
+            trabajo._temporal = None
+        contar("trabajos", resultado=estado)
+        if trabajo.iniciado is not None:
+            acumular("trabajo", trabajo.finalizado - trabajo.iniciado, estado=estado)
+
+    def _ejecutar(self, trabajo: Trabajo, fuente: FuentePDF, opciones: OpcionesPipeline) -> None:
+        with self._lock:
+            if trabajo._cancelacion.is_set():
+                self._finalizar(trabajo, CANCELADO)
+                return
+            trabajo.estado = EN_CURSO
+            trabajo.iniciado = time.time()
+        acumular("trabajo_espera", trabajo.iniciado - trabajo.creado)
+
+        def al_avanzar(avance: Avance) -> None:
+            trabajo.avance = avance
+            # La extracción no cede el control al bucle: la cancelación se
+            # comprueba en cada página. En las etapas LLM se cancela la tarea.
+            if avance.etapa == "extraccion" and trabajo._cancelacion.is_set():
+                raise TrabajoCancelado()
+
+        async def procesar() -> ResultadoDocumento:
+            with self._lock:
+                trabajo._bucle = asyncio.get_running_loop()
+                trabajo._tarea = asyncio.current_task()
+            if trabajo._cancelacion.is_set():
+                raise TrabajoCancelado()
+            return await procesar_documento_async(fuente, opciones, self._cache, al_avanzar)
+
+        try:
+            resultado = asyncio.run(procesar())
+        except (TrabajoCancelado, asyncio.CancelledError):
+            with self._lock:
+                self._finalizar(trabajo, CANCELADO)
+            return
+        except Exception as e:
+            logger.exception(f"Error procesando {trabajo.nombre}")
+            with self._lock:
+                self._finalizar(trabajo, FALLIDO, str(e))
+            return
+        with self._lock:
+            if trabajo._cancelacion.is_set():
+                self._finalizar(trabajo, CANCELADO)
+            else:
+                trabajo.resultado = resultado
+                self._finalizar(trabajo, COMPLETADO)
@@ -0,0 +1,80 @@
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def comparar_huellas(anteriores: List[str], actuales: List[str]) -> dict:
+    """
+    Compara las huellas de las páginas de dos versiones de un documento.
+    Devuelve los números de página (base 1) iguales, modificadas y nuevas de
+    la versión actual y los de las eliminadas en la anterior. Una página
+    igual que solo cambió de posición (por páginas insertadas antes) cuenta
+    como igual.
+    """
+    iguales, modificadas, nuevas, eliminadas = [], [], [], []
+    comparador = SequenceMatcher(None, anteriores, actuales, autojunk=False)
+    for operacion, i1, i2, j1, j2 in comparador.get_opcodes():
+        if operacion == "equal":
+            iguales.extend(range(j1 + 1, j2 + 1))
+        elif operacion == "replace":
+            # Un tramo reemplazado se empareja página a página; lo que sobra
+            # de uno u otro lado son páginas nuevas o eliminadas
+            pares = min(i2 - i1, j2 - j1)
+            modificadas.extend(range(j1 + 1, j1 + pares + 1))
+            nuevas.extend(range(j1 + pares + 1, j2 + 1))
+            eliminadas.extend(range(i1 + pares + 1, i2 + 1))
+        elif operacion == "insert":
+            nuevas.extend(range(j1 + 1, j2 + 1))
+        elif operacion == "delete":
+            eliminadas.extend(range(i1 + 1, i2 + 1))
+    return {"iguales": iguales, "modificadas": modificadas, "nuevas": nuevas, "eliminadas": eliminadas}
+
+
+class InformeReutilizacion:
+    """
+    Qué se reutilizó de la caché y qué se volvió a calcular en cada etapa
+    (páginas, lotes de tablas, fragmentos de ideas, lotes de preguntas), y
+    los cambios respecto de la versión anterior del documento si la hay.
+    """
+
+    def __init__(self):
+        self.reutilizados: Counter = Counter()
+        self.recalculados: Counter = Counter()
+        self.version_anterior: Optional[str] = None
+        self.cambios: Optional[dict] = None
+
+    def registrar(self, etapa: str, reutilizados: int = 0, recalculados: int = 0) -> None:
+        self.reutilizados[etapa] += reutilizados
+        self.recalculados[etapa] += recalculados
+
+    def vigilar(self, etapa: str, funcion: Callable[[], T]) -> Callable[[], T]:
+        """
+        Envuelve la función de una etapa memoizada para saber si la caché
+        acertó: se cuenta como reutilizada salvo que la función se ejecute.
+        Sirve igual para funciones asíncronas (la corrutina se crea al llamarla).
+        """
+        self.reutilizados[etapa] += 1
+
+        def calcular() -> T:
+            self.reutilizados[etapa] -= 1
+            self.recalculados[etapa] += 1
+            return funcion()
+
+        return calcular
+
+    def comparar(self, version_anterior: str, anteriores: List[str], actuales: List[str]) -> None:
+        self.version_anterior = version_anterior
+        self.cambios = comparar_huellas(anteriores, actuales)
+
+    def a_dict(self) -> dict:
+        etapas = list(dict.fromkeys([*self.reutilizados, *self.recalculados]))
+        return {
+            "version_anterior": self.version_anterior,
+            "paginas": self.cambios,
+            "etapas": {
+                etapa: {"reutilizados": self.reutilizados[etapa], "recalculados": self.recalculados[etapa]}
+                for etapa in etapas
+            },
+        }